@@ -0,0 +1,346 @@
+"""Motor de alertas de preço e variação para regras dos assinantes.
+
+Cada regra é um nível numa métrica de um símbolo ("price", "change_1h",
+"change_24h", "change_7d"): "SOL cruza $200" é o nível 200 em price;
+"qualquer moeda ±8% em 1h" é o nível 8 em change_1h com symbol "*" e
+"both": true. As regras ficam indexadas por (símbolo, métrica) em níveis
+ordenados; cada atualização faz uma pesquisa binária entre o valor anterior
+e o novo e só toca nas regras cujo nível foi cruzado.
+
+Formato do ficheiro de regras (JSON):
+    [{"id": "sol200", "chat_id": "123", "symbol": "SOL", "metric": "price",
+      "level": 200, "direction": "up", "cooldown": 3600}, ...]
+
+direction: "up" (cruzar para cima), "down" ou "any". Regras com symbol "*"
+podem limitar as moedas com "symbols": ["BTC", "ETH", ...]; sem essa lista,
+as regras de change_1h só seguem os ALERT_WILDCARD_TOP_N pares com mais
+volume (a janela de 1h custa 4 de peso por par).
+
+Um alerta disparado fica ativo (e gravado em ALERT_STATE_FILE) até o valor
+voltar para o outro lado do nível; enquanto estiver ativo não volta a ser
+enviado ao mesmo chat, mesmo entre execuções ou por outra regra igual.
+"""
+import argparse
+import json
+import os
+import time
+from bisect import bisect_left, bisect_right
+
+import requests
+
+from ranking import TopK
+
+# --- CONFIGURAÇÕES ---
+ALERT_RULES_FILE = os.environ.get("ALERT_RULES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "alert_rules.json"))
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+ALERT_STATE_FILE = os.path.join(CACHE_DIR, "alert_state.json")
+# Intervalo mínimo entre dois disparos da mesma regra para o mesmo símbolo (segundos)
+ALERT_DEFAULT_COOLDOWN = int(os.environ.get("ALERT_DEFAULT_COOLDOWN", "3600"))
+# Pares USDT (por volume em 24h) seguidos pelas regras "*" de change_1h
+ALERT_WILDCARD_TOP_N = int(os.environ.get("ALERT_WILDCARD_TOP_N", "100"))
+
+METRICS = ("price", "change_1h", "change_24h", "change_7d")
+WILDCARD = "*"
+
+METRIC_LABELS = {
+    "change_1h": "1h",
+    "change_24h": "24h",
+    "change_7d": "7 dias",
+}
+
+
+class LevelIndex:
+    """Níveis ordenados de uma (símbolo, métrica), com as regras de cada nível.
+
+    Cada entrada é (regra, direção exigida), para que o mesmo nível possa
+    ter regras só de subida, só de descida ou de ambas.
+    """
+
+    def __init__(self):
+        self.levels = []
+        self.rules = []
+
+    def add(self, level, rule, direction):
+        i = bisect_left(self.levels, level)
+        if i < len(self.levels) and self.levels[i] == level:
+            self.rules[i].append((rule, direction))
+        else:
+            self.levels.insert(i, level)
+            self.rules.insert(i, [(rule, direction)])
+
+    def remove(self, rule_id):
+        for i in range(len(self.levels) - 1, -1, -1):
+            self.rules[i] = [entry for entry in self.rules[i] if entry[0]["id"] != rule_id]
+            if not self.rules[i]:
+                del self.levels[i]
+                del self.rules[i]
+
+    def crossed(self, previous, current):
+        """Regras cujo nível fica entre o valor anterior e o atual.
+
+        Subida: níveis em (anterior, atual]; descida: [atual, anterior).
+        Devolve (nível, regra, direção do movimento) das regras compatíveis
+        com a direção do movimento.
+        """
+        if current > previous:
+            lo, hi, direction = bisect_right(self.levels, previous), bisect_right(self.levels, current), "up"
+        elif current < previous:
+            lo, hi, direction = bisect_left(self.levels, current), bisect_left(self.levels, previous), "down"
+        else:
+            return
+        for i in range(lo, hi):
+            for rule, required in self.rules[i]:
+                if required == "any" or required == direction:
+                    yield self.levels[i], rule, direction
+
+
+class AlertEngine:
+    def __init__(self, rules=(), default_cooldown=ALERT_DEFAULT_COOLDOWN):
+        self.default_cooldown = default_cooldown
+        self.index = {}
+        self.rules = {}
+        # Último valor visto por (símbolo, métrica) e último disparo por (regra, símbolo)
+        self.last_values = {}
+        self.last_fired = {}
+        # Alertas ativos por (símbolo, métrica): {(chat, nível, direção): instante}
+        self.active = {}
+        for rule in rules:
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        rule = dict(rule)
+        rule["symbol"] = rule.get("symbol", WILDCARD).upper()
+        rule.setdefault("metric", "price")
+        rule.setdefault("direction", "any")
+        if "symbols" in rule:
+            rule["symbols"] = {s.upper() for s in rule["symbols"]}
+        if rule["metric"] not in METRICS:
+            raise ValueError(f"Métrica desconhecida na regra {rule.get('id')}: {rule['metric']}")
+        self.rules[rule["id"]] = rule
+        key = (rule["symbol"], rule["metric"])
+        index = self.index.setdefault(key, LevelIndex())
+        level = float(rule["level"])
+        if rule.get("both"):
+            # "±X%": +X dispara na subida e -X na descida
+            index.add(abs(level), rule, "up")
+            index.add(-abs(level), rule, "down")
+        else:
+            index.add(level, rule, rule["direction"])
+
+    def remove_rule(self, rule_id):
+        rule = self.rules.pop(rule_id, None)
+        if rule:
+            self.index[(rule["symbol"], rule["metric"])].remove(rule_id)
+
+    def update(self, symbol, metric, value, now=None):
+        """Aplica um novo valor de uma métrica e devolve os alertas disparados."""
+        if value is None:
+            return []
+        now = now if now is not None else time.time()
+        key = (symbol, metric)
+        previous = self.last_values.get(key)
+        self.last_values[key] = value
+        active = self.active.get(key)
+        if active:
+            # O valor voltou para trás do nível: o alerta pode disparar de novo
+            for entry in [e for e in active if (value < e[1] if e[2] == "up" else value > e[1])]:
+                del active[entry]
+            if not active:
+                del self.active[key]
+        if previous is None:
+            return []  # primeiro valor: só define a referência
+
+        alerts = []
+        for index_key in (key, (WILDCARD, metric)):
+            index = self.index.get(index_key)
+            if index is None:
+                continue
+            for level, rule, direction in index.crossed(previous, value):
+                if "symbols" in rule and symbol not in rule["symbols"]:
+                    continue
+                fired_key = (rule["id"], symbol)
+                cooldown = rule.get("cooldown", self.default_cooldown)
+                if now - self.last_fired.get(fired_key, float("-inf")) < cooldown:
+                    continue
+                active_key = (rule["chat_id"], level, direction)
+                if active_key in self.active.get(key, ()):
+                    continue
+                self.last_fired[fired_key] = now
+                self.active.setdefault(key, {})[active_key] = now
+                alerts.append({
+                    "rule_id": rule["id"],
+                    "chat_id": rule["chat_id"],
+                    "symbol": symbol,
+                    "metric": metric,
+                    "level": level,
+                    "direction": direction,
+                    "value": value,
+                    "time": now,
+                })
+        return alerts
+
+    def update_quote(self, symbol, now=None, **values):
+        """Atualiza várias métricas de um símbolo (price=..., change_24h=...)."""
+        alerts = []
+        for metric, value in values.items():
+            alerts.extend(self.update(symbol, metric, value, now))
+        return alerts
+
+    def update_from_binance_tickers(self, tickers, now=None):
+        """Alimenta o motor com tickers de get_tickers_24h."""
+        alerts = []
+        for ticker in tickers:
+            symbol = ticker["symbol"]
+            if not symbol.endswith("USDT"):
+                continue
+            alerts.extend(self.update_quote(
+                symbol[:-len("USDT")], now,
+                price=float(ticker["lastPrice"]),
+                change_24h=float(ticker["priceChangePercent"]),
+            ))
+        return alerts
+
+    def update_from_cmc_quotes(self, quotes, now=None):
+        """Alimenta o motor com cotações da CMC ({símbolo: quote['USD']})."""
+        alerts = []
+        for symbol, quote in quotes.items():
+            alerts.extend(self.update_quote(
+                symbol, now,
+                price=quote.get("price"),
+                change_1h=quote.get("percent_change_1h"),
+                change_24h=quote.get("percent_change_24h"),
+                change_7d=quote.get("percent_change_7d"),
+            ))
+        return alerts
+
+    def update_from_crypto_data(self, crypto_data, now=None):
+        """Alimenta o motor com o resultado de get_crypto_data (fixas + dinâmicas)."""
+        if not crypto_data:
+            return []
+        fixed_data, dynamic_data = crypto_data
+        quotes = dict(fixed_data)
+        for item in dynamic_data.get("gainers", []) + dynamic_data.get("losers", []):
+            quotes[item["symbol"]] = item["quote"]
+        return self.update_from_cmc_quotes(quotes, now)
+
+    def save_state(self, path=ALERT_STATE_FILE):
+        """Grava últimos valores e disparos (para cooldowns entre execuções)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        state = {
+            "last_values": [[s, m, v] for (s, m), v in self.last_values.items()],
+            "last_fired": [[r, s, t] for (r, s), t in self.last_fired.items()],
+            "active": [
+                [s, m, c, level, d, t]
+                for (s, m), entries in self.active.items()
+                for (c, level, d), t in entries.items()
+            ],
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def load_state(self, path=ALERT_STATE_FILE):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.last_values = {(s, m): v for s, m, v in state.get("last_values", [])}
+        self.last_fired = {(r, s): t for r, s, t in state.get("last_fired", [])}
+        self.active = {}
+        for s, m, c, level, d, t in state.get("active", []):
+            self.active.setdefault((s, m), {})[(c, level, d)] = t
+
+    def forget(self, symbol, metric):
+        """Esquece o último valor de (símbolo, métrica) (deixou de ser seguido)."""
+        self.last_values.pop((symbol, metric), None)
+
+
+def load_rules(path=ALERT_RULES_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except OSError:
+        return []
+
+
+def format_alert(alert):
+    icon = "🚀" if alert["direction"] == "up" else "📉"
+    if alert["metric"] == "price":
+        verb = "subiu acima de" if alert["direction"] == "up" else "caiu abaixo de"
+        return f"{icon} <b>{alert['symbol']}</b> {verb} ${alert['level']:,.8g} (agora ${alert['value']:,.8g})"
+    label = METRIC_LABELS[alert["metric"]]
+    return f"{icon} <b>{alert['symbol']}</b> move {alert['value']:+.2f}% em {label} (alerta {alert['level']:+g}%)"
+
+
+def send_alerts(alerts):
+    """Envia os alertas agrupados por chat (uma mensagem por chat)."""
+    from telegram_delivery import deliver
+
+    by_chat = {}
+    for alert in alerts:
+        by_chat.setdefault(alert["chat_id"], []).append(format_alert(alert))
+    for chat_id, lines in by_chat.items():
+        deliver("<b>Alertas VIP 🔔</b>\n" + "\n".join(lines), chat_ids=[chat_id])
+
+
+def wildcard_pairs(engine, tickers, metric="change_1h", top_n=ALERT_WILDCARD_TOP_N):
+    """Pares USDT seguidos pelas regras "*" de `metric`.
+
+    As moedas listadas em "symbols" entram sempre; regras sem lista seguem
+    os `top_n` pares com mais volume em USDT nas últimas 24h.
+    """
+    index = engine.index.get((WILDCARD, metric))
+    if index is None:
+        return set()
+    rules = [rule for entries in index.rules for rule, _ in entries]
+    pairs = {f"{s}USDT" for rule in rules for s in rule.get("symbols", ())}
+    if any("symbols" not in rule for rule in rules):
+        ranked = TopK(top_n, key=lambda t: float(t.get("quoteVolume") or 0))
+        ranked.extend(t for s, t in tickers.items() if s.endswith("USDT"))
+        pairs.update(t["symbol"] for t in ranked.result())
+    return pairs & set(tickers)
+
+
+def poll_binance(engine):
+    """Uma ronda de verificação com dados da Binance (tickers 24h e janela de 1h)."""
+    from binance_api import get_rolling_tickers, get_tickers_24h
+
+    tickers = get_tickers_24h()
+    alerts = engine.update_from_binance_tickers(tickers.values())
+
+    # Variação de 1h só é pedida para os símbolos que têm regras de 1h
+    pairs = wildcard_pairs(engine, tickers)
+    pairs.update(f"{s}USDT" for (s, m) in engine.index if m == "change_1h" and s != WILDCARD)
+    pairs &= set(tickers)
+    # Pares que saíram do top: a referência antiga deixaria de ser comparável
+    for symbol, metric in list(engine.last_values):
+        if metric == "change_1h" and f"{symbol}USDT" not in pairs:
+            engine.forget(symbol, metric)
+    if pairs:
+        for symbol, ticker in get_rolling_tickers(sorted(pairs), "1h").items():
+            alerts.extend(engine.update(symbol[:-len("USDT")], "change_1h", float(ticker["priceChangePercent"])))
+    return alerts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Alertas de preço/variação")
+    parser.add_argument("--loop", type=float, default=0, help="repete a verificação a cada N segundos")
+    args = parser.parse_args()
+
+    engine = AlertEngine(load_rules())
+    engine.load_state()
+    print(f"{len(engine.rules)} regras carregadas.")
+    while True:
+        try:
+            alerts = poll_binance(engine)
+            if alerts:
+                print(f"{len(alerts)} alertas disparados.")
+                send_alerts(alerts)
+            engine.save_state()
+        except requests.exceptions.RequestException as e:
+            print(f"Erro ao verificar alertas: {e}")
+        if not args.loop:
+            break
+        time.sleep(args.loop)
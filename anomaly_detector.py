@@ -0,0 +1,249 @@
+"""Detetor de volume e volatilidade anómalos em todos os pares USDT.
+
+Cada par tem uma linha de base online do volume (em log) e do retorno da
+última hora: média e variância com ponderação exponencial, atualizadas em
+O(1) por observação e guardadas entre execuções (ANOMALY_STATE_FILE), por
+isso nunca é preciso reconstruir o histórico. A cada execução:
+
+1. as estatísticas de 1h de todos os pares chegam em lotes de
+   /ticker?windowSize=1h (poucos pedidos para o mercado inteiro);
+2. o z-score de cada par é calculado contra a linha de base anterior, de
+   uma só vez em numpy (milissegundos para milhares de pares);
+3. a linha de base só absorve uma observação por hora, para que execuções
+   mais frequentes não contem a mesma janela várias vezes.
+
+"Volume anómalo" é um z-score do log do volume acima de ANOMALY_Z_VOLUME;
+"volatilidade anómala" é um |z-score| do retorno acima de ANOMALY_Z_RETURN.
+
+Uso:
+    python anomaly_detector.py            # deteta e envia os alertas
+    python anomaly_detector.py --dry-run  # só mostra as anomalias
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import requests
+
+import metrics
+from binance_api import get_rolling_tickers
+from exchange_info_cache import get_tradable_symbols
+
+# --- CONFIGURAÇÕES ---
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+ANOMALY_STATE_FILE = os.path.join(CACHE_DIR, "anomaly_baselines.npz")
+# Meia-vida da linha de base, em horas (quanto do passado pesa na média)
+ANOMALY_HALFLIFE = float(os.environ.get("ANOMALY_HALFLIFE", "48"))
+# Observações horárias antes de um par poder gerar alertas
+ANOMALY_MIN_OBSERVATIONS = int(os.environ.get("ANOMALY_MIN_OBSERVATIONS", "24"))
+ANOMALY_Z_VOLUME = float(os.environ.get("ANOMALY_Z_VOLUME", "4"))
+ANOMALY_Z_RETURN = float(os.environ.get("ANOMALY_Z_RETURN", "4"))
+# Volume mínimo na hora (USDT) para um par ser sinalizado (evita pares ilíquidos)
+ANOMALY_MIN_QUOTE_VOLUME = float(os.environ.get("ANOMALY_MIN_QUOTE_VOLUME", "100000"))
+# Intervalo mínimo entre dois alertas do mesmo par (segundos)
+ANOMALY_COOLDOWN = int(os.environ.get("ANOMALY_COOLDOWN", "21600"))
+# Máximo de pares citados por alerta
+ANOMALY_MAX_ALERTS = 10
+ANOMALY_BUCKET = 3600
+
+# Piso da variância (evita z-scores infinitos em pares parados)
+_MIN_VARIANCE = 1e-8
+
+
+class EwmaBaselines:
+    """Média e variância exponenciais de várias séries por símbolo, em vetores.
+
+    `series` nomeia as colunas (ex.: ("volume", "return")); cada símbolo é
+    uma linha. Símbolos novos entram com contagem 0.
+    """
+
+    def __init__(self, series, halflife=ANOMALY_HALFLIFE):
+        self.series = tuple(series)
+        self.alpha = 1 - 0.5 ** (1 / halflife)
+        self.symbols = []
+        self.index = {}
+        self.mean = np.zeros((0, len(self.series)))
+        self.var = np.zeros((0, len(self.series)))
+        self.count = np.zeros(0, dtype=np.int64)
+        self.last_alert = np.zeros(0)
+        self.bucket = None
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def rows(self, symbols):
+        """Índices das linhas dos símbolos, criando as que faltam."""
+        new = [s for s in dict.fromkeys(symbols) if s not in self.index]
+        if new:
+            for symbol in new:
+                self.index[symbol] = len(self.symbols)
+                self.symbols.append(symbol)
+            extra = len(new)
+            self.mean = np.vstack([self.mean, np.zeros((extra, len(self.series)))])
+            self.var = np.vstack([self.var, np.zeros((extra, len(self.series)))])
+            self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+            self.last_alert = np.concatenate([self.last_alert, np.zeros(extra)])
+        return np.fromiter((self.index[s] for s in symbols), dtype=np.intp, count=len(symbols))
+
+    def zscores(self, rows, values):
+        """z-scores de `values` (N, séries) face à linha de base atual."""
+        return (values - self.mean[rows]) / np.sqrt(np.maximum(self.var[rows], _MIN_VARIANCE))
+
+    def update(self, rows, values):
+        """Absorve uma observação por linha (atualização exponencial incremental).
+
+        Na primeira observação a média passa a ser o valor observado.
+        """
+        first = self.count[rows] == 0
+        diff = values - self.mean[rows]
+        increment = self.alpha * diff
+        mean = self.mean[rows] + increment
+        var = (1 - self.alpha) * (self.var[rows] + diff * increment)
+        mean[first] = values[first]
+        var[first] = 0.0
+        self.mean[rows] = mean
+        self.var[rows] = var
+        self.count[rows] += 1
+
+    def save(self, path=ANOMALY_STATE_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f, symbols=np.array(self.symbols, dtype=str), series=np.array(self.series, dtype=str),
+                mean=self.mean, var=self.var, count=self.count, last_alert=self.last_alert,
+                bucket=np.array(-1 if self.bucket is None else self.bucket),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, series, path=ANOMALY_STATE_FILE, halflife=ANOMALY_HALFLIFE):
+        """Linhas de base guardadas, ou vazias se o ficheiro faltar ou for de outras séries."""
+        baselines = cls(series, halflife)
+        try:
+            with np.load(path) as data:
+                if tuple(data["series"]) != baselines.series:
+                    return baselines
+                baselines.symbols = [str(s) for s in data["symbols"]]
+                baselines.mean = data["mean"]
+                baselines.var = data["var"]
+                baselines.count = data["count"]
+                baselines.last_alert = data["last_alert"]
+                bucket = int(data["bucket"])
+                baselines.bucket = None if bucket < 0 else bucket
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Aviso: linhas de base de anomalias ilegíveis, a recomeçar: {e}")
+            return baselines
+        baselines.index = {s: i for i, s in enumerate(baselines.symbols)}
+        return baselines
+
+
+SERIES = ("log_volume", "return")
+
+
+def hourly_observations(tickers):
+    """(símbolos, valores (N, 2), volume em USDT) a partir dos tickers de 1h."""
+    symbols = list(tickers)
+    quote_volume = np.array([float(tickers[s].get("quoteVolume") or 0) for s in symbols])
+    change = np.array([float(tickers[s].get("priceChangePercent") or 0) for s in symbols])
+    values = np.column_stack([np.log1p(quote_volume), change])
+    return symbols, values, quote_volume
+
+
+def detect(baselines, symbols, values, quote_volume, now=None):
+    """Pontua as observações e atualiza a linha de base (uma vez por hora).
+
+    Devolve as anomalias, da mais forte para a mais fraca, como dicts
+    {symbol, kind, z, quote_volume, change}.
+    """
+    now = time.time() if now is None else now
+    rows = baselines.rows(symbols)
+    z = baselines.zscores(rows, values)
+    eligible = (
+        (baselines.count[rows] >= ANOMALY_MIN_OBSERVATIONS)
+        & (quote_volume >= ANOMALY_MIN_QUOTE_VOLUME)
+        & (now - baselines.last_alert[rows] >= ANOMALY_COOLDOWN)
+    )
+    volume_spike = eligible & (z[:, 0] >= ANOMALY_Z_VOLUME)
+    return_spike = eligible & (np.abs(z[:, 1]) >= ANOMALY_Z_RETURN)
+    flagged = np.flatnonzero(volume_spike | return_spike)
+
+    anomalies = []
+    for i in flagged:
+        kind = "volume" if volume_spike[i] else "volatility"
+        anomalies.append({
+            "symbol": symbols[i],
+            "kind": kind,
+            "z": float(z[i, 0] if kind == "volume" else z[i, 1]),
+            "quote_volume": float(quote_volume[i]),
+            "change": float(values[i, 1]),
+        })
+    baselines.last_alert[rows[flagged]] = now
+    anomalies.sort(key=lambda a: abs(a["z"]), reverse=True)
+
+    bucket = int(now // ANOMALY_BUCKET)
+    if bucket != baselines.bucket:
+        baselines.update(rows, values)
+        baselines.bucket = bucket
+    return anomalies
+
+
+def format_anomalies(anomalies):
+    lines = ["<b>Atividade Anómala (1h) ⚠️</b>"]
+    for a in anomalies[:ANOMALY_MAX_ALERTS]:
+        base = a["symbol"].removesuffix("USDT")
+        change_icon = "🟢" if a["change"] >= 0 else "🔴"
+        label = "Volume anómalo" if a["kind"] == "volume" else "Volatilidade anómala"
+        lines.append(
+            f"<b>{base}</b>: {label} (z={a['z']:+.1f}) · "
+            f"${a['quote_volume']:,.0f} na hora · {change_icon} {a['change']:+.2f}%"
+        )
+    if len(anomalies) > ANOMALY_MAX_ALERTS:
+        lines.append(f"... e mais {len(anomalies) - ANOMALY_MAX_ALERTS} pares.")
+    return "\n".join(lines)
+
+
+def run_cycle(send=True):
+    """Uma ronda: tickers de 1h de todos os pares USDT, deteção e alerta."""
+    try:
+        with metrics.span("fetch_tickers"):
+            pairs = sorted(get_tradable_symbols("USDT") or [])
+            tickers = get_rolling_tickers(pairs, "1h") if pairs else {}
+    except requests.exceptions.RequestException as e:
+        print(f"Erro ao buscar os tickers de 1h da Binance: {e}")
+        return None
+    if not tickers:
+        print("Nenhum ticker de 1h disponível.")
+        return None
+
+    baselines = EwmaBaselines.load(SERIES)
+    started = time.perf_counter()
+    with metrics.span("analysis", count=len(tickers)):
+        anomalies = detect(baselines, *hourly_observations(tickers))
+    print(
+        f"{len(tickers)} pares analisados em {(time.perf_counter() - started) * 1000:.1f} ms; "
+        f"{len(anomalies)} anomalias."
+    )
+    metrics.count("anomalies_total", value=len(anomalies))
+    try:
+        baselines.save()
+    except OSError as e:
+        print(f"Aviso: não foi possível gravar as linhas de base: {e}")
+
+    if anomalies:
+        message = format_anomalies(anomalies)
+        print(message)
+        if send:
+            from telegram_delivery import deliver
+            deliver(message)
+    return anomalies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Alertas de volume/volatilidade anómalos")
+    parser.add_argument("--dry-run", action="store_true", help="deteta sem enviar")
+    args = parser.parse_args()
+    with metrics.run("anomalias"):
+        run_cycle(send=not args.dry_run)
@@ -0,0 +1,321 @@
+"""Backtest das heurísticas de price action e da observação da Análise VIP.
+
+Repete o histórico de velas de 1h de cada moeda pela mesma classificação de
+analyze_klines (price_action.classify sobre janelas deslizantes, sem loops
+em Python) e mede o que acontece a seguir a cada sinal. As moedas são
+repartidas por um pool de processos; cada processo lê o ficheiro mapeado
+do kline_store e devolve só contagens.
+
+Também faz grid search dos limiares de generate_observation (banda lateral
+de ±0,5% na variação de 24h e ±10% na tendência de 7 dias) e, com --grid,
+da distância "próximo da máxima/mínima" de analyze_klines (0,1%).
+
+Uso:
+    python backtest.py --symbols BTC ETH SOL --years 3     # descarrega e testa
+    python backtest.py --all-markets --years 2 --grid
+    python backtest.py                                     # só o histórico já guardado
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from kline_store import CLOSE, HIGH, LOW, OPEN, VOLUME, load_klines, stored_symbols
+from price_action import C, DEFAULT_NEAR, DEFAULT_WINDOW, SIGNAL_TEXTS, classify
+
+# --- CONFIGURAÇÕES ---
+BACKTEST_INTERVAL = "1h"
+# Horizontes (em velas) em que se mede o que acontece depois de cada sinal
+DEFAULT_HORIZONS = (1, 4, 24)
+# Um sinal "lateral" acerta se o preço ficar dentro desta banda (%)
+LATERAL_BAND = 0.5
+# Limiares atuais de generate_observation
+CURRENT_LATERAL_THRESHOLD = 0.5
+CURRENT_TREND_THRESHOLD = 10.0
+# Grelhas de limiares testadas
+LATERAL_GRID = np.round(np.arange(0.1, 3.01, 0.1), 2)
+TREND_GRID = np.arange(2.0, 40.1, 1.0)
+NEAR_GRID = (0.0005, 0.001, 0.002, 0.005)
+# Amostras mínimas para um limiar entrar na escolha do melhor
+MIN_SAMPLES = 200
+
+SIGNALS = tuple(SIGNAL_TEXTS)
+# Direção que cada sinal antecipa: +1 alta, -1 baixa, 0 lateral
+SIGNAL_DIRECTION = np.array([1, -1, 1, -1, 0])
+SIGNAL_NAMES = ("pressão compradora", "pressão vendedora", "impulso de alta", "pressão vendedora (final)", "lateral")
+
+OBSERVATION_LABELS = ("lateral", "positiva", "negativa")
+TREND_LABELS = ("forte tendência", "tendência", "correção/consolidação")
+
+HOURS_24 = 24
+HOURS_7D = 24 * 7
+
+
+def forward_returns(close, ends, horizon):
+    """Retorno (%) de close[fim] até close[fim + horizon]; NaN sem futuro suficiente."""
+    future = ends + horizon
+    valid = future < len(close)
+    result = np.full(len(ends), np.nan)
+    result[valid] = (close[future[valid]] / close[ends[valid]] - 1) * 100
+    return result
+
+
+def signal_stats(ohlcv, horizons, window=DEFAULT_WINDOW, near_grid=(DEFAULT_NEAR,), lateral_band=LATERAL_BAND):
+    """Contagens, acertos e soma dos retornos por (near, sinal, horizonte)."""
+    close = ohlcv[:, C]
+    # Janelas deslizantes sem cópia: (janelas, 5, velas) -> (janelas, velas, 5)
+    windows = np.lib.stride_tricks.sliding_window_view(ohlcv, window, axis=0).swapaxes(-1, -2)
+    ends = np.arange(window - 1, len(ohlcv))
+    forwards = np.stack([forward_returns(close, ends, h) for h in horizons])  # (horizontes, janelas)
+    valid = ~np.isnan(forwards)
+    direction = np.sign(np.nan_to_num(forwards))
+
+    shape = (len(near_grid), len(SIGNALS), len(horizons))
+    counts, hits, returns = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    for n, near in enumerate(near_grid):
+        signal = classify(windows, near=near)["signal"]
+        for s in SIGNALS:
+            mask = (signal == s) & valid
+            counts[n, s] = mask.sum(axis=1)
+            returns[n, s] = np.where(mask, forwards, 0).sum(axis=1)
+            if SIGNAL_DIRECTION[s]:
+                hit = direction == SIGNAL_DIRECTION[s]
+            else:
+                hit = np.abs(np.nan_to_num(forwards)) < lateral_band
+            hits[n, s] = (mask & hit).sum(axis=1)
+
+    # Taxa base: fração de horizontes que fecham em alta, sem condição
+    base = np.stack([valid.sum(axis=1), (valid & (direction > 0)).sum(axis=1)])
+    return counts, hits, returns, base
+
+
+def observation_stats(close, lateral_grid=LATERAL_GRID, trend_grid=TREND_GRID):
+    """Acertos das regras de generate_observation para todos os limiares da grelha.
+
+    Lateral/positiva/negativa (variação de 24h vs ±t): acerta se as 24h
+    seguintes ficarem dentro da banda / fecharem em alta / em baixa.
+    Tendência de 7 dias das ganhadoras (24h > 0) e perdedoras (24h < 0):
+    acerta se o movimento continuar nas 24h seguintes.
+    """
+    ends = np.arange(HOURS_7D, len(close) - HOURS_24)
+    if not len(ends):
+        return np.zeros((len(lateral_grid), 3, 2)), np.zeros((len(trend_grid), 2, 3, 2))
+    change_24h = (close[ends] / close[ends - HOURS_24] - 1) * 100
+    change_7d = (close[ends] / close[ends - HOURS_7D] - 1) * 100
+    next_24h = (close[ends + HOURS_24] / close[ends] - 1) * 100
+
+    # (limiares, amostras) por broadcasting
+    t = np.asarray(lateral_grid)[:, None]
+    lateral = np.abs(change_24h) <= t
+    positive = change_24h > t
+    negative = change_24h < -t
+    lateral_stats = np.stack([
+        np.stack([lateral.sum(1), (lateral & (np.abs(next_24h) <= t)).sum(1)], axis=-1),
+        np.stack([positive.sum(1), (positive & (next_24h > 0)).sum(1)], axis=-1),
+        np.stack([negative.sum(1), (negative & (next_24h < 0)).sum(1)], axis=-1),
+    ], axis=1)
+
+    T = np.asarray(trend_grid)[:, None]
+    trend_stats = np.zeros((len(trend_grid), 2, 3, 2))
+    for side, (movers, trend, continued) in enumerate((
+        (change_24h > 0, change_7d, next_24h > 0),
+        (change_24h < 0, -change_7d, next_24h < 0),
+    )):
+        opposite = np.broadcast_to(movers & (trend <= 0), (len(trend_grid), len(trend)))
+        labels = (movers & (trend > T), movers & (trend > 0) & (trend <= T), opposite)
+        for label, mask in enumerate(labels):
+            trend_stats[:, side, label, 0] = mask.sum(1)
+            trend_stats[:, side, label, 1] = (mask & continued).sum(1)
+    return lateral_stats, trend_stats
+
+
+def backtest_symbol(symbol, interval, horizons, near_grid, lateral_band):
+    """Corre num processo do pool: lê o histórico de um símbolo e devolve contagens."""
+    klines = np.asarray(load_klines(symbol, interval))
+    if len(klines) < HOURS_7D + HOURS_24 + DEFAULT_WINDOW:
+        return symbol, 0, None
+    ohlcv = np.ascontiguousarray(klines[:, [OPEN, HIGH, LOW, CLOSE, VOLUME]])
+    signals = signal_stats(ohlcv, horizons, near_grid=near_grid, lateral_band=lateral_band)
+    observations = observation_stats(ohlcv[:, C])
+    return symbol, len(klines), signals + observations
+
+
+def run_backtest(symbols, interval=BACKTEST_INTERVAL, horizons=DEFAULT_HORIZONS, near_grid=(DEFAULT_NEAR,),
+                 lateral_band=LATERAL_BAND, workers=None):
+    """Soma as contagens de todas as moedas. Devolve (moedas, velas, totais)."""
+    task = partial(backtest_symbol, interval=interval, horizons=tuple(horizons),
+                   near_grid=tuple(near_grid), lateral_band=lateral_band)
+    totals = None
+    used = 0
+    candles = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for symbol, n, stats in executor.map(task, symbols, chunksize=max(1, len(symbols) // 64)):
+            if stats is None:
+                continue
+            used += 1
+            candles += n
+            totals = list(stats) if totals is None else [a + b for a, b in zip(totals, stats)]
+    return used, candles, totals
+
+
+def download_history(symbols, years, interval=BACKTEST_INTERVAL):
+    """Completa o histórico local de cada símbolo até `years` anos atrás."""
+    import requests
+
+    from binance_api import run_concurrently
+    from kline_store import backfill_klines, sync_klines
+
+    since_ms = (time.time() - years * 365 * 86400) * 1000
+
+    def fetch(symbol):
+        try:
+            sync_klines(symbol, interval)
+            return backfill_klines(symbol, interval, since_ms)
+        except requests.exceptions.RequestException as e:
+            print(f"Erro ao descarregar o histórico de {symbol}: {e}")
+            return 0
+
+    added = run_concurrently({symbol: partial(fetch, symbol) for symbol in symbols})
+    print(f"Histórico: {sum(added.values())} velas novas em {len(symbols)} símbolos.")
+
+
+def _pct(hits, count):
+    return f"{hits / count * 100:5.1f}%" if count else "    -"
+
+
+def print_signal_report(totals, horizons, near_grid):
+    counts, hits, returns, base = totals[:4]
+    default = near_grid.index(DEFAULT_NEAR) if DEFAULT_NEAR in near_grid else 0
+    header = " | ".join(f"{h:>3}h: acerto  média " for h in horizons)
+    print(f"\n--- Sinais de price action (near={near_grid[default]:g}) ---")
+    print(f"{'sinal':<26} {'amostras':>9} | {header}")
+    for s in SIGNALS:
+        cells = " | ".join(
+            f"{'':>4} {_pct(hits[default, s, i], counts[default, s, i])} {returns[default, s, i] / max(counts[default, s, i], 1):+6.2f}%"
+            for i in range(len(horizons))
+        )
+        print(f"{SIGNAL_NAMES[s]:<26} {int(counts[default, s, 0]):>9} | {cells}")
+    cells = " | ".join(f"{'':>4} {_pct(base[1, i], base[0, i])} {'':>7}" for i in range(len(horizons)))
+    print(f"{'(base: fecha em alta)':<26} {int(base[0, 0]):>9} | {cells}")
+
+    if len(near_grid) > 1:
+        print(f"\n--- Distância à máxima/mínima (horizonte {horizons[0]}h) ---")
+        for n, near in enumerate(near_grid):
+            buy, sell = SIGNALS[0], SIGNALS[1]
+            print(
+                f"near={near:<7g} compradora {_pct(hits[n, buy, 0], counts[n, buy, 0])} ({int(counts[n, buy, 0])})"
+                f"  vendedora {_pct(hits[n, sell, 0], counts[n, sell, 0])} ({int(counts[n, sell, 0])})"
+            )
+
+
+def best_threshold(grid, accuracy, samples):
+    eligible = samples >= MIN_SAMPLES
+    if not eligible.any():
+        return None
+    return grid[np.argmax(np.where(eligible, accuracy, -1))]
+
+
+def print_observation_report(totals):
+    lateral_stats, trend_stats = totals[4:]
+    print("\n--- Observação: banda lateral de BTC/ETH (variação 24h, acerto nas 24h seguintes) ---")
+    samples = lateral_stats[:, :, 0].sum(1)
+    accuracy = lateral_stats[:, :, 1].sum(1) / np.maximum(samples, 1)
+    for i, t in enumerate(LATERAL_GRID):
+        marker = "  <- atual" if np.isclose(t, CURRENT_LATERAL_THRESHOLD) else ""
+        labels = "  ".join(
+            f"{name} {_pct(lateral_stats[i, j, 1], lateral_stats[i, j, 0])}" for j, name in enumerate(OBSERVATION_LABELS)
+        )
+        print(f"±{t:<4g}%  global {accuracy[i] * 100:5.1f}%  {labels}{marker}")
+    best = best_threshold(LATERAL_GRID, accuracy, samples)
+    if best is not None:
+        print(f"Melhor banda: ±{best:g}% (atual ±{CURRENT_LATERAL_THRESHOLD:g}%)")
+
+    print("\n--- Observação: tendência de 7 dias (continuação nas 24h seguintes) ---")
+    strong = trend_stats[:, :, 0, :].sum(1)
+    plain = trend_stats[:, :, 1, :].sum(1)
+    strong_rate = strong[:, 1] / np.maximum(strong[:, 0], 1)
+    plain_rate = plain[:, 1] / np.maximum(plain[:, 0], 1)
+    for i, T in enumerate(TREND_GRID):
+        marker = "  <- atual" if np.isclose(T, CURRENT_TREND_THRESHOLD) else ""
+        print(
+            f"±{T:<4g}%  forte {_pct(strong[i, 1], strong[i, 0])} ({int(strong[i, 0])})"
+            f"  normal {_pct(plain[i, 1], plain[i, 0])} ({int(plain[i, 0])})"
+            f"  diferença {(strong_rate[i] - plain_rate[i]) * 100:+5.1f} p.p.{marker}"
+        )
+    best = best_threshold(TREND_GRID, strong_rate - plain_rate, strong[:, 0])
+    if best is not None:
+        print(f"Limiar com maior diferença forte/normal: ±{best:g}% (atual ±{CURRENT_TREND_THRESHOLD:g}%)")
+
+
+def totals_to_json(totals, horizons, near_grid):
+    counts, hits, returns, base, lateral_stats, trend_stats = totals
+    return {
+        "horizons": list(horizons),
+        "near_grid": list(near_grid),
+        "signals": {
+            SIGNAL_NAMES[s]: {
+                f"near={near:g}": [
+                    {"horizon": h, "count": int(counts[n, s, i]), "hits": int(hits[n, s, i]), "return_sum": float(returns[n, s, i])}
+                    for i, h in enumerate(horizons)
+                ]
+                for n, near in enumerate(near_grid)
+            }
+            for s in SIGNALS
+        },
+        "base": [{"horizon": h, "count": int(base[0, i]), "up": int(base[1, i])} for i, h in enumerate(horizons)],
+        "lateral_grid": {
+            f"{t:g}": {name: lateral_stats[i, j].astype(int).tolist() for j, name in enumerate(OBSERVATION_LABELS)}
+            for i, t in enumerate(LATERAL_GRID)
+        },
+        "trend_grid": {
+            f"{T:g}": {
+                side: {name: trend_stats[i, k, j].astype(int).tolist() for j, name in enumerate(TREND_LABELS)}
+                for k, side in enumerate(("gainers", "losers"))
+            }
+            for i, T in enumerate(TREND_GRID)
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest das heurísticas do Giro e da Análise VIP")
+    parser.add_argument("--symbols", nargs="*", help="moedas sem o sufixo USDT (padrão: todo o histórico guardado)")
+    parser.add_argument("--all-markets", action="store_true", help="todos os pares USDT em negociação")
+    parser.add_argument("--years", type=float, default=0, help="descarrega o histórico em falta até N anos atrás")
+    parser.add_argument("--horizons", type=int, nargs="+", default=list(DEFAULT_HORIZONS))
+    parser.add_argument("--grid", action="store_true", help="testa também várias distâncias à máxima/mínima")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--json", help="grava os resultados neste ficheiro")
+    args = parser.parse_args()
+
+    if args.all_markets:
+        from exchange_info_cache import get_tradable_symbols
+        symbols = sorted(get_tradable_symbols("USDT") or [])
+    elif args.symbols:
+        symbols = [f"{s.upper()}USDT" for s in args.symbols]
+    else:
+        symbols = stored_symbols(BACKTEST_INTERVAL)
+
+    if args.years:
+        download_history(symbols, args.years)
+
+    near_grid = NEAR_GRID if args.grid else (DEFAULT_NEAR,)
+    started = time.perf_counter()
+    used, candles, totals = run_backtest(symbols, horizons=args.horizons, near_grid=near_grid, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    if not used:
+        print("Sem histórico suficiente (use --years para descarregar).")
+        raise SystemExit(1)
+    print(f"{used} moedas, {candles:,} velas de {BACKTEST_INTERVAL} em {elapsed:.1f}s ({args.workers} processos).")
+
+    print_signal_report(totals, args.horizons, list(near_grid))
+    print_observation_report(totals)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(totals_to_json(totals, args.horizons, list(near_grid)), f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.json}")
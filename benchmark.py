@@ -0,0 +1,250 @@
+"""Benchmarks offline: relatórios ponta a ponta e micro-benchmarks.
+
+Os relatórios correm contra o fake_apis.py (CMC, Binance e Telegram locais),
+sem rede nem chaves reais, com latência e erros injetáveis. A primeira
+execução de cada relatório é a fria (cache local vazia); as seguintes usam
+a cache em disco, como no workflow. Os micro-benchmarks medem as funções de
+análise e formatação com 10, 100 e 1000 moedas.
+
+Uso:
+    python benchmark.py
+    python benchmark.py --latency 0.05 --error-rate 0.05 --repeat 5
+    python benchmark.py --micro-only --sizes 10 100 1000
+    python benchmark.py --save base.json
+    python benchmark.py --compare base.json --tolerance 0.25   # sai com 1 se houver regressões
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+from fake_apis import SyntheticMarket, add_injection_arguments, build_market, parse_injections, start_fake_apis
+
+DEFAULT_SIZES = (10, 100, 1000)
+# Tempo mínimo de cada medição dos micro-benchmarks (segundos)
+MICRO_MIN_TIME = 0.2
+MICRO_REPEAT = 5
+
+
+def configure_environment(server=None):
+    """Aponta os módulos para o servidor falso e para uma cache temporária.
+
+    Tem de correr antes de importar os scripts: as URLs e diretórios são
+    lidos das variáveis de ambiente no import.
+    """
+    os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-cache-")
+    os.environ.setdefault("CMC_API_KEY", "benchmark")
+    os.environ["BOT_TOKEN"] = "benchmark"
+    os.environ["CHAT_IDS_VIP"] = "1001,1002,-1003"
+    if server:
+        os.environ.update(server.env())
+
+
+def load_reports():
+    """{nome: função} dos relatórios, importados depois de configurar o ambiente."""
+    import crypto_scanner_v2
+    import crypto_scanner_vip
+    from scheduler_daemon import giro_madrugada_vip
+
+    return {
+        "giro_madrugada_vip": giro_madrugada_vip.main,
+        "giro_all_markets": lambda: giro_madrugada_vip.main(all_markets=True),
+        "analise_vip": crypto_scanner_v2.main,
+        "scanner_vip": crypto_scanner_vip.main,
+    }
+
+
+def reset_process_state():
+    """Limpa o estado em memória que um processo novo não teria."""
+    import cmc_client
+    import telegram_delivery
+
+    cmc_client.quotes.invalidate()
+    with telegram_delivery._chat_buckets_lock:
+        telegram_delivery._chat_buckets.clear()
+
+
+def run_report(server, fn, verbose=False):
+    """Corre um relatório e devolve (segundos, pedidos por endpoint)."""
+    reset_process_state()
+    server.reset_stats()
+    output = sys.stdout if verbose else io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        fn()
+    elapsed = time.perf_counter() - started
+    return elapsed, dict(server.stats)
+
+
+def benchmark_reports(server, repeat=3, verbose=False):
+    results = {}
+    for name, fn in load_reports().items():
+        times = []
+        cold_requests = None
+        for i in range(repeat):
+            elapsed, requests_made = run_report(server, fn, verbose)
+            times.append(elapsed)
+            if i == 0:
+                cold_requests = requests_made
+        warm = times[1:] or times
+        results[name] = {
+            "cold": times[0],
+            "warm_best": min(warm),
+            "warm_median": statistics.median(warm),
+            "requests_cold": cold_requests,
+            "messages": len(server.sent),
+        }
+    return results
+
+
+def print_report_results(results):
+    print(f"{'Relatório':<22} {'Fria':>9} {'Quente':>9} {'Mediana':>9}  Pedidos (fria)")
+    for name, r in results.items():
+        total = sum(v for k, v in r["requests_cold"].items() if not k.endswith("__errors__"))
+        errors = sum(v for k, v in r["requests_cold"].items() if k.endswith("__errors__"))
+        print(
+            f"{name:<22} {r['cold'] * 1000:>7.0f}ms {r['warm_best'] * 1000:>7.0f}ms "
+            f"{r['warm_median'] * 1000:>7.0f}ms  {total} ({errors} erros injetados)"
+        )
+
+
+# --- Micro-benchmarks ---
+
+def time_call(fn):
+    """Segundos por chamada (melhor de MICRO_REPEAT medições de ~MICRO_MIN_TIME)."""
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * MICRO_MIN_TIME / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=MICRO_REPEAT, number=number)) / number
+
+
+@contextlib.contextmanager
+def patched(module, name, value):
+    """Substitui temporariamente uma constante de um módulo (ex.: SYMBOLS)."""
+    original = getattr(module, name)
+    setattr(module, name, value)
+    try:
+        yield
+    finally:
+        setattr(module, name, original)
+
+
+def micro_inputs(size, market):
+    """Dados sintéticos com `size` moedas, no formato que cada função recebe."""
+    symbols = market.symbols[:size]
+    klines = {s: market.klines(s, "1h", limit=7) for s in symbols}
+    quotes = {s: market.cmc_quote(s) for s in symbols}
+    ranked = sorted(({"symbol": s, "quote": q} for s, q in quotes.items()), key=lambda x: x["quote"]["percent_change_24h"])
+    dynamic_data = {"gainers": ranked[::-1], "losers": ranked}
+    return symbols, klines, quotes, dynamic_data
+
+
+def benchmark_micro(sizes=DEFAULT_SIZES):
+    import crypto_scanner_v2
+    import crypto_scanner_vip
+    from price_action import analyze_klines_batch
+    from scheduler_daemon import giro_madrugada_vip
+
+    largest = max(sizes)
+    market = SyntheticMarket(n_symbols=max(largest, len(crypto_scanner_v2.FIXED_SYMBOLS)))
+    results = {}
+    for size in sizes:
+        symbols, klines, quotes, dynamic_data = micro_inputs(size, market)
+        prices = [q["price"] for q in quotes.values()]
+        fixed_prices = {s: market.cmc_quote(s) for s in crypto_scanner_v2.FIXED_SYMBOLS}
+        vip_prices = {s: {k: q[k] for k in ("price", "percent_change_24h", "percent_change_7d")} for s, q in quotes.items()}
+
+        cases = {
+            "analyze_klines": lambda: [giro_madrugada_vip.analyze_klines(k) for k in klines.values()],
+            "analyze_klines_batch": lambda: analyze_klines_batch(klines),
+            "format_price": lambda: [giro_madrugada_vip.format_price(p) for p in prices],
+            "v2.generate_observation": lambda: crypto_scanner_v2.generate_observation(fixed_prices, dynamic_data),
+            "v2.format_scanner_message": lambda: crypto_scanner_v2.format_scanner_message(fixed_prices, dynamic_data),
+        }
+        for name, fn in cases.items():
+            results[f"{name}@{size}"] = time_call(fn)
+
+        # O Scanner VIP percorre SYMBOLS: o tamanho é o número de moedas seguidas
+        with patched(crypto_scanner_vip, "SYMBOLS", symbols):
+            results[f"vip.generate_observation@{size}"] = time_call(lambda: crypto_scanner_vip.generate_observation(vip_prices))
+            results[f"vip.format_scanner_message@{size}"] = time_call(lambda: crypto_scanner_vip.format_scanner_message(vip_prices))
+    return results
+
+
+def format_duration(seconds):
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} µs"
+
+
+def print_micro_results(results):
+    for name, seconds in results.items():
+        print(f"{name:<34} {format_duration(seconds):>12}")
+
+
+def compare(results, baseline, tolerance):
+    """Compara com um ficheiro guardado. Devolve a lista de regressões."""
+    regressions = []
+    for section in ("reports", "micro"):
+        for name, value in results.get(section, {}).items():
+            old = baseline.get(section, {}).get(name)
+            if old is None:
+                continue
+            new_time = value["warm_best"] if section == "reports" else value
+            old_time = old["warm_best"] if section == "reports" else old
+            ratio = new_time / old_time if old_time else float("inf")
+            marker = ""
+            if ratio > 1 + tolerance:
+                marker = "  <-- REGRESSÃO"
+                regressions.append(name)
+            print(f"{name:<34} {format_duration(old_time):>12} -> {format_duration(new_time):>12} ({ratio:.2f}x){marker}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks offline dos relatórios VIP")
+    parser.add_argument("--repeat", type=int, default=3, help="execuções de cada relatório (a primeira é fria)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="moedas nos micro-benchmarks")
+    parser.add_argument("--micro-only", action="store_true")
+    parser.add_argument("--reports-only", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="mostra a saída dos relatórios")
+    parser.add_argument("--save", help="grava os resultados neste ficheiro JSON")
+    parser.add_argument("--compare", help="compara com resultados gravados com --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="abrandamento aceite antes de acusar regressão")
+    add_injection_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    if not args.micro_only:
+        server = start_fake_apis(build_market(args), parse_injections(args))
+    configure_environment(server)
+
+    results = {}
+    if server:
+        print(f"--- Relatórios ponta a ponta ({len(server.market.symbols)} moedas, {args.repeat} execuções) ---")
+        results["reports"] = benchmark_reports(server, repeat=args.repeat, verbose=args.verbose)
+        print_report_results(results["reports"])
+        server.shutdown()
+    if not args.reports_only:
+        print(f"\n--- Micro-benchmarks ({', '.join(map(str, args.sizes))} moedas) ---")
+        results["micro"] = benchmark_micro(args.sizes)
+        print_micro_results(results["micro"])
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResultados gravados em {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n--- Comparação com {args.compare} ---")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressões acima de {args.tolerance:.0%}.")
+            sys.exit(1)
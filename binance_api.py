@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# --- CONFIGURAÇÕES ---
+BINANCE_API_BASE = os.environ.get("BINANCE_API_BASE", "https://api.binance.com/api/v3")
+
+# Orçamento de peso por minuto da Binance (limite oficial por IP: 6000)
+BINANCE_WEIGHT_LIMIT = int(os.environ.get("BINANCE_WEIGHT_LIMIT", "6000"))
+# Fração do orçamento que nos permitimos usar (margem para outros processos no mesmo IP)
+BINANCE_WEIGHT_SAFETY = float(os.environ.get("BINANCE_WEIGHT_SAFETY", "0.8"))
+# Número máximo de pedidos simultâneos
+BINANCE_MAX_WORKERS = int(os.environ.get("BINANCE_MAX_WORKERS", "10"))
+# Quantas vezes repetir um pedido recusado por rate limit (429/418)
+BINANCE_MAX_RETRIES = 2
+
+
+class WeightLimiter:
+    """Controla o peso usado na janela de 1 minuto da Binance.
+
+    O valor local é reservado antes de cada pedido e corrigido com o
+    cabeçalho X-MBX-USED-WEIGHT-1M devolvido pela exchange.
+    """
+
+    def __init__(self, limit, safety=BINANCE_WEIGHT_SAFETY):
+        self.budget = int(limit * safety)
+        self.used = 0
+        self.window = int(time.time() // 60)
+        self.blocked_until = 0.0
+        self.condition = threading.Condition()
+
+    def _roll_window(self, now):
+        minute = int(now // 60)
+        if minute != self.window:
+            self.window = minute
+            self.used = 0
+
+    def acquire(self, weight):
+        """Bloqueia até haver orçamento para um pedido com o peso indicado."""
+        with self.condition:
+            while True:
+                now = time.time()
+                self._roll_window(now)
+                if now < self.blocked_until:
+                    self.condition.wait(self.blocked_until - now)
+                    continue
+                if self.used + weight <= self.budget or self.used == 0:
+                    self.used += weight
+                    return
+                # Sem orçamento: esperar pelo início do próximo minuto
+                self.condition.wait(60 - now % 60)
+
+    def update(self, headers):
+        """Sincroniza o peso usado com o valor informado pela Binance."""
+        value = headers.get("X-MBX-USED-WEIGHT-1M") or headers.get("X-MBX-USED-WEIGHT")
+        if not value:
+            return
+        with self.condition:
+            self._roll_window(time.time())
+            self.used = max(self.used, int(value))
+        metrics.gauge("binance_used_weight_1m", int(value))
+        metrics.gauge("binance_weight_budget_1m", self.budget)
+
+    def block(self, seconds):
+        """Suspende todos os pedidos (resposta 429/418 com Retry-After)."""
+        with self.condition:
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+            self.condition.notify_all()
+
+
+# Sessão partilhada (keep-alive) com pool do tamanho do número de workers
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=BINANCE_MAX_WORKERS))
+session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=BINANCE_MAX_WORKERS))
+metrics.instrument_session(session, "binance")
+
+limiter = WeightLimiter(BINANCE_WEIGHT_LIMIT)
+
+
+def binance_get(path, params=None, weight=1, timeout=10, decode=None):
+    """Faz um GET à API da Binance respeitando o orçamento de peso.
+
+    Com `decode`, o corpo é lido em streaming e o resultado é
+    decode(response) em vez de response.json() (ver json_stream).
+    Levanta requests.exceptions.RequestException em caso de erro, tal como
+    response.raise_for_status().
+    """
+    url = f"{BINANCE_API_BASE}/{path}"
+    for attempt in range(BINANCE_MAX_RETRIES + 1):
+        limiter.acquire(weight)
+        response = session.get(url, params=params, timeout=timeout, stream=decode is not None)
+        limiter.update(response.headers)
+        if response.status_code in (418, 429) and attempt < BINANCE_MAX_RETRIES:
+            response.close()
+            retry_after = int(response.headers.get("Retry-After", "60"))
+            print(f"Rate limit da Binance atingido em /{path}. Aguardando {retry_after}s...")
+            limiter.block(retry_after)
+            metrics.count("http_retries_total", service="binance", reason=str(response.status_code))
+            continue
+        if decode is None:
+            response.raise_for_status()
+            return response.json()
+        with response:
+            response.raise_for_status()
+            return decode(response)
+
+
+def run_concurrently(calls, max_workers=BINANCE_MAX_WORKERS):
+    """Executa um dicionário {chave: função sem argumentos} em paralelo.
+
+    Devolve {chave: resultado}, preservando a ordem das chaves.
+    """
+    if not calls:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as executor:
+        futures = {key: executor.submit(metrics.propagate(call)) for key, call in calls.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+
+def ticker_24h_weight(count):
+    """Peso do /ticker/24hr segundo o número de símbolos pedidos (0 = todos)."""
+    if count == 0 or count > 100:
+        return 80
+    if count > 20:
+        return 40
+    return 2
+
+
+def get_tickers_24h(symbols=None):
+    """Busca os tickers de 24h de vários símbolos num único pedido.
+
+    Devolve {símbolo: ticker}. Acima de 100 símbolos o peso é o mesmo de
+    pedir o mercado inteiro, por isso buscamos tudo e filtramos localmente.
+    """
+    symbols = list(symbols or [])
+    if symbols and len(symbols) <= 100:
+        params = {'symbols': json.dumps(symbols, separators=(",", ":"))}
+        weight = ticker_24h_weight(len(symbols))
+    else:
+        params = None
+        weight = ticker_24h_weight(0)
+    data = binance_get("ticker/24hr", params=params, weight=weight)
+    tickers = {t["symbol"]: t for t in data}
+    if symbols:
+        tickers = {s: tickers[s] for s in symbols if s in tickers}
+    return tickers
+
+
+def get_rolling_tickers(symbols, window_size="1h"):
+    """Estatísticas de janela móvel (/ticker?windowSize=...) de vários símbolos.
+
+    O peso é 4 por símbolo (máx. 200 por pedido), por isso os símbolos são
+    pedidos em lotes de 50 em paralelo. Devolve {símbolo: ticker}.
+    """
+    symbols = list(symbols)
+    batches = [symbols[i:i + 50] for i in range(0, len(symbols), 50)]
+    calls = {
+        i: partial(
+            binance_get,
+            "ticker",
+            params={'symbols': json.dumps(batch, separators=(",", ":")), 'windowSize': window_size},
+            weight=4 * len(batch),
+        )
+        for i, batch in enumerate(batches)
+    }
+    tickers = {}
+    for data in run_concurrently(calls).values():
+        tickers.update((t["symbol"], t) for t in data)
+    return tickers
@@ -0,0 +1,338 @@
+"""Ingestão em tempo real dos streams de kline e miniTicker da Binance.
+
+Mantém em memória, por símbolo, a mesma janela de 7 velas usada por
+analyze_klines, atualizada em O(1) a cada mensagem: máxima/mínima do
+período por deques monotónicos, soma de volume corrente e variação da
+janela. Relatórios e alertas leem o estado atual sem pedidos à rede.
+
+Requer o pacote websocket-client (pip install websocket-client).
+
+Uso:
+    python binance_stream.py BTC ETH SOL          # imprime o estado a cada 10s
+    python binance_stream.py --all-markets
+    python binance_stream.py BTC --record frames.jsonl
+    python binance_stream.py BTC --replay frames.jsonl
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from price_action import DEFAULT_WINDOW, SIGNAL_TEXTS, classify_signal
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+# --- CONFIGURAÇÕES ---
+BINANCE_WS_BASE = os.environ.get("BINANCE_WS_BASE", "wss://stream.binance.com:9443")
+# A Binance aceita até 1024 streams por ligação; usamos 2 por símbolo
+STREAMS_PER_CONNECTION = 1000
+# Os streams são pedidos com mensagens SUBSCRIBE depois de ligar (um URL com
+# 1000 streams teria ~20 KB); a Binance aceita até 5 mensagens por segundo
+SUBSCRIBE_CHUNK = 200
+SUBSCRIBE_INTERVAL = 0.25
+RECONNECT_DELAY_MAX = 60
+
+
+class RollingWindow:
+    """Janela das últimas `size` velas de um símbolo, atualizada em O(1).
+
+    A vela em curso é atualizada no lugar; dentro de uma vela a máxima só
+    sobe e a mínima só desce, por isso os deques monotónicos continuam
+    válidos sem recalcular a janela.
+    """
+
+    def __init__(self, size=DEFAULT_WINDOW):
+        self.size = size
+        # Cada vela: [open_time, open, high, low, close, volume]
+        self.candles = deque()
+        self.max_high = deque()  # (open_time, high), decrescente
+        self.min_low = deque()   # (open_time, low), crescente
+        self.volume_sum = 0.0
+
+    def update(self, open_time, open_, high, low, close, volume):
+        """Aplica uma atualização de kline (vela nova ou a vela em curso)."""
+        if self.candles and open_time < self.candles[-1][0]:
+            return  # mensagem atrasada de uma vela já fechada
+        if self.candles and open_time == self.candles[-1][0]:
+            candle = self.candles[-1]
+            self.volume_sum += volume - candle[5]
+            candle[2], candle[3], candle[4], candle[5] = high, low, close, volume
+        else:
+            self.candles.append([open_time, open_, high, low, close, volume])
+            self.volume_sum += volume
+            if len(self.candles) > self.size:
+                expired = self.candles.popleft()
+                self.volume_sum -= expired[5]
+                while self.max_high and self.max_high[0][0] <= expired[0]:
+                    self.max_high.popleft()
+                while self.min_low and self.min_low[0][0] <= expired[0]:
+                    self.min_low.popleft()
+
+        while self.max_high and self.max_high[-1][1] <= high:
+            self.max_high.pop()
+        self.max_high.append((open_time, high))
+        while self.min_low and self.min_low[-1][1] >= low:
+            self.min_low.pop()
+        self.min_low.append((open_time, low))
+
+    def is_ready(self):
+        return len(self.candles) >= self.size
+
+    def state(self):
+        """Resumo da janela no formato de analyze_klines, ou None se incompleta."""
+        if not self.is_ready():
+            return None
+        first_open = self.candles[0][1]
+        last_close = self.candles[-1][4]
+        prev_close = self.candles[-2][4]
+        period_high = self.max_high[0][1]
+        period_low = self.min_low[0][1]
+        change = ((last_close - first_open) / first_open) * 100 if first_open != 0 else 0
+        signal = classify_signal(first_open, last_close, prev_close, period_high, period_low)
+        return {
+            "change": change,
+            "total_volume": self.volume_sum,
+            "period_high": period_high,
+            "period_low": period_low,
+            "last_close": last_close,
+            "signal": signal,
+            "analysis_text": [SIGNAL_TEXTS[signal]],
+        }
+
+
+class MarketState:
+    """Estado em memória de todos os símbolos seguidos (thread-safe)."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.windows = {}
+        self.tickers = {}
+        self.lock = threading.Lock()
+        self.messages = 0
+
+    def handle_message(self, raw):
+        """Processa uma mensagem (texto JSON) de um stream combinado.
+
+        Devolve False para as respostas aos pedidos SUBSCRIBE, que não são dados.
+        """
+        message = json.loads(raw)
+        if "result" in message and "id" in message:
+            return False
+        data = message.get("data", message)
+        event = data.get("e")
+        with self.lock:
+            self.messages += 1
+            if event == "kline":
+                k = data["k"]
+                window = self.windows.get(data["s"])
+                if window is None:
+                    window = self.windows[data["s"]] = RollingWindow(self.window)
+                window.update(k["t"], float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]))
+            elif event == "24hrMiniTicker":
+                open_ = float(data["o"])
+                close = float(data["c"])
+                self.tickers[data["s"]] = {
+                    "lastPrice": close,
+                    "openPrice": open_,
+                    "highPrice": float(data["h"]),
+                    "lowPrice": float(data["l"]),
+                    "volume": float(data["v"]),
+                    "quoteVolume": float(data["q"]),
+                    "priceChangePercent": (close - open_) / open_ * 100 if open_ else 0.0,
+                    "eventTime": data["E"],
+                }
+        return True
+
+    def seed(self, symbol, klines):
+        """Preenche a janela de um símbolo com klines da API REST."""
+        with self.lock:
+            window = self.windows[symbol] = RollingWindow(self.window)
+            for k in klines[-self.window:]:
+                window.update(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+
+    def get(self, symbol):
+        """Janela e ticker atuais de um símbolo (ex.: 'BTCUSDT')."""
+        with self.lock:
+            window = self.windows.get(symbol)
+            return {
+                "window": window.state() if window else None,
+                "ticker": dict(self.tickers[symbol]) if symbol in self.tickers else None,
+            }
+
+    def snapshot(self):
+        """Estado de todos os símbolos: {símbolo: {'window': ..., 'ticker': ...}}."""
+        with self.lock:
+            symbols = set(self.windows) | set(self.tickers)
+            return {
+                s: {
+                    "window": self.windows[s].state() if s in self.windows else None,
+                    "ticker": dict(self.tickers[s]) if s in self.tickers else None,
+                }
+                for s in symbols
+            }
+
+
+def stream_batches(symbols, interval="1h"):
+    """Streams (kline + miniTicker) de todos os símbolos, divididos por ligação."""
+    streams = []
+    for symbol in symbols:
+        s = symbol.lower()
+        streams.extend([f"{s}@kline_{interval}", f"{s}@miniTicker"])
+    return [streams[i:i + STREAMS_PER_CONNECTION] for i in range(0, len(streams), STREAMS_PER_CONNECTION)]
+
+
+def subscribe_messages(streams, first_id=1):
+    """Mensagens SUBSCRIBE (JSON) para uma ligação, SUBSCRIBE_CHUNK streams cada."""
+    return [
+        json.dumps({"method": "SUBSCRIBE", "params": streams[i:i + SUBSCRIBE_CHUNK], "id": first_id + n})
+        for n, i in enumerate(range(0, len(streams), SUBSCRIBE_CHUNK))
+    ]
+
+
+class BinanceStream:
+    """Mantém as ligações WebSocket abertas e alimenta um MarketState.
+
+    Cada ligação corre numa thread própria, pede os seus streams com
+    SUBSCRIBE ao abrir e volta a ligar (e a subscrever) com espera
+    exponencial se cair. `record_file` grava as mensagens recebidas (uma
+    por linha) para poderem ser repetidas com replay().
+    """
+
+    def __init__(self, symbols, interval="1h", state=None, base_url=BINANCE_WS_BASE, record_file=None):
+        if websocket is None:
+            raise RuntimeError("O modo streaming requer o pacote websocket-client (pip install websocket-client).")
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.state = state or MarketState()
+        self.url = f"{base_url}/stream"
+        self.batches = stream_batches(self.symbols, interval)
+        self.connections = 0
+        self.record = open(record_file, "a", encoding="utf-8") if record_file else None
+        self.record_lock = threading.Lock()
+        self.running = False
+        self.threads = []
+        self.apps = []
+
+    def _on_open(self, app, streams):
+        self.connections += 1
+        for i, message in enumerate(subscribe_messages(streams)):
+            if i:
+                time.sleep(SUBSCRIBE_INTERVAL)
+            app.send(message)
+
+    def _on_message(self, app, raw):
+        if self.state.handle_message(raw) and self.record:
+            with self.record_lock:
+                self.record.write(raw.strip() + "\n")
+
+    def _run(self, streams):
+        delay = 1
+        while self.running:
+            app = websocket.WebSocketApp(
+                self.url,
+                on_open=lambda app: self._on_open(app, streams),
+                on_message=self._on_message,
+                on_error=lambda app, e: print(f"Erro no stream da Binance: {e}"),
+            )
+            self.apps.append(app)
+            started = time.monotonic()
+            app.run_forever(ping_interval=60, ping_timeout=20)
+            if not self.running:
+                break
+            # Ligação estável durante um minuto: recomeçar a espera do início
+            if time.monotonic() - started > 60:
+                delay = 1
+            print(f"Stream da Binance desligado. Nova ligação em {delay}s...")
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    def start(self):
+        self.running = True
+        for streams in self.batches:
+            thread = threading.Thread(target=self._run, args=(streams,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        self.running = False
+        for app in self.apps:
+            app.close()
+        if self.record:
+            with self.record_lock:
+                self.record.close()
+                self.record = None
+
+
+def replay(path, state=None, speed=0):
+    """Repete mensagens gravadas (JSONL) num MarketState, sem rede.
+
+    Com speed > 0 respeita os intervalos entre eventos (campo E) divididos
+    por `speed`.
+    """
+    state = state or MarketState()
+    last_event = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if speed:
+                event_time = json.loads(line).get("data", {}).get("E")
+                if last_event and event_time:
+                    time.sleep(max(0, (event_time - last_event) / 1000 / speed))
+                last_event = event_time or last_event
+            state.handle_message(line)
+    return state
+
+
+def print_state(state, symbols):
+    for symbol in symbols:
+        current = state.get(symbol)
+        window, ticker = current["window"], current["ticker"]
+        price = f"{ticker['lastPrice']:g}" if ticker else "-"
+        if window:
+            print(f"{symbol}: {price} | 7 velas {window['change']:+.2f}% | vol {window['total_volume']:,.2f} | {window['analysis_text'][0]}")
+        else:
+            print(f"{symbol}: {price} | janela incompleta")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streams de kline/miniTicker da Binance")
+    parser.add_argument("symbols", nargs="*", help="moedas sem o sufixo USDT (ex.: BTC ETH)")
+    parser.add_argument("--all-markets", action="store_true", help="segue todos os pares USDT em negociação")
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--record", help="grava as mensagens recebidas neste ficheiro JSONL")
+    parser.add_argument("--replay", help="repete um ficheiro JSONL gravado em vez de ligar à Binance")
+    parser.add_argument("--no-seed", action="store_true", help="não preenche as janelas pela API REST")
+    args = parser.parse_args()
+
+    if args.all_markets:
+        from exchange_info_cache import get_tradable_symbols
+        symbols = sorted(get_tradable_symbols("USDT") or [])
+    else:
+        symbols = [f"{s.upper()}USDT" for s in args.symbols]
+
+    if args.replay:
+        state = replay(args.replay)
+        print_state(state, symbols or sorted(state.windows))
+    else:
+        state = MarketState()
+        if not args.no_seed:
+            from kline_store import get_klines
+            for symbol in symbols:
+                try:
+                    state.seed(symbol, get_klines(symbol, interval=args.interval, limit=DEFAULT_WINDOW))
+                except Exception as e:
+                    print(f"Erro ao preencher a janela de {symbol}: {e}")
+        stream = BinanceStream(symbols, interval=args.interval, state=state, record_file=args.record).start()
+        try:
+            while True:
+                time.sleep(10)
+                print_state(state, symbols[:20])
+        except KeyboardInterrupt:
+            stream.stop()
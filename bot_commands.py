@@ -0,0 +1,457 @@
+"""Servidor de comandos do bot: /preco, /top e /giro respondidos da memória.
+
+As respostas nunca fazem pedidos às APIs de mercado: saem de uma cache em
+memória que é atualizada em segundo plano, cada fonte no seu ritmo:
+
+- tickers de 24h de todos os pares da Binance (get_tickers_24h, peso 80);
+- Top Ganhadoras/Perdedoras da CMC (get_crypto_data da Análise VIP);
+- análise de price action do Giro (get_market_data) para as moedas
+  acompanhadas; um /giro de uma moeda nova só a junta à lista e pede uma
+  atualização em segundo plano.
+
+Os updates chegam por long polling (getUpdates) ou por um webhook local e
+são processados em paralelo. Pedidos iguais (mesmo comando e argumento)
+partilham a mesma renderização enquanto os dados de que dependem não mudam.
+
+Uso:
+    python bot_commands.py                    # long polling
+    python bot_commands.py --webhook 8443     # webhook local (atrás de um proxy HTTPS)
+"""
+import argparse
+import html
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import metrics
+from binance_api import get_tickers_24h
+from crypto_scanner_v2 import get_crypto_data
+from exchange_info_cache import get_tradable_symbols
+from scheduler_daemon import giro_madrugada_vip as giro
+from telegram_delivery import BOT_TOKEN, TELEGRAM_API_BASE, TELEGRAM_MAX_WORKERS, call_bot_api, session
+
+# --- CONFIGURAÇÕES ---
+# Intervalo de atualização de cada fonte da cache (segundos). A CMC gasta
+# créditos: ~1 por atualização das cotações e 1 por 200 moedas da listagem.
+BOT_TICKERS_REFRESH = float(os.environ.get("BOT_TICKERS_REFRESH", "15"))
+BOT_CMC_REFRESH = float(os.environ.get("BOT_CMC_REFRESH", "3600"))
+BOT_GIRO_REFRESH = float(os.environ.get("BOT_GIRO_REFRESH", "300"))
+# Máximo de moedas acompanhadas pelo /giro (além das do Giro da Madrugada)
+BOT_GIRO_MAX_TRACKED = int(os.environ.get("BOT_GIRO_MAX_TRACKED", "60"))
+# Long polling do getUpdates (segundos)
+BOT_LONG_POLL = int(os.environ.get("BOT_LONG_POLL", "25"))
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", str(TELEGRAM_MAX_WORKERS)))
+# Segredo do webhook (cabeçalho X-Telegram-Bot-Api-Secret-Token)
+BOT_WEBHOOK_SECRET = os.environ.get("BOT_WEBHOOK_SECRET")
+# Latências guardadas para o p50/p99
+BOT_LATENCY_SAMPLES = 5000
+# Máximo de respostas renderizadas guardadas (argumentos ao acaso não fazem
+# a memória crescer sem limite)
+BOT_REPLY_CACHE_MAX = int(os.environ.get("BOT_REPLY_CACHE_MAX", "1000"))
+
+HELP_TEXT = "\n".join([
+    "<b>Comandos do Bot VIP</b>",
+    "/preco SÍMBOLO — preço e variação de 24h (ex.: /preco SOL)",
+    "/top — maiores altas e baixas de 24h",
+    "/giro SÍMBOLO — price action das últimas 7h (1H) e multi-timeframe",
+])
+
+
+class CacheEntry:
+    __slots__ = ("version", "fetched_at", "value")
+
+    def __init__(self, version, fetched_at, value):
+        self.version = version
+        self.fetched_at = fetched_at
+        self.value = value
+
+
+class MarketCache:
+    """Fontes de mercado atualizadas em segundo plano, lidas sem bloquear.
+
+    `sources` é {nome: (função sem argumentos, intervalo em segundos)}; a
+    função devolve o valor novo ou None em caso de falha (fica o anterior).
+    Cada atualização bem-sucedida incrementa a versão da fonte.
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.entries = {}
+        self.due = {name: 0.0 for name in sources}
+        self.running = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="cache")
+
+    def get(self, name):
+        """CacheEntry atual da fonte, ou None se ainda não houve atualização."""
+        return self.entries.get(name)
+
+    def version(self, name):
+        entry = self.entries.get(name)
+        return entry.version if entry else 0
+
+    def request_refresh(self, name):
+        """Pede uma atualização da fonte o mais cedo possível (sem esperar)."""
+        with self.lock:
+            self.due[name] = 0.0
+        self.wake.set()
+
+    def refresh(self, name):
+        fetch, _ = self.sources[name]
+        try:
+            with metrics.span("cache_refresh", source=name):
+                value = fetch()
+        except Exception as e:
+            print(f"Erro ao atualizar a fonte {name}: {e}")
+            value = None
+        with self.lock:
+            if value is not None:
+                previous = self.entries.get(name)
+                self.entries[name] = CacheEntry((previous.version if previous else 0) + 1, time.time(), value)
+            self.due[name] = time.monotonic() + self.sources[name][1]
+            self.running.discard(name)
+        self.wake.set()
+        return value is not None
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            now = time.monotonic()
+            with self.lock:
+                ready = [n for n, due in self.due.items() if due <= now and n not in self.running]
+                self.running.update(ready)
+                pending = [due for n, due in self.due.items() if n not in self.running]
+            for name in ready:
+                self.executor.submit(self.refresh, name)
+            self.wake.wait(max(0.05, min(pending, default=now + 60) - now))
+            self.wake.clear()
+
+    def start(self, warm=True):
+        """Inicia o ciclo de atualização; com warm=True espera pela primeira carga."""
+        if warm:
+            list(self.executor.map(self.refresh, list(self.sources)))
+        threading.Thread(target=self._loop, name="market-cache", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+
+class ReplyCoalescer:
+    """Respostas renderizadas por chave, válidas enquanto as versões das fontes não mudam.
+
+    Pedidos iguais que chegam ao mesmo tempo esperam pela mesma renderização.
+    Quando as versões mudam, as respostas das versões antigas são descartadas
+    (nunca mais seriam usadas); acima de `max_entries` sai a mais antiga.
+    """
+
+    def __init__(self, max_entries=BOT_REPLY_CACHE_MAX):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.versions = None
+
+    def get(self, key, versions, render):
+        with self.lock:
+            if versions != self.versions:
+                self.entries = {k: e for k, e in self.entries.items() if e[0] == versions}
+                self.versions = versions
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == versions:
+                future, owner = entry[1], False
+            else:
+                future, owner = Future(), True
+                self.entries.pop(key, None)
+                self.entries[key] = (versions, future)
+                while len(self.entries) > self.max_entries:
+                    del self.entries[next(iter(self.entries))]
+        if owner:
+            try:
+                future.set_result(render())
+            except Exception as e:
+                future.set_exception(e)
+                with self.lock:
+                    self.entries.pop(key, None)
+        metrics.count("bot_replies_total", coalesced=str(not owner).lower())
+        return future.result()
+
+
+def parse_command(text):
+    """'/preco@MeuBot sol' -> ('/preco', 'SOL'); None se não for um comando."""
+    if not text or not text.startswith("/"):
+        return None
+    command, _, argument = text.strip().partition(" ")
+    argument = argument.strip().upper()
+    if argument.endswith("USDT") and len(argument) > 4:
+        argument = argument[:-4]
+    return command.split("@")[0].lower(), argument
+
+
+def _change_icon(change):
+    return "🟢" if change >= 0 else "🔴"
+
+
+class CommandBot:
+    """Responde a comandos a partir da MarketCache."""
+
+    def __init__(self, cache=None, tracked=None):
+        self.tracked = list(tracked if tracked is not None else giro.SYMBOLS)
+        self.tracked_lock = threading.Lock()
+        self.cache = cache or MarketCache({
+            "tickers": (self.fetch_tickers, BOT_TICKERS_REFRESH),
+            "cmc": (get_crypto_data, BOT_CMC_REFRESH),
+            "giro": (self.fetch_giro, BOT_GIRO_REFRESH),
+        })
+        self.replies = ReplyCoalescer()
+        self.executor = ThreadPoolExecutor(max_workers=BOT_WORKERS, thread_name_prefix="bot")
+        self.latencies = deque(maxlen=BOT_LATENCY_SAMPLES)
+        self.commands = {
+            "/start": self.reply_help,
+            "/ajuda": self.reply_help,
+            "/help": self.reply_help,
+            "/preco": self.reply_price,
+            "/top": self.reply_top,
+            "/giro": self.reply_giro,
+        }
+
+    # --- Fontes (chamadas só pela MarketCache, em segundo plano) ---
+
+    def fetch_tickers(self):
+        try:
+            return get_tickers_24h()
+        except requests.exceptions.RequestException as e:
+            print(f"Erro ao buscar tickers da Binance: {e}")
+            return None
+
+    def fetch_giro(self):
+        # Um símbolo sem ticker (deslistado) faria falhar o pedido de tickers em lote
+        tickers = self.cache.get("tickers")
+        with self.tracked_lock:
+            if tickers:
+                delisted = [s for s in self.tracked if f"{s}USDT" not in tickers.value]
+                if delisted:
+                    print(f"/giro: a deixar de acompanhar {', '.join(delisted)} (sem ticker na Binance).")
+                    self.tracked = [s for s in self.tracked if s not in delisted]
+            symbols = list(self.tracked)
+        analysis_results, _ = giro.get_market_data(symbols, multi_timeframe=True)
+        if not analysis_results:
+            return None
+        return {res["symbol"]: res for res in analysis_results}
+
+    # --- Respostas ---
+
+    def reply_help(self, argument):
+        return HELP_TEXT
+
+    def reply_price(self, argument):
+        if not argument:
+            return "Uso: /preco SÍMBOLO (ex.: /preco SOL)"
+        tickers = self.cache.get("tickers")
+        ticker = tickers.value.get(f"{argument}USDT") if tickers else None
+        if ticker is None:
+            return f"Par <b>{html.escape(argument)}USDT</b> não encontrado na Binance."
+        change = float(ticker["priceChangePercent"])
+        lines = [
+            f"<b>{html.escape(argument)}</b>: ${giro.format_price(ticker['lastPrice'])} {_change_icon(change)} ({change:+.2f}% 24h)",
+            f"Máx./mín. 24h: ${giro.format_price(ticker['highPrice'])} / ${giro.format_price(ticker['lowPrice'])}",
+            f"Volume 24h: ${giro.format_price(ticker['quoteVolume'])}",
+        ]
+        cmc = self.cache.get("cmc")
+        if cmc:
+            fixed_data, _ = cmc.value
+            quote = fixed_data.get(argument)
+            if quote and quote.get("percent_change_7d") is not None:
+                lines.append(f"Variação 7d (CMC): {quote['percent_change_7d']:+.2f}%")
+        return "\n".join(lines)
+
+    def reply_top(self, argument):
+        cmc = self.cache.get("cmc")
+        dynamic_data = cmc.value[1] if cmc else None
+        if dynamic_data:
+            gainers = [(d["symbol"], d["quote"]["percent_change_24h"]) for d in dynamic_data["gainers"]]
+            losers = [(d["symbol"], d["quote"]["percent_change_24h"]) for d in dynamic_data["losers"]]
+            source = "CoinMarketCap"
+        else:
+            tickers = self.cache.get("tickers")
+            if not tickers:
+                return "Dados de mercado ainda a carregar. Tente de novo daqui a instantes."
+            changes = sorted(
+                (float(t["priceChangePercent"]), s[:-4]) for s, t in tickers.value.items() if s.endswith("USDT")
+            )
+            gainers = [(s, c) for c, s in reversed(changes[-5:])]
+            losers = [(s, c) for c, s in changes[:5]]
+            source = "Binance"
+        lines = ["<b>Top 5 Ganhadoras (24h)</b>"]
+        lines.extend(f"<b>{s}</b> 🟢 {c:+.2f}%" for s, c in gainers if c > 0)
+        lines.extend(["", "<b>Top 5 Perdedoras (24h)</b>"])
+        lines.extend(f"<b>{s}</b> 🔴 {c:+.2f}%" for s, c in losers if c < 0)
+        lines.extend(["", f"<i>Fonte: {source}</i>"])
+        return "\n".join(lines)
+
+    def reply_giro(self, argument):
+        if not argument:
+            return "Uso: /giro SÍMBOLO (ex.: /giro BTC)"
+        giro_entry = self.cache.get("giro")
+        res = giro_entry.value.get(argument) if giro_entry else None
+        if res is None:
+            return self.track(argument)
+        lines = [
+            f"<b>{html.escape(argument)}</b> — Giro 1H (últimas 7 velas)",
+            f"Variação: {res['change_7h']:+.2f}% · Volume: ${giro.format_price(res['total_volume'])}",
+            " ".join(res["analysis_text"]),
+        ]
+        lines.extend(giro.format_timeframes([res]))
+        return "\n".join(lines)
+
+    def track(self, symbol):
+        """Passa a acompanhar uma moeda no /giro (atualização em segundo plano)."""
+        shown = html.escape(symbol)
+        tradable = get_tradable_symbols("USDT")
+        if tradable is None:
+            return "Lista de pares da Binance indisponível. Tente de novo daqui a instantes."
+        if f"{symbol}USDT" not in tradable:
+            return f"Par <b>{shown}USDT</b> não encontrado na Binance."
+        with self.tracked_lock:
+            if symbol not in self.tracked:
+                if len(self.tracked) >= len(giro.SYMBOLS) + BOT_GIRO_MAX_TRACKED:
+                    return f"Análise de <b>{shown}</b> indisponível: limite de moedas acompanhadas atingido."
+                self.tracked.append(symbol)
+                self.cache.request_refresh("giro")
+        return f"Análise de <b>{shown}</b> em preparação. Tente de novo daqui a instantes."
+
+    # --- Updates ---
+
+    def answer(self, update):
+        """Resposta a um update: (chat_id, message_id, texto) ou None."""
+        message = update.get("message")
+        if not message:
+            return None
+        parsed = parse_command(message.get("text"))
+        if parsed is None:
+            return None
+        command, argument = parsed
+        handler = self.commands.get(command)
+        if handler is None:
+            text = f"Comando desconhecido.\n\n{HELP_TEXT}"
+        else:
+            versions = tuple(self.cache.version(name) for name in ("tickers", "cmc", "giro"))
+            text = self.replies.get((command, argument), versions, lambda: handler(argument))
+        metrics.count("bot_commands_total", command=command if handler else "desconhecido")
+        return message["chat"]["id"], message.get("message_id"), text
+
+    def process(self, update, received_at=None):
+        """Responde a um update pelo sendMessage e regista a latência."""
+        received_at = time.monotonic() if received_at is None else received_at
+        try:
+            reply = self.answer(update)
+            if reply is None:
+                return
+            chat_id, message_id, text = reply
+            payload = {'chat_id': chat_id, 'text': text, 'parse_mode': 'HTML'}
+            if message_id:
+                payload['reply_to_message_id'] = message_id
+            response, _, error = call_bot_api("sendMessage", chat_id, payload)
+            if response is None:
+                print(f"Erro ao responder a {chat_id}: {error}")
+            self.latencies.append(time.monotonic() - received_at)
+        except Exception as e:
+            print(f"Erro ao processar o update {update.get('update_id')}: {e}")
+
+    def latency_stats(self):
+        """(p50, p99, n) das latências de resposta recentes, em segundos."""
+        samples = sorted(self.latencies)
+        if not samples:
+            return None, None, 0
+        return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))], len(samples)
+
+    def poll_forever(self, stop=None):
+        """Long polling do getUpdates; cada update é processado em paralelo."""
+        stop = stop or threading.Event()
+        url = f"{TELEGRAM_API_BASE}/bot{BOT_TOKEN}/getUpdates"
+        offset = None
+        while not stop.is_set():
+            params = {'timeout': BOT_LONG_POLL, 'allowed_updates': json.dumps(["message"])}
+            if offset is not None:
+                params['offset'] = offset
+            try:
+                response = session.post(url, data=params, timeout=BOT_LONG_POLL + 10)
+                response.raise_for_status()
+                updates = response.json().get("result", [])
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Erro no getUpdates: {e}")
+                stop.wait(5)
+                continue
+            received_at = time.monotonic()
+            for update in updates:
+                offset = update["update_id"] + 1
+                self.executor.submit(self.process, update, received_at)
+
+    def serve_webhook(self, host="0.0.0.0", port=8443):
+        """Webhook local: a resposta vai no próprio corpo da resposta HTTP."""
+        bot = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if BOT_WEBHOOK_SECRET and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != BOT_WEBHOOK_SECRET:
+                    self.send_response(403)
+                    self.end_headers()
+                    return
+                received_at = time.monotonic()
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    reply = bot.answer(json.loads(self.rfile.read(length) or b"{}"))
+                except (ValueError, KeyError) as e:
+                    print(f"Update inválido no webhook: {e}")
+                    reply = None
+                body = b"{}"
+                if reply is not None:
+                    chat_id, message_id, text = reply
+                    payload = {"method": "sendMessage", "chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+                    if message_id:
+                        payload["reply_to_message_id"] = message_id
+                    body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                if reply is not None:
+                    bot.latencies.append(time.monotonic() - received_at)
+
+        server = ThreadingHTTPServer((host, port), WebhookHandler)
+        server.daemon_threads = True
+        print(f"Webhook à escuta em {host}:{port}.")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor de comandos do Bot VIP")
+    parser.add_argument("--webhook", type=int, metavar="PORTA", help="recebe updates por webhook nesta porta")
+    args = parser.parse_args()
+    if not BOT_TOKEN:
+        print("Erro: BOT_TOKEN não configurado.")
+        raise SystemExit(1)
+
+    bot = CommandBot()
+    print("A carregar a cache de mercado...")
+    bot.cache.start()
+    try:
+        if args.webhook:
+            bot.serve_webhook(port=args.webhook)
+        else:
+            print("À espera de comandos (long polling)...")
+            bot.poll_forever()
+    except KeyboardInterrupt:
+        p50, p99, n = bot.latency_stats()
+        if n:
+            print(f"{n} respostas: p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms.")
@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from json_stream import read_records
+
+# O arquivo local de cotações usa numpy; sem ele as cotações seguem sem arquivo
+try:
+    from quote_archive import archive_quotes
+except ImportError:
+    archive_quotes = None
+
+# --- CONFIGURAÇÕES ---
+CMC_API_KEY = os.environ.get("CMC_API_KEY")
+CMC_API_BASE = os.environ.get("CMC_API_BASE", "https://pro-api.coinmarketcap.com/v1")
+CMC_URL_QUOTES = f"{CMC_API_BASE}/cryptocurrency/quotes/latest"
+CMC_URL_LISTINGS = f"{CMC_API_BASE}/cryptocurrency/listings/latest"
+
+# Validade das cotações em memória (segundos)
+CMC_QUOTES_TTL = float(os.environ.get("CMC_QUOTES_TTL", "60"))
+# Janela em que pedidos de cotações simultâneos são juntados num só (segundos)
+CMC_COALESCE_WINDOW = float(os.environ.get("CMC_COALESCE_WINDOW", "0.05"))
+# Créditos mensais do plano (Basic: 10.000) e percentagem que gera aviso
+CMC_MONTHLY_CREDIT_LIMIT = int(os.environ.get("CMC_MONTHLY_CREDIT_LIMIT", "10000"))
+CMC_CREDIT_WARNING = 0.8
+
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+CMC_CREDITS_FILE = os.path.join(CACHE_DIR, "cmc_credits.json")
+
+# Sessão partilhada por todos os scanners (keep-alive + cabeçalhos fixos)
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+session.headers.update({
+    'Accepts': 'application/json',
+    'X-CMC_PRO_API_KEY': CMC_API_KEY or "",
+})
+metrics.instrument_session(session, "cmc")
+
+_credits_lock = threading.Lock()
+
+
+def _current_month():
+    return datetime.now(timezone.utc).strftime("%Y-%m")
+
+
+def load_credit_usage():
+    """Devolve o consumo de créditos do mês corrente guardado em disco."""
+    try:
+        with open(CMC_CREDITS_FILE, "r", encoding="utf-8") as f:
+            usage = json.load(f)
+    except (OSError, ValueError):
+        usage = {}
+    if usage.get("month") != _current_month():
+        usage = {"month": _current_month(), "credits": 0, "calls": 0}
+    usage["limit"] = CMC_MONTHLY_CREDIT_LIMIT
+    return usage
+
+
+def record_credits(credit_count):
+    """Soma os créditos de uma chamada ao total do mês e avisa perto do limite."""
+    with _credits_lock:
+        usage = load_credit_usage()
+        usage["credits"] += credit_count
+        usage["calls"] += 1
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{CMC_CREDITS_FILE}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(usage, f)
+            os.replace(tmp_path, CMC_CREDITS_FILE)
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar o consumo de créditos da CMC: {e}")
+    metrics.count("cmc_credits_total", credit_count)
+    metrics.gauge("cmc_credits_used_month", usage["credits"])
+    metrics.gauge("cmc_credits_limit_month", CMC_MONTHLY_CREDIT_LIMIT)
+    if CMC_MONTHLY_CREDIT_LIMIT and usage["credits"] >= CMC_MONTHLY_CREDIT_LIMIT * CMC_CREDIT_WARNING:
+        print(f"Aviso: {usage['credits']}/{CMC_MONTHLY_CREDIT_LIMIT} créditos da CMC usados em {usage['month']}.")
+    return usage
+
+
+def cmc_get(url, params, timeout=15):
+    """GET à CoinMarketCap pela sessão partilhada, contabilizando os créditos.
+
+    Levanta requests.exceptions.RequestException em caso de erro.
+    """
+    response = session.get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    payload = response.json()
+    credit_count = payload.get("status", {}).get("credit_count")
+    if credit_count:
+        record_credits(credit_count)
+    return payload
+
+
+def cmc_get_records(url, params, array_key, record_type, timeout=15):
+    """Como cmc_get, mas lê `array_key` em streaming como registos compactos.
+
+    Só os campos de record_type.FIELDS são extraídos (ver json_stream).
+    Devolve a lista de registos; levanta requests.exceptions.RequestException
+    em caso de erro.
+    """
+    response = session.get(url, params=params, timeout=timeout, stream=True)
+    if not response.ok:
+        response.close()
+        response.raise_for_status()
+    meta = {"status.credit_count": None}
+    records = read_records(response, array_key, record_type, meta)
+    if meta["status.credit_count"]:
+        record_credits(meta["status.credit_count"])
+    return records
+
+
+class _QuoteBatch:
+    def __init__(self):
+        self.symbols = set()
+        self.done = threading.Event()
+        self.error = None
+
+
+class QuoteCoalescer:
+    """Cache curta de cotações com junção de pedidos sobrepostos.
+
+    Quem pede símbolos que não estão em cache abre (ou junta-se a) um lote;
+    o primeiro a abrir espera CMC_COALESCE_WINDOW e faz uma única chamada a
+    /quotes/latest com a união de todos os símbolos pedidos nesse intervalo.
+    """
+
+    def __init__(self, ttl=CMC_QUOTES_TTL, window=CMC_COALESCE_WINDOW):
+        self.ttl = ttl
+        self.window = window
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.batch = None
+
+    def _cached(self, symbols, now):
+        return {
+            s: self.cache[s][1] for s in symbols
+            if s in self.cache and now - self.cache[s][0] <= self.ttl
+        }
+
+    def get_quotes(self, symbols):
+        symbols = list(symbols)
+        with self.lock:
+            found = self._cached(symbols, time.time())
+            missing = [s for s in symbols if s not in found]
+            if not missing:
+                return found
+            leader = self.batch is None
+            if leader:
+                self.batch = _QuoteBatch()
+            batch = self.batch
+            batch.symbols.update(missing)
+
+        if leader:
+            time.sleep(self.window)
+            with self.lock:
+                self.batch = None
+            self._fetch(batch)
+        else:
+            batch.done.wait()
+
+        if batch.error:
+            raise batch.error
+        with self.lock:
+            result = {s: self.cache[s][1] for s in symbols if s in self.cache}
+        return result
+
+    def _fetch(self, batch):
+        params = {
+            'symbol': ','.join(sorted(batch.symbols)),
+            'convert': 'USD',
+            # Um símbolo desconhecido (ex.: gralha numa watchlist) não pode
+            # fazer falhar o lote partilhado: a CMC só o omite da resposta
+            'skip_invalid': 'true',
+        }
+        try:
+            data = cmc_get(CMC_URL_QUOTES, params)['data']
+            now = time.time()
+            with self.lock:
+                for symbol, item in data.items():
+                    self.cache[symbol] = (now, item['quote']['USD'])
+            # Cada cotação recebida fica também no arquivo local (quote_archive)
+            if archive_quotes is not None:
+                archive_quotes({symbol: item['quote']['USD'] for symbol, item in data.items()}, now)
+        except requests.exceptions.RequestException as e:
+            batch.error = e
+        except KeyError as e:
+            batch.error = requests.exceptions.RequestException(f"Resposta inesperada da CMC: falta {e}")
+        finally:
+            batch.done.set()
+
+    def invalidate(self):
+        with self.lock:
+            self.cache.clear()
+
+
+quotes = QuoteCoalescer()
+
+
+def get_quotes(symbols):
+    """Cotações USD por símbolo: {símbolo: quote['USD']}.
+
+    Levanta requests.exceptions.RequestException se a CMC falhar.
+    """
+    return quotes.get_quotes(symbols)
+
+
+def get_key_info():
+    """Consulta /key/info (não gasta créditos): plano e uso reportados pela CMC."""
+    try:
+        return cmc_get(f"{CMC_API_BASE}/key/info", params=None)['data']
+    except (requests.exceptions.RequestException, KeyError) as e:
+        print(f"Erro ao consultar /key/info da CoinMarketCap: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    usage = load_credit_usage()
+    print(f"Créditos usados por estes scripts em {usage['month']}: {usage['credits']}/{usage['limit']} ({usage['calls']} chamadas)")
+    key_info = get_key_info()
+    if key_info:
+        monthly = key_info.get("usage", {}).get("current_month", {})
+        print(f"Segundo a CMC: {monthly.get('credits_used')} usados, {monthly.get('credits_left')} restantes este mês.")
@@ -1,95 +1,145 @@
+import argparse
 import requests
 import os
 import json
 from operator import itemgetter
 
+import metrics
+from cmc_client import CMC_URL_LISTINGS, cmc_get_records
+from dashboard import update_dashboard
+from json_stream import ListingRecord
+from market_analytics import breadth_stats, describe_market, get_market_analytics
+from price_sources import PRICE_SOURCES, get_hedged_quotes
+from quote_archive import archive_quotes, describe_history, last_report, mark_report
+from ranking import TopK
+from snapshot_store import SnapshotFetch, format_freshness, refresh
+from telegram_delivery import deliver
+
 # --- CONFIGURAÇÕES ---
 # Lidas de variáveis de ambiente (padrão GitHub Actions)
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
-CMC_API_KEY = os.environ.get("CMC_API_KEY")
 CHAT_ID_VIP = os.environ.get("CHAT_ID_VIP")
 
 # Moedas fixas (BTC, ETH, BNB, SOL, XRP, ADA)
 FIXED_SYMBOLS = ["BTC", "ETH", "BNB", "SOL", "XRP", "ADA"]
 
-# URL base da API da CoinMarketCap
-CMC_URL_QUOTES = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
-CMC_URL_LISTINGS = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
-# URL base da API do Telegram
-TELEGRAM_URL = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+# Listagem dinâmica: quantas moedas percorrer (por ordem de market cap),
+# tamanho de cada página (200 moedas = 1 crédito) e filtros opcionais
+CMC_LISTINGS_TOTAL = int(os.environ.get("CMC_LISTINGS_TOTAL", "1000"))
+CMC_LISTINGS_PAGE_SIZE = int(os.environ.get("CMC_LISTINGS_PAGE_SIZE", "200"))
+CMC_MIN_VOLUME_24H = os.environ.get("CMC_MIN_VOLUME_24H")
+CMC_MIN_MARKET_CAP = os.environ.get("CMC_MIN_MARKET_CAP")
+# Quantas ganhadoras/perdedoras mostrar
+TOP_K = 5
+
+# Prazo de cada fonte antes de usar o último snapshot (segundos)
+CMC_QUOTES_DEADLINE = float(os.environ.get("CMC_QUOTES_DEADLINE", "8"))
+CMC_LISTINGS_DEADLINE = float(os.environ.get("CMC_LISTINGS_DEADLINE", "15"))
+ANALYTICS_DEADLINE = float(os.environ.get("ANALYTICS_DEADLINE", "20"))
+# Moedas citadas nas janelas do histórico local da observação
+HISTORY_SYMBOLS = ("BTC", "ETH")
+
+# Painel ao vivo: pode correr a cada minuto sem gastar créditos da CMC. As
+# moedas fixas vêm primeiro da Binance (peso ~26 por atualização, a CMC só
+# como cobertura) e a listagem (~5 créditos) e a análise de mercado (~100
+# pedidos de velas) são lidas do último snapshot enquanto tiver menos de
+# DASHBOARD_SNAPSHOT_TTL segundos; as execuções normais da Análise VIP
+# também o atualizam.
+DASHBOARD_PRICE_SOURCES = tuple(os.environ.get("DASHBOARD_PRICE_SOURCES", "binance,cmc").split(","))
+DASHBOARD_SNAPSHOT_TTL = float(os.environ.get("DASHBOARD_SNAPSHOT_TTL", "21600"))
 
 def get_crypto_data():
     """Busca dados das moedas fixas e da lista de Top Ganhadoras/Perdedoras."""
-    headers = {
-        'Accepts': 'application/json',
-        'X-CMC_PRO_API_KEY': CMC_API_KEY,
-    }
-    
-    # 1. Buscar dados das moedas fixas
-    fixed_params = {
-        'symbol': ','.join(FIXED_SYMBOLS),
-        'convert': 'USD',
-    }
-    
-    fixed_data = {}
-    try:
-        response = requests.get(CMC_URL_QUOTES, headers=headers, params=fixed_params, timeout=15)
-        response.raise_for_status()
-        data = response.json()['data']
-        for symbol in FIXED_SYMBOLS:
-            if symbol in data:
-                fixed_data[symbol] = data[symbol]['quote']['USD']
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar dados fixos: {e}")
+    fixed_data = get_fixed_data()
+    if fixed_data is None:
         return None
+    # Continua com os dados fixos se a busca dinâmica falhar
+    return fixed_data, get_dynamic_data() or {}
+
+def get_fixed_data(sources=PRICE_SOURCES):
+    """Busca as cotações das moedas fixas. Devolve None em caso de erro."""
+    # CoinMarketCap (cliente partilhado com o Scanner VIP), com a Binance como
+    # cobertura se a CMC atrasar ou falhar
+    with metrics.span("fetch_quotes", count=len(FIXED_SYMBOLS)):
+        fixed_data = get_hedged_quotes(FIXED_SYMBOLS, sources)
+    if not fixed_data or not all(symbol in fixed_data for symbol in ('BTC', 'ETH')):
+        print("Erro ao buscar dados fixos: nenhuma fonte de cotações respondeu.")
+        return None
+    return fixed_data
+
+def get_dynamic_data():
+    """Busca as Top Ganhadoras/Perdedoras. Devolve None se nenhuma página chegar."""
+    # Percorrer a listagem página a página, mantendo só as Top/Bottom K
+    # (memória O(k), sem ordenar o universo inteiro)
+    top_gainers = TopK(TOP_K, key=lambda x: x.percent_change_24h)
+    top_losers = TopK(TOP_K, key=lambda x: x.percent_change_24h, reverse=True)
+    # Cotações de todas as moedas percorridas, para o arquivo local (a
+    # primeira ocorrência de cada símbolo é a de maior capitalização)
+    archive = {}
+    # Variações de todas as moedas percorridas, para a amplitude do mercado
+    changes = []
 
-    # 2. Buscar a lista de moedas (para encontrar Top Ganhadoras/Perdedoras)
-    listing_params = {
-        'start': '1',
-        'limit': '100', # Limite para ter uma boa amostra
-        'convert': 'USD',
-    }
-    
-    dynamic_data = []
     try:
-        response = requests.get(CMC_URL_LISTINGS, headers=headers, params=listing_params, timeout=15)
-        response.raise_for_status()
-        data = response.json()['data']
-        
-        # Filtrar moedas que já estão na lista fixa
-        filtered_data = [
-            item for item in data 
-            if item['symbol'] not in FIXED_SYMBOLS
-        ]
-        
-        # Ordenar por variação de 24h
-        sorted_by_change = sorted(
-            filtered_data, 
-            key=lambda x: x['quote']['USD']['percent_change_24h'], 
-            reverse=True
-        )
-        
-        # Top 5 Ganhadoras (Top 5)
-        top_gainers = sorted_by_change[:5]
-        # Top 5 Perdedoras (Bottom 5)
-        top_losers = sorted_by_change[-5:]
-        
-        # Consolidar dados dinâmicos
-        for item in top_gainers + top_losers:
-            dynamic_data.append({
-                'symbol': item['symbol'],
-                'quote': item['quote']['USD']
-            })
-            
+        for page in iter_listings():
+            for item in page:
+                changes.append(item.percent_change_24h)
+                archive.setdefault(item.symbol, item.quote())
+                # Ignorar moedas que já estão na lista fixa
+                if item.symbol in FIXED_SYMBOLS:
+                    continue
+                top_gainers.push(item)
+                top_losers.push(item)
     except requests.exceptions.RequestException as e:
         print(f"Erro ao buscar lista dinâmica: {e}")
-        # Continua com os dados fixos se a busca dinâmica falhar
-        pass 
+        # Continua com as páginas já recebidas
+
+    archive_quotes(archive)
+
+    if not len(top_gainers):
+        return None
+
+    # Resultado já ranqueado: ganhadoras da maior para a menor variação,
+    # perdedoras da menor para a maior
+    return {
+        'gainers': [{'symbol': item.symbol, 'quote': item.quote()} for item in top_gainers.result()],
+        'losers': [{'symbol': item.symbol, 'quote': item.quote()} for item in top_losers.result()],
+        'breadth': breadth_stats(changes),
+    }
 
-    return fixed_data, dynamic_data
+def iter_listings():
+    """Lê /listings/latest em páginas até CMC_LISTINGS_TOTAL moedas (gerador de páginas).
 
-def generate_observation(fixed_prices, dynamic_data):
-    """Gera a observação analítica aprimorada."""
+    Cada página é lida em streaming e chega como lista de ListingRecord,
+    só com o símbolo e os campos da cotação em USD.
+    """
+    start = 1
+    while start <= CMC_LISTINGS_TOTAL:
+        listing_params = {
+            'start': str(start),
+            'limit': str(min(CMC_LISTINGS_PAGE_SIZE, CMC_LISTINGS_TOTAL - start + 1)),
+            'convert': 'USD',
+        }
+        # Filtros aplicados no servidor: não gastam créditos com moedas ilíquidas
+        if CMC_MIN_VOLUME_24H:
+            listing_params['volume_24h_min'] = CMC_MIN_VOLUME_24H
+        if CMC_MIN_MARKET_CAP:
+            listing_params['market_cap_min'] = CMC_MIN_MARKET_CAP
+
+        with metrics.span("fetch_listings", start=start):
+            page = cmc_get_records(CMC_URL_LISTINGS, listing_params, "data", ListingRecord)
+        yield page
+
+        if len(page) < int(listing_params['limit']):
+            break
+        start += len(page)
+
+def generate_observation(fixed_prices, dynamic_data, analytics=None, history=None):
+    """Gera a observação analítica aprimorada.
+
+    Com a amplitude da listagem e os analytics de correlação (quando
+    disponíveis), acrescenta uma frase sobre o mercado como um todo; com
+    `history` (frase do quote_archive), as janelas do histórico local.
+    """
     if not fixed_prices:
         return "Não foi possível gerar a observação devido a um erro na obtenção dos dados."
 
@@ -115,10 +165,10 @@ def generate_observation(fixed_prices, dynamic_data):
 
     # 2. Análise de Tendência de 7 dias para Top Ganhadora/Perdedora
     
-    # Encontrar a Top Ganhadora e Perdedora geral (entre as dinâmicas)
+    # Top Ganhadora e Perdedora geral (primeiras do resultado ranqueado)
     if dynamic_data:
-        top_gainer_dynamic = max(dynamic_data, key=lambda x: x['quote']['percent_change_24h'])
-        top_loser_dynamic = min(dynamic_data, key=lambda x: x['quote']['percent_change_24h'])
+        top_gainer_dynamic = dynamic_data['gainers'][0]
+        top_loser_dynamic = dynamic_data['losers'][0]
         
         # Analisar a Top Ganhadora
         gainer_symbol = top_gainer_dynamic['symbol']
@@ -152,47 +202,52 @@ def generate_observation(fixed_prices, dynamic_data):
         )
     else:
         observation = f"Observação: BTC {btc_status}, ETH {eth_status}. Não foi possível analisar o mercado dinâmico."
+
+    # 3. Amplitude, dispersão e correlação com o BTC
+    market = describe_market((dynamic_data or {}).get('breadth'), analytics)
+    if market:
+        observation = f"{observation} {market}"
+
+    # 4. Janelas do arquivo local de cotações (sem créditos extra)
+    if history:
+        observation = f"{observation} {history}"
         
     return observation
 
-def format_scanner_message(fixed_prices, dynamic_data):
-    """Monta a mensagem do Scanner VIP V2."""
-    if not fixed_prices:
-        return "Erro ao obter dados das criptomoedas. Tente novamente mais tarde."
+def format_fixed_line(symbol, quote):
+    """Linha de uma moeda fixa (as watchlists reaproveitam-na por símbolo)."""
+    if quote is None:
+        return f"<b>{symbol}</b>: Cotação não disponível."
+    price = quote['price']
+    formatted_price = f"${price:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    percent_change_24h = quote['percent_change_24h']
+    change_icon = "🟢" if percent_change_24h >= 0 else "🔴"
+    formatted_change = f"{percent_change_24h:+.2f}%"
+    return f"<b>{symbol}</b>: {formatted_price} {change_icon} ({formatted_change})"
 
-    message_parts = [
-        "<b>Análise VIP do Mercado Crypto</b>",
-        "",
-        "--- Moedas Fixas (6) ---",
-    ]
+def format_scanner_sections(fixed_prices, dynamic_data, analytics=None, history=None):
+    """Secções da mensagem do Scanner VIP V2, como lista de (nome, texto).
+
+    O painel ao vivo compara cada secção com a publicada para decidir se
+    edita a mensagem.
+    """
+    fixed_lines = ["--- Moedas Fixas (6) ---"]
     
     # 1. Lista de Moedas Fixas
     for symbol in FIXED_SYMBOLS:
-        if symbol in fixed_prices:
-            quote = fixed_prices[symbol]
-            price = quote['price']
-            formatted_price = f"${price:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-            percent_change_24h = quote['percent_change_24h']
-            change_icon = "🟢" if percent_change_24h >= 0 else "🔴"
-            formatted_change = f"{percent_change_24h:+.2f}%"
-            
-            message_parts.append(f"<b>{symbol}</b>: {formatted_price} {change_icon} ({formatted_change})")
-        else:
-            message_parts.append(f"<b>{symbol}</b>: Cotação não disponível.")
+        fixed_lines.append(format_fixed_line(symbol, fixed_prices.get(symbol)))
+
+    sections = [
+        ("header", "<b>Análise VIP do Mercado Crypto</b>"),
+        ("fixed", "\n".join(fixed_lines)),
+    ]
 
     # 2. Lista de Moedas Dinâmicas
     if dynamic_data:
-        message_parts.extend([
-            "",
-            "--- Top 5 Ganhadoras (24h) ---"
-        ])
+        gainer_lines = ["--- Top 5 Ganhadoras (24h) ---"]
         
-        # Ordenar Top 5 Ganhadoras
-        top_gainers = sorted(
-            [d for d in dynamic_data if d['quote']['percent_change_24h'] > 0],
-            key=lambda x: x['quote']['percent_change_24h'],
-            reverse=True
-        )[:5]
+        # Top 5 Ganhadoras (já ordenadas pelo ranking)
+        top_gainers = [d for d in dynamic_data['gainers'] if d['quote']['percent_change_24h'] > 0]
         
         for item in top_gainers:
             symbol = item['symbol']
@@ -200,19 +255,12 @@ def format_scanner_message(fixed_prices, dynamic_data):
             price = quote['price']
             formatted_price = f"${price:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
             formatted_change = f"{quote['percent_change_24h']:+.2f}%"
-            message_parts.append(f"<b>{symbol}</b>: {formatted_price} 🟢 ({formatted_change})")
+            gainer_lines.append(f"<b>{symbol}</b>: {formatted_price} 🟢 ({formatted_change})")
 
-        message_parts.extend([
-            "",
-            "--- Top 5 Perdedoras (24h) ---"
-        ])
+        loser_lines = ["--- Top 5 Perdedoras (24h) ---"]
         
-        # Ordenar Top 5 Perdedoras
-        top_losers = sorted(
-            [d for d in dynamic_data if d['quote']['percent_change_24h'] < 0],
-            key=lambda x: x['quote']['percent_change_24h'],
-            reverse=False
-        )[:5]
+        # Top 5 Perdedoras (já ordenadas pelo ranking)
+        top_losers = [d for d in dynamic_data['losers'] if d['quote']['percent_change_24h'] < 0]
         
         for item in top_losers:
             symbol = item['symbol']
@@ -220,53 +268,93 @@ def format_scanner_message(fixed_prices, dynamic_data):
             price = quote['price']
             formatted_price = f"${price:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
             formatted_change = f"{quote['percent_change_24h']:+.2f}%"
-            message_parts.append(f"<b>{symbol}</b>: {formatted_price} 🔴 ({formatted_change})")
+            loser_lines.append(f"<b>{symbol}</b>: {formatted_price} 🔴 ({formatted_change})")
+
+        sections.append(("gainers", "\n".join(gainer_lines)))
+        sections.append(("losers", "\n".join(loser_lines)))
 
     # 3. Observação Aprimorada
-    observation_text = generate_observation(fixed_prices, dynamic_data)
-    message_parts.extend([
-        "",
-        observation_text
-    ])
-    
-    return "\n".join(message_parts)
+    sections.append(("observation", generate_observation(fixed_prices, dynamic_data, analytics, history)))
+    return sections
+
+def format_scanner_message(fixed_prices, dynamic_data, analytics=None, history=None):
+    """Monta a mensagem do Scanner VIP V2."""
+    if not fixed_prices:
+        return "Erro ao obter dados das criptomoedas. Tente novamente mais tarde."
+
+    return "\n\n".join(text for _, text in format_scanner_sections(fixed_prices, dynamic_data, analytics, history))
 
 def send_telegram_message(text):
-    """Envia a mensagem formatada para o Telegram."""
-    if not BOT_TOKEN or not CHAT_ID_VIP:
-        print("Erro: BOT_TOKEN ou CHAT_ID_VIP não configurados nas variáveis de ambiente.")
-        return None
-        
-    payload = {
-        'chat_id': CHAT_ID_VIP,
-        'text': text,
-        'parse_mode': 'HTML'
-    }
+    """Envia a mensagem formatada para todos os chats VIP configurados."""
+    # Entrega em paralelo, com rate limit do Telegram, novas tentativas e
+    # divisão de mensagens longas
+    results = deliver(text)
+    if any(r["ok"] for r in results):
+        return results
+    return None
 
-    try:
-        response = requests.post(TELEGRAM_URL, data=payload, timeout=15)
-        response.raise_for_status()
-        print("Mensagem enviada com sucesso para o Telegram.")
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao enviar mensagem para o Telegram: {e}")
-        return None
+def main(dashboard=False):
+    """Função principal para executar o fluxo.
 
-def main():
-    """Função principal para executar o fluxo."""
+    Com dashboard=True atualiza o painel fixado (editMessageText só quando
+    alguma secção muda) em vez de enviar uma mensagem nova; a listagem e a
+    análise de mercado vêm do snapshot dentro de DASHBOARD_SNAPSHOT_TTL.
+    """
     print("Iniciando busca de preços para o Scanner VIP V2...")
-    fixed_prices, dynamic_data = get_crypto_data()
+    # Cada fonte tem o seu prazo; se falhar ou atrasar, a mensagem sai com o
+    # último snapshot bom enquanto a atualização continua em segundo plano
+    if dashboard:
+        fixed_fetch = SnapshotFetch("analise_vip_fixed", lambda: get_fixed_data(DASHBOARD_PRICE_SOURCES))
+    else:
+        fixed_fetch = SnapshotFetch("analise_vip_fixed", get_fixed_data)
+    ttl = DASHBOARD_SNAPSHOT_TTL if dashboard else None
+    dynamic_fetch = SnapshotFetch("analise_vip_listings", get_dynamic_data, ttl=ttl)
+    analytics_fetch = SnapshotFetch("analise_vip_analytics", get_market_analytics, ttl=ttl)
+    fixed_prices, fixed_stale_since = fixed_fetch.result(CMC_QUOTES_DEADLINE)
+    dynamic_data, dynamic_stale_since = dynamic_fetch.result(CMC_LISTINGS_DEADLINE)
+    analytics, analytics_stale_since = analytics_fetch.result(ANALYTICS_DEADLINE)
     
-    message_text = format_scanner_message(fixed_prices, dynamic_data)
+    if not fixed_prices:
+        print("Não foi possível enviar a mensagem devido a um erro na obtenção dos dados.")
+        return
+
+    with metrics.span("format"):
+        history = describe_history(HISTORY_SYMBOLS, since=last_report("analise_vip"))
+        sections = format_scanner_sections(fixed_prices, dynamic_data or {}, analytics, history)
+    stale_since = [t for t in (fixed_stale_since, dynamic_stale_since, analytics_stale_since) if t]
+    if stale_since:
+        sections.append(("freshness", format_freshness(min(stale_since))))
+    message_text = "\n\n".join(text for _, text in sections)
     print("\n--- Mensagem Formatada ---")
     print(message_text)
     print("--------------------------\n")
     
-    if "Erro" not in message_text:
-        send_telegram_message(message_text)
+    if dashboard:
+        update_dashboard("analise_vip", sections)
     else:
-        print("Não foi possível enviar a mensagem devido a um erro na obtenção dos dados.")
+        send_telegram_message(message_text)
+        mark_report("analise_vip")
+
+def main_dashboard():
+    """Atualização do painel ao vivo (para a agenda do daemon)."""
+    main(dashboard=True)
+
+def refresh_snapshots():
+    """Atualiza à mão os snapshots das duas fontes, sem enviar mensagem."""
+    refresh("analise_vip_fixed", get_fixed_data)
+    refresh("analise_vip_listings", get_dynamic_data)
+    refresh("analise_vip_analytics", get_market_analytics)
 
 if __name__ == "__main__":
     import requests # Importar requests aqui para o teste manual
-    main()
+    parser = argparse.ArgumentParser(description="Análise VIP do Mercado Crypto")
+    parser.add_argument("--refresh", action="store_true",
+                        help="só atualiza os snapshots locais, sem enviar mensagem")
+    parser.add_argument("--dashboard", action="store_true",
+                        help="atualiza o painel fixado em vez de enviar uma mensagem nova")
+    args = parser.parse_args()
+    with metrics.run("analise_vip_dashboard" if args.dashboard else "analise_vip"):
+        if args.refresh:
+            refresh_snapshots()
+        else:
+            main(dashboard=args.dashboard)
@@ -1,53 +1,33 @@
-import requests
+import argparse
 import json
 import os
 from datetime import datetime
 import pytz # Para lidar com fuso horário de Lisboa
 
+import metrics
+from price_sources import get_hedged_quotes
+from snapshot_store import fetch_with_deadline, format_freshness, refresh
+from telegram_delivery import deliver
+
 # --- CONFIGURAÇÕES ---
 # Token do seu bot do Telegram
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
-# Chave API da CoinMarketCap
-CMC_API_KEY = os.environ.get("CMC_API_KEY")
 # chat_id da SALA VIP
 CHAT_ID_VIP = os.environ.get("CHAT_ID_VIP")
 # Moedas que você quer no scanner
 SYMBOLS = ["BTC", "ETH", "BNB", "SOL", "XRP"]
-
-# URL base da API da CoinMarketCap
-CMC_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
-# URL base da API do Telegram
-TELEGRAM_URL = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+# Prazo da CMC antes de usar o último snapshot (segundos)
+CMC_DEADLINE = float(os.environ.get("CMC_DEADLINE", "8"))
 
 def get_prices():
-    """Busca dados das moedas na CoinMarketCap."""
-    headers = {
-        'Accepts': 'application/json',
-        'X-CMC_PRO_API_KEY': CMC_API_KEY,
-    }
-    parameters = {
-        'symbol': ','.join(SYMBOLS),
-        'convert': 'USD',
-    }
-
-    try:
-        response = requests.get(CMC_URL, headers=headers, params=parameters, timeout=15)
-        response.raise_for_status()
-        data = response.json()['data']
-
-        result = {}
-        for symbol in SYMBOLS:
-            if symbol in data:
-                quote = data[symbol]['quote']['USD']
-                result[symbol] = {
-                    "price": quote['price'],
-                    "percent_change_24h": quote['percent_change_24h'],
-                    "percent_change_7d": quote['percent_change_7d'],
-                }
-        return result
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao conectar à API da CoinMarketCap: {e}")
+    """Busca as cotações das moedas (CoinMarketCap, com a Binance como cobertura)."""
+    # A fonte secundária só é consultada se a primária atrasar ou falhar
+    with metrics.span("fetch_quotes", count=len(SYMBOLS)):
+        prices = get_hedged_quotes(SYMBOLS)
+    if not prices or not all(symbol in prices for symbol in SYMBOLS):
+        print("Erro: nenhuma fonte de cotações devolveu todas as moedas.")
         return None
+    return prices
 
 def generate_observation(prices):
     """Gera a observação analítica baseada na variação de 24h."""
@@ -127,28 +107,24 @@ def format_scanner_message(prices):
     return "\n".join(message_parts)
 
 def send_telegram_message(text):
-    """Envia a mensagem formatada para o Telegram."""
-    payload = {
-        'chat_id': CHAT_ID_VIP,
-        'text': text,
-        'parse_mode': 'HTML' # Usando HTML para negrito e emojis
-    }
-
-    try:
-        response = requests.post(TELEGRAM_URL, data=payload, timeout=15)
-        response.raise_for_status()
-        print("Mensagem enviada com sucesso para o Telegram.")
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao enviar mensagem para o Telegram: {e}")
-        return None
+    """Envia a mensagem formatada para todos os chats VIP configurados."""
+    # Entrega em paralelo, com rate limit do Telegram, novas tentativas e
+    # divisão de mensagens longas
+    results = deliver(text)
+    if any(r["ok"] for r in results):
+        return results
+    return None
 
 def main():
     """Função principal para executar o fluxo."""
     print("Iniciando busca de preços para o Scanner VIP...")
-    prices = get_prices()
+    # Se a CMC falhar ou atrasar, usa o último snapshot bom
+    prices, stale_since = fetch_with_deadline("scanner_vip_prices", get_prices, CMC_DEADLINE)
     
-    message_text = format_scanner_message(prices)
+    with metrics.span("format"):
+        message_text = format_scanner_message(prices)
+    if stale_since and "Erro" not in message_text:
+        message_text += "\n\n" + format_freshness(stale_since)
     print("\n--- Mensagem Formatada ---")
     print(message_text)
     print("--------------------------\n")
@@ -159,4 +135,12 @@ def main():
         print("Não foi possível enviar a mensagem devido a um erro na obtenção dos dados.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scanner VIP")
+    parser.add_argument("--refresh", action="store_true",
+                        help="só atualiza o snapshot local, sem enviar mensagem")
+    args = parser.parse_args()
+    with metrics.run("scanner_vip"):
+        if args.refresh:
+            refresh("scanner_vip_prices", get_prices)
+        else:
+            main()
@@ -0,0 +1,167 @@
+"""Painel ao vivo: uma mensagem fixada por chat, editada no lugar.
+
+Em vez de publicar uma mensagem nova a cada execução, o painel envia uma
+única mensagem, fixa-a no chat e depois só a edita (editMessageText) quando
+o conteúdo de alguma secção muda. Cada secção é comparada pelo seu hash com
+o que foi publicado; sem mudanças não há pedido nenhum ao Telegram. As
+edições de cada chat respeitam um intervalo mínimo (as alterações adiadas
+saem na execução seguinte).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from telegram_delivery import (
+    BOT_TOKEN, TELEGRAM_MAX_LENGTH, TELEGRAM_MAX_WORKERS, call_bot_api, get_chat_ids, telegram_length,
+)
+
+# --- CONFIGURAÇÕES ---
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+DASHBOARD_STATE_FILE = os.path.join(CACHE_DIR, "dashboard_state.json")
+# Intervalo mínimo entre edições do painel no mesmo chat (segundos)
+DASHBOARD_MIN_EDIT_INTERVAL = float(os.environ.get("DASHBOARD_MIN_EDIT_INTERVAL", "60"))
+# Fixar a mensagem do painel no chat quando é criada
+DASHBOARD_PIN = os.environ.get("DASHBOARD_PIN", "1") != "0"
+
+_state_lock = threading.Lock()
+
+
+def load_state():
+    """Estado publicado: {painel: {chat_id: {message_id, hashes, edited_at}}}."""
+    try:
+        with open(DASHBOARD_STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{DASHBOARD_STATE_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp_path, DASHBOARD_STATE_FILE)
+
+
+def section_hashes(sections):
+    """{nome da secção: hash do texto renderizado}."""
+    return {name: hashlib.sha1(text.encode("utf-8")).hexdigest() for name, text in sections}
+
+
+def render(sections):
+    return "\n\n".join(text for _, text in sections if text)
+
+
+def changed_sections(published, hashes):
+    """Nomes das secções novas, alteradas ou removidas desde a última publicação."""
+    return sorted(name for name in published.keys() | hashes.keys() if published.get(name) != hashes.get(name))
+
+
+def _create(chat_id, text, parse_mode):
+    """Envia a mensagem do painel e fixa-a. Devolve (message_id, erro)."""
+    response, _, error = call_bot_api("sendMessage", chat_id, {
+        'chat_id': chat_id,
+        'text': text,
+        'parse_mode': parse_mode,
+        'disable_notification': 'true',
+    })
+    if response is None:
+        return None, error
+    message_id = response.get("result", {}).get("message_id")
+    if DASHBOARD_PIN:
+        pinned, _, pin_error = call_bot_api("pinChatMessage", chat_id, {
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'disable_notification': 'true',
+        })
+        if pinned is None:
+            print(f"Aviso: não foi possível fixar o painel em {chat_id}: {pin_error}")
+    return message_id, None
+
+
+def _edit(chat_id, message_id, text, parse_mode):
+    """Edita a mensagem do painel. Devolve (ok, mensagem_perdida, erro)."""
+    response, _, error = call_bot_api("editMessageText", chat_id, {
+        'chat_id': chat_id,
+        'message_id': message_id,
+        'text': text,
+        'parse_mode': parse_mode,
+    })
+    if response is not None or "message is not modified" in (error or ""):
+        return True, False, None
+    # Mensagem apagada (ou antiga demais para editar): o painel é recriado
+    lost = "message to edit not found" in (error or "") or "message can't be edited" in (error or "")
+    return False, lost, error
+
+
+def update_chat(entry, chat_id, text, hashes, parse_mode='HTML', now=None):
+    """Atualiza o painel de um chat. Devolve (novo estado do chat, ação, erro).
+
+    Ações: "created", "edited", "unchanged", "deferred" ou "failed".
+    """
+    now = time.time() if now is None else now
+    if entry and entry.get("message_id"):
+        changed = changed_sections(entry.get("hashes", {}), hashes)
+        if not changed:
+            return entry, "unchanged", None
+        if now - entry.get("edited_at", 0) < DASHBOARD_MIN_EDIT_INTERVAL:
+            return entry, "deferred", None
+        ok, lost, error = _edit(chat_id, entry["message_id"], text, parse_mode)
+        if ok:
+            return {"message_id": entry["message_id"], "hashes": hashes, "edited_at": now}, "edited", None
+        if not lost:
+            return entry, "failed", error
+
+    message_id, error = _create(chat_id, text, parse_mode)
+    if message_id is None:
+        return entry, "failed", error
+    return {"message_id": message_id, "hashes": hashes, "edited_at": now}, "created", None
+
+
+def update_dashboard(key, sections, chat_ids=None, parse_mode='HTML'):
+    """Publica o painel `key` (lista de (nome, texto) por secção) em todos os chats.
+
+    Só há pedidos ao Telegram nos chats em que alguma secção mudou e cujo
+    intervalo mínimo entre edições já passou. Devolve {chat_id: ação}.
+    """
+    chat_ids = chat_ids if chat_ids is not None else get_chat_ids()
+    if not BOT_TOKEN or not chat_ids:
+        print("Erro: BOT_TOKEN ou CHAT_ID_VIP/CHAT_IDS_VIP não configurados.")
+        return {}
+
+    text = render(sections)
+    if telegram_length(text) > TELEGRAM_MAX_LENGTH:
+        print(f"Erro: o painel {key} excede {TELEGRAM_MAX_LENGTH} caracteres e não cabe numa mensagem.")
+        return {}
+    hashes = section_hashes(sections)
+
+    with _state_lock:
+        state = load_state()
+        published = state.setdefault(key, {})
+        with metrics.span("telegram_dashboard", chats=len(chat_ids)):
+            with ThreadPoolExecutor(max_workers=min(TELEGRAM_MAX_WORKERS, len(chat_ids))) as executor:
+                results = list(executor.map(
+                    metrics.propagate(lambda chat_id: update_chat(published.get(str(chat_id)), chat_id, text, hashes, parse_mode)),
+                    chat_ids,
+                ))
+
+        actions = {}
+        for chat_id, (entry, action, error) in zip(chat_ids, results):
+            if entry:
+                published[str(chat_id)] = entry
+            actions[chat_id] = action
+            metrics.count("dashboard_updates_total", action=action)
+            if error:
+                print(f"Erro ao atualizar o painel em {chat_id}: {error}")
+        try:
+            save_state(state)
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar o estado do painel: {e}")
+
+    summary = ", ".join(f"{chat_id}: {action}" for chat_id, action in actions.items())
+    print(f"Painel {key}: {summary}.")
+    return actions
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+import metrics
+from binance_api import binance_get
+from json_stream import SymbolRecord, iter_records
+
+# --- CONFIGURAÇÕES ---
+# Diretório da cache local (persistido entre execuções pelo workflow)
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+EXCHANGE_INFO_CACHE_FILE = os.path.join(CACHE_DIR, "exchange_info_index.json")
+# Validade do índice em segundos (padrão: 6 horas)
+EXCHANGE_INFO_TTL = int(os.environ.get("EXCHANGE_INFO_TTL", "21600"))
+# Timeout usado quando não há cópia local para recorrer
+EXCHANGE_INFO_TIMEOUT = 10
+
+_refresh_lock = threading.Lock()
+_refresh_thread = None
+
+
+def build_symbol_index(records):
+    """Reduz os pares do exchangeInfo a {símbolo: [status, quoteAsset, tickSize]}."""
+    return {r.symbol: [r.status, r.quote_asset, r.tick_size] for r in records}
+
+
+def fetch_symbol_index(timeout=EXCHANGE_INFO_TIMEOUT):
+    """Busca /exchangeInfo da Binance e devolve o índice de símbolos.
+
+    O documento (filtros, permissões e tipos de ordem de milhares de pares)
+    é lido em streaming e só symbol/status/quoteAsset/tickSize são
+    extraídos, sem montar a árvore completa em memória.
+    """
+    try:
+        return binance_get(
+            "exchangeInfo", weight=20, timeout=timeout,
+            decode=lambda response: build_symbol_index(iter_records(response, "symbols", SymbolRecord)),
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Erro ao buscar exchangeInfo: {e}")
+        return None
+
+
+def load_cached_index():
+    """Lê o índice guardado em disco. Devolve (fetched_at, index) ou (None, None)."""
+    try:
+        with open(EXCHANGE_INFO_CACHE_FILE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        return cached["fetched_at"], cached["symbols"]
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+
+def save_index(index):
+    """Grava o índice de forma atómica (ficheiro temporário + rename)."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{EXCHANGE_INFO_CACHE_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": time.time(), "symbols": index}, f, separators=(",", ":"))
+    os.replace(tmp_path, EXCHANGE_INFO_CACHE_FILE)
+
+
+def refresh_index(timeout=EXCHANGE_INFO_TIMEOUT):
+    """Descarrega o exchangeInfo, atualiza a cache e devolve o novo índice."""
+    index = fetch_symbol_index(timeout=timeout)
+    if not index:
+        return None
+    save_index(index)
+    return index
+
+
+def _refresh_in_background():
+    global _refresh_thread
+    with _refresh_lock:
+        if _refresh_thread and _refresh_thread.is_alive():
+            return
+        # Thread não-daemon: um script de execução única espera que a cache
+        # seja gravada antes de terminar.
+        _refresh_thread = threading.Thread(target=metrics.propagate(refresh_index), name="exchange-info-refresh")
+        _refresh_thread.start()
+
+
+def get_symbol_index(ttl=EXCHANGE_INFO_TTL):
+    """Devolve o índice compacto de símbolos, usando a cache local quando possível.
+
+    - cache válida: devolvida sem pedidos à rede;
+    - cache expirada: devolvida de imediato e revalidada em segundo plano;
+    - sem cache: pedido síncrono à Binance.
+    """
+    with metrics.span("exchange_info"):
+        fetched_at, index = load_cached_index()
+        if index is not None:
+            if time.time() - fetched_at > ttl:
+                _refresh_in_background()
+            return index
+        return refresh_index()
+
+
+def get_tradable_symbols(quote_asset="USDT", ttl=EXCHANGE_INFO_TTL):
+    """Conjunto dos pares em TRADING com o quote asset indicado."""
+    index = get_symbol_index(ttl=ttl)
+    if index is None:
+        return None
+    return {
+        symbol for symbol, (status, quote, tick_size) in index.items()
+        if status == "TRADING" and quote == quote_asset
+    }
@@ -0,0 +1,580 @@
+"""Servidor HTTP local que substitui a CoinMarketCap, a Binance e o Telegram.
+
+Serve respostas gravadas (diretório de fixtures) ou um mercado sintético
+determinístico, com latência e erros injetáveis por serviço. Os scripts
+apontam para ele pelas variáveis CMC_API_BASE, BINANCE_API_BASE e
+TELEGRAM_API_BASE; é a base do benchmark.py e funciona sem rede.
+
+Endpoints:
+    CMC      /cmc/v1/cryptocurrency/quotes/latest, /listings/latest, /key/info
+    Binance  /binance/api/v3/exchangeInfo, /klines, /ticker/24hr, /ticker
+    Telegram /telegram/bot<token>/<método> (sendMessage e restantes)
+
+Uso:
+    python fake_apis.py --port 8089 --latency 0.05 --error-rate 0.02
+    python fake_apis.py --record fixtures/     # grava respostas reais (requer CMC_API_KEY)
+    python fake_apis.py --fixtures fixtures/   # serve as respostas gravadas
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SERVICES = ("cmc", "binance", "telegram")
+
+# Símbolos reais usados pelos relatórios; o resto do mercado sintético é C0001, C0002, ...
+KNOWN_SYMBOLS = [
+    "BTC", "ETH", "BNB", "SOL", "XRP", "ADA", "RIVER", "1000PEPE", "DOGE", "ZEC", "SUI",
+    "SEI", "UNI", "ONDO", "ORDI", "NEAR", "LDO", "JUP", "TIA", "TRON", "AVAX",
+]
+
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+    "8h": 28_800_000, "12h": 43_200_000, "1d": 86_400_000, "3d": 259_200_000, "1w": 604_800_000,
+}
+
+# Peso de cada endpoint da Binance (para o cabeçalho X-MBX-USED-WEIGHT-1M)
+BINANCE_WEIGHTS = {"exchangeInfo": 20, "klines": 2, "ticker/24hr": 80, "ticker": 200}
+
+
+def _unit(*parts):
+    """Número pseudoaleatório em [0, 1) determinado pelas partes (estável entre execuções)."""
+    return zlib.crc32(":".join(str(p) for p in parts).encode()) / 2**32
+
+
+class SyntheticMarket:
+    """Mercado determinístico: o preço de um símbolo é função só do instante.
+
+    Não há estado a avançar, por isso qualquer vela de qualquer momento é
+    calculada em O(1) e pedidos repetidos devolvem sempre os mesmos valores.
+    """
+
+    def __init__(self, n_symbols=400, seed=42):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.symbols = KNOWN_SYMBOLS[:n_symbols] + [f"C{i:04d}" for i in range(1, n_symbols - len(KNOWN_SYMBOLS) + 1)]
+        self.base_price = {}
+        self.base_volume = {}
+        for symbol in self.symbols:
+            self.base_price[symbol] = math.exp(rng.uniform(-9, 11))
+            self.base_volume[symbol] = math.exp(rng.uniform(8, 16))
+
+    def price_at(self, symbol, ms):
+        base = self.base_price[symbol]
+        phase = _unit(self.seed, symbol) * 2 * math.pi
+        hours = ms / 3_600_000
+        trend = 0.08 * math.sin(hours / 97 + phase) + 0.03 * math.sin(hours / 11 + 2 * phase)
+        noise = 0.004 * (_unit(self.seed, symbol, int(ms // 60_000)) - 0.5)
+        return base * (1 + trend + noise)
+
+    def kline(self, symbol, interval, open_time):
+        step = INTERVAL_MS[interval]
+        open_ = self.price_at(symbol, open_time)
+        close = self.price_at(symbol, min(open_time + step, time.time() * 1000))
+        high = max(open_, close) * (1 + 0.006 * _unit(self.seed, symbol, open_time, "h"))
+        low = min(open_, close) * (1 - 0.006 * _unit(self.seed, symbol, open_time, "l"))
+        volume = self.base_volume[symbol] * (0.5 + _unit(self.seed, symbol, open_time, "v")) * step / 3_600_000
+        return [
+            open_time, f"{open_:.8f}", f"{high:.8f}", f"{low:.8f}", f"{close:.8f}", f"{volume:.8f}",
+            open_time + step - 1, f"{volume * close:.8f}", 100, f"{volume / 2:.8f}", f"{volume * close / 2:.8f}", "0",
+        ]
+
+    def klines(self, symbol, interval, limit=500, start_time=None, end_time=None):
+        """Velas como o /klines da Binance (a última pode estar aberta)."""
+        step = INTERVAL_MS[interval]
+        now = time.time() * 1000
+        last_open = int(min(end_time or now, now) // step * step)
+        if start_time is not None:
+            first_open = int(-(-int(start_time) // step) * step)
+            last_open = min(last_open, first_open + (limit - 1) * step)
+        else:
+            first_open = last_open - (limit - 1) * step
+        return [self.kline(symbol, interval, t) for t in range(first_open, last_open + 1, step)]
+
+    def window_change(self, symbol, window_ms):
+        now = time.time() * 1000
+        price = self.price_at(symbol, now)
+        before = self.price_at(symbol, now - window_ms)
+        return price, before, (price - before) / before * 100
+
+    def ticker(self, symbol, window_ms=86_400_000):
+        price, open_, change = self.window_change(symbol, window_ms)
+        volume = self.base_volume[symbol] * window_ms / 3_600_000
+        return {
+            "symbol": f"{symbol}USDT",
+            "priceChange": f"{price - open_:.8f}",
+            "priceChangePercent": f"{change:.3f}",
+            "lastPrice": f"{price:.8f}",
+            "openPrice": f"{open_:.8f}",
+            "highPrice": f"{max(price, open_) * 1.01:.8f}",
+            "lowPrice": f"{min(price, open_) * 0.99:.8f}",
+            "volume": f"{volume:.8f}",
+            "quoteVolume": f"{volume * price:.8f}",
+        }
+
+    def cmc_quote(self, symbol):
+        price = self.price_at(symbol, time.time() * 1000)
+        changes = {
+            f"percent_change_{label}": self.window_change(symbol, window_ms)[2]
+            for label, window_ms in (("1h", 3_600_000), ("24h", 86_400_000), ("7d", 604_800_000))
+        }
+        volume = self.base_volume[symbol] * 24 * price
+        return {
+            "price": price,
+            "volume_24h": volume,
+            "market_cap": volume * (20 + 80 * _unit(self.seed, symbol, "mcap")),
+            **changes,
+            "last_updated": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+        }
+
+    def cmc_item(self, rank, symbol):
+        return {
+            "id": rank,
+            "name": symbol,
+            "symbol": symbol,
+            "cmc_rank": rank,
+            "quote": {"USD": self.cmc_quote(symbol)},
+        }
+
+    def listings(self):
+        items = [self.cmc_item(rank, symbol) for rank, symbol in enumerate(self.symbols, start=1)]
+        items.sort(key=lambda item: item["quote"]["USD"]["market_cap"], reverse=True)
+        return items
+
+    def exchange_info(self):
+        return {
+            "timezone": "UTC",
+            "serverTime": int(time.time() * 1000),
+            "symbols": [
+                {
+                    "symbol": f"{symbol}USDT",
+                    "status": "TRADING",
+                    "baseAsset": symbol,
+                    "quoteAsset": "USDT",
+                    "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.00000001"}],
+                }
+                for symbol in self.symbols
+            ],
+        }
+
+
+class RecordedMarket:
+    """Respostas gravadas com --record, servidas tal como vieram da API.
+
+    Ficheiros: listings_latest.json, exchangeInfo.json, ticker_24hr.json e
+    klines_<SÍMBOLO>_<intervalo>.json. O que faltar vem do mercado sintético.
+    """
+
+    def __init__(self, path, fallback):
+        self.path = path
+        self.fallback = fallback
+        self.symbols = fallback.symbols
+        self._listings = self._load("listings_latest.json")
+        self._exchange_info = self._load("exchangeInfo.json")
+        self._tickers = self._load("ticker_24hr.json")
+        if self._listings:
+            self._listings = self._listings["data"]
+            self.symbols = [item["symbol"] for item in self._listings]
+
+    def _load(self, name):
+        try:
+            with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def klines(self, symbol, interval, limit=500, start_time=None, end_time=None):
+        recorded = self._load(f"klines_{symbol}_{interval}.json")
+        if recorded is None:
+            return self.fallback.klines(symbol, interval, limit, start_time, end_time)
+        if start_time is not None:
+            recorded = [k for k in recorded if k[0] >= int(start_time)]
+            return recorded[:limit]
+        return recorded[-limit:]
+
+    def ticker(self, symbol, window_ms=86_400_000):
+        if self._tickers and window_ms == 86_400_000:
+            for t in self._tickers:
+                if t["symbol"] == f"{symbol}USDT":
+                    return t
+        return self.fallback.ticker(symbol, window_ms)
+
+    def cmc_item(self, rank, symbol):
+        for item in self._listings or []:
+            if item["symbol"] == symbol:
+                return item
+        return self.fallback.cmc_item(rank, symbol)
+
+    def listings(self):
+        return self._listings or self.fallback.listings()
+
+    def exchange_info(self):
+        return self._exchange_info or self.fallback.exchange_info()
+
+
+class Injection:
+    """Latência e erros injetados num serviço."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=500):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como as APIs reais
+    # Cabeçalhos e corpo saem em escritas separadas: sem isto o Nagle junta
+    # ~40 ms de ACK atrasado a cada resposta e domina as latências medidas
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch(parse_qs(urlsplit(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params = {k: [v] for k, v in json.loads(body or "{}").items()}
+        else:
+            params = parse_qs(body)
+        params.update(parse_qs(urlsplit(self.path).query))
+        self._dispatch(params)
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, params):
+        params = {k: v[0] for k, v in params.items()}
+        path = urlsplit(self.path).path
+        service, _, endpoint = path.strip("/").partition("/")
+        server = self.server
+        if service not in SERVICES:
+            self._send(404, {"error": f"serviço desconhecido: {service}"})
+            return
+
+        server.count(service, endpoint)
+        injection = server.injections[service]
+        delay = injection.latency + random.uniform(0, injection.jitter)
+        if delay:
+            time.sleep(delay)
+        if injection.error_rate and random.random() < injection.error_rate:
+            server.count(service, "__errors__")
+            self._send_error(service, injection.error_status)
+            return
+
+        handler = getattr(self, f"_{service}")
+        handler(endpoint, params)
+
+    def _send_error(self, service, status):
+        if service == "telegram":
+            payload = {"ok": False, "error_code": status, "description": "Injected error"}
+            if status == 429:
+                payload["parameters"] = {"retry_after": 1}
+            self._send(status, payload)
+        elif service == "binance":
+            self._send(status, {"code": -1003, "msg": "Injected error"}, {"Retry-After": 1})
+        else:
+            self._send(status, {"status": {"error_code": status, "error_message": "Injected error", "credit_count": 0}})
+
+    # --- CoinMarketCap ---
+
+    def _cmc_status(self, credit_count):
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+            "error_code": 0,
+            "error_message": None,
+            "credit_count": credit_count,
+        }
+
+    def _cmc(self, endpoint, params):
+        market = self.server.market
+        if endpoint == "v1/cryptocurrency/quotes/latest":
+            symbols = [s for s in params.get("symbol", "").split(",") if s]
+            known = set(market.symbols)
+            invalid = [s for s in symbols if s not in known]
+            # Como a CMC: um símbolo desconhecido invalida o pedido todo, a
+            # menos que venha skip_invalid=true
+            if invalid and params.get("skip_invalid") != "true":
+                self._send(400, {"status": {
+                    **self._cmc_status(0), "error_code": 400,
+                    "error_message": f'Invalid value for "symbol": "{",".join(invalid)}"',
+                }})
+                return
+            data = {
+                s: market.cmc_item(market.symbols.index(s) + 1, s)
+                for s in symbols if s in known
+            }
+            # 1 crédito por cada 100 moedas pedidas
+            self._send(200, {"status": self._cmc_status(max(1, -(-len(symbols) // 100))), "data": data})
+        elif endpoint == "v1/cryptocurrency/listings/latest":
+            start = int(params.get("start", 1))
+            limit = int(params.get("limit", 100))
+            items = market.listings()
+            volume_min = float(params.get("volume_24h_min", 0))
+            market_cap_min = float(params.get("market_cap_min", 0))
+            if volume_min or market_cap_min:
+                items = [
+                    item for item in items
+                    if item["quote"]["USD"]["volume_24h"] >= volume_min
+                    and item["quote"]["USD"]["market_cap"] >= market_cap_min
+                ]
+            page = items[start - 1:start - 1 + limit]
+            # 1 crédito por cada 200 moedas devolvidas
+            self._send(200, {"status": self._cmc_status(max(1, -(-len(page) // 200))), "data": page})
+        elif endpoint == "v1/key/info":
+            self._send(200, {"status": self._cmc_status(0), "data": {"usage": {"current_month": {}}}})
+        else:
+            self._send(404, {"status": {"error_code": 404, "error_message": "Not found"}})
+
+    # --- Binance ---
+
+    def _binance(self, endpoint, params):
+        market = self.server.market
+        endpoint = endpoint[len("api/v3/"):] if endpoint.startswith("api/v3/") else endpoint
+        used = self.server.use_weight(BINANCE_WEIGHTS.get(endpoint, 1))
+        headers = {"X-MBX-USED-WEIGHT-1M": used}
+
+        if endpoint == "exchangeInfo":
+            self._send(200, market.exchange_info(), headers)
+        elif endpoint == "klines":
+            symbol = params.get("symbol", "")
+            if not symbol.endswith("USDT") or symbol[:-len("USDT")] not in market.symbols:
+                self._send(400, {"code": -1121, "msg": "Invalid symbol."}, headers)
+                return
+            interval = params.get("interval", "1h")
+            self._send(200, market.klines(
+                symbol[:-len("USDT")], interval,
+                limit=min(int(params.get("limit", 500)), 1000),
+                start_time=params.get("startTime"),
+                end_time=int(params["endTime"]) if "endTime" in params else None,
+            ), headers)
+        elif endpoint in ("ticker/24hr", "ticker"):
+            window_ms = 86_400_000
+            if endpoint == "ticker":
+                size = params.get("windowSize", "1d")
+                window_ms = int(size[:-1]) * INTERVAL_MS[f"1{size[-1]}"]
+            if "symbols" in params:
+                pairs = json.loads(params["symbols"])
+            elif "symbol" in params:
+                pairs = [params["symbol"]]
+            else:
+                pairs = [f"{s}USDT" for s in market.symbols]
+            known = set(market.symbols)
+            tickers = [
+                market.ticker(p[:-len("USDT")], window_ms) for p in pairs
+                if p.endswith("USDT") and p[:-len("USDT")] in known
+            ]
+            self._send(200, tickers[0] if "symbol" in params and tickers else tickers, headers)
+        else:
+            self._send(404, {"code": -1, "msg": "Not found"}, headers)
+
+    # --- Telegram ---
+
+    def _telegram(self, endpoint, params):
+        _, _, method = endpoint.partition("/")
+        if method == "getUpdates":
+            self._send(200, {"ok": True, "result": self.server.pop_updates(params)})
+            return
+        if method in ("sendMessage", "editMessageText"):
+            text = params.get("text", "")
+            if len(text.encode("utf-16-le")) // 2 > 4096:
+                self._send(400, {"ok": False, "error_code": 400, "description": "Bad Request: message is too long"})
+                return
+            if params.get("parse_mode") == "HTML" and not valid_telegram_html(text):
+                self._send(400, {"ok": False, "error_code": 400,
+                                 "description": "Bad Request: can't parse entities: unsupported start tag"})
+                return
+            self.server.sent.append((method, params.get("chat_id"), text))
+        self._send(200, {"ok": True, "result": {
+            "message_id": self.server.next_message_id(),
+            "chat": {"id": params.get("chat_id")},
+            "date": int(time.time()),
+            "text": params.get("text", ""),
+        }})
+
+
+# Etiquetas aceites pelo parse_mode HTML do Telegram
+TELEGRAM_HTML_TAG = re.compile(r"</?(b|strong|i|em|u|ins|s|strike|del|code|pre|a|span|tg-spoiler|blockquote)(\s[^<>]*)?>")
+
+
+def valid_telegram_html(text):
+    """Como o Telegram: cada "<" tem de abrir uma etiqueta suportada."""
+    return all(TELEGRAM_HTML_TAG.match(text, m.start()) for m in re.finditer("<", text))
+
+
+class FakeAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Os pools de workers abrem muitas ligações de uma vez; com a fila padrão
+    # (5) o kernel descarta SYNs e o cliente só tenta de novo ao fim de 1s
+    request_queue_size = 128
+
+    def __init__(self, address, market, injections=None):
+        super().__init__(address, FakeAPIHandler)
+        self.market = market
+        self.injections = {service: Injection() for service in SERVICES}
+        self.injections.update(injections or {})
+        self.stats = Counter()
+        self.sent = []
+        self.updates = []
+        self.lock = threading.Lock()
+        self.updates_ready = threading.Condition(self.lock)
+        self._update_id = 0
+        self._message_id = 0
+        self._weight_window = None
+        self._weight_used = 0
+
+    def count(self, service, endpoint):
+        with self.lock:
+            self.stats[f"{service}:{endpoint}"] += 1
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+            self.sent.clear()
+
+    def use_weight(self, weight):
+        with self.lock:
+            minute = int(time.time() // 60)
+            if minute != self._weight_window:
+                self._weight_window = minute
+                self._weight_used = 0
+            self._weight_used += weight
+            return self._weight_used
+
+    def next_message_id(self):
+        with self.lock:
+            self._message_id += 1
+            return self._message_id
+
+    def push_update(self, update):
+        """Junta um update (ex.: mensagem de um utilizador) à fila do getUpdates."""
+        with self.lock:
+            self._update_id += 1
+            update.setdefault("update_id", self._update_id)
+            self.updates.append(update)
+            self.updates_ready.notify_all()
+
+    def pop_updates(self, params):
+        """getUpdates com long polling: espera até `timeout` segundos por updates."""
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 100))
+        deadline = time.monotonic() + float(params.get("timeout", 0))
+        with self.lock:
+            while True:
+                self.updates = [u for u in self.updates if u["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if self.updates or remaining <= 0:
+                    return self.updates[:limit]
+                self.updates_ready.wait(remaining)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """Variáveis de ambiente que apontam os scripts para este servidor."""
+        return {
+            "CMC_API_BASE": f"{self.base_url}/cmc/v1",
+            "BINANCE_API_BASE": f"{self.base_url}/binance/api/v3",
+            "TELEGRAM_API_BASE": f"{self.base_url}/telegram",
+        }
+
+
+def start_fake_apis(market=None, injections=None, host="127.0.0.1", port=0):
+    """Arranca o servidor numa thread. Devolve o FakeAPIServer (ver .env())."""
+    server = FakeAPIServer((host, port), market or SyntheticMarket(), injections)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def record_fixtures(path, symbols=KNOWN_SYMBOLS, interval="1h", limit=168):
+    """Grava respostas reais da CMC e da Binance para servir com --fixtures."""
+    from binance_api import binance_get
+    from cmc_client import CMC_URL_LISTINGS, cmc_get
+    from kline_store import fetch_klines
+
+    os.makedirs(path, exist_ok=True)
+
+    def save(name, data):
+        with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        print(f"Gravado {name}")
+
+    save("listings_latest.json", cmc_get(CMC_URL_LISTINGS, {'start': '1', 'limit': '1000', 'convert': 'USD'}))
+    save("exchangeInfo.json", binance_get("exchangeInfo", weight=20))
+    save("ticker_24hr.json", binance_get("ticker/24hr", weight=80))
+    for symbol in symbols:
+        save(f"klines_{symbol}USDT_{interval}.json", fetch_klines(f"{symbol}USDT", interval, limit=limit))
+
+
+def parse_injections(args):
+    injections = {}
+    for service in SERVICES:
+        injections[service] = Injection(
+            latency=getattr(args, f"{service}_latency", None) or args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+        )
+    return injections
+
+
+def add_injection_arguments(parser):
+    parser.add_argument("--symbols", type=int, default=400, help="moedas no mercado sintético")
+    parser.add_argument("--fixtures", help="diretório com respostas gravadas (--record)")
+    parser.add_argument("--latency", type=float, default=0.0, help="latência por pedido (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latência aleatória extra até N segundos")
+    for service in SERVICES:
+        parser.add_argument(f"--{service}-latency", type=float, help=f"latência só do serviço {service} (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de pedidos que falham")
+    parser.add_argument("--error-status", type=int, default=500, help="código HTTP dos erros injetados (ex.: 429)")
+
+
+def build_market(args):
+    market = SyntheticMarket(n_symbols=args.symbols)
+    if args.fixtures:
+        market = RecordedMarket(args.fixtures, market)
+    return market
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="APIs falsas (CMC, Binance, Telegram) para testes offline")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--record", help="grava respostas reais neste diretório e sai")
+    add_injection_arguments(parser)
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.record)
+    else:
+        server = start_fake_apis(build_market(args), parse_injections(args), port=args.port)
+        print(f"APIs falsas em {server.base_url} ({len(server.market.symbols)} moedas)")
+        for name, value in server.env().items():
+            print(f"export {name}={value}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
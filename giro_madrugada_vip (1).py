@@ -1,9 +1,23 @@
+import argparse
 import requests
 import json
 import os
 from datetime import datetime, timedelta
+from functools import partial
 import pytz
-import time # Importar a biblioteca time
+
+import metrics
+from binance_api import get_tickers_24h, run_concurrently
+from exchange_info_cache import get_tradable_symbols
+from kline_store import get_klines
+from price_action import (
+    SIGNAL_BUY_PRESSURE, SIGNAL_MOMENTUM_DOWN, SIGNAL_MOMENTUM_UP, SIGNAL_SELL_PRESSURE, SIGNAL_TEXTS,
+    analyze_klines_batch,
+)
+from ranking import TopK
+from resample import get_timeframes
+from snapshot_store import fetch_with_deadline, format_freshness, refresh
+from telegram_delivery import deliver
 
 # --- CONFIGURAÇÕES ---
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
@@ -15,47 +29,111 @@ SYMBOLS = [
     "BNB", "SEI", "UNI", "ONDO", "ORDI", "NEAR", "LDO", "JUP", "TIA", "TRON", "AVAX"
 ]
 
-BINANCE_API_BASE = "https://api.binance.com/api/v3"
-TELEGRAM_URL = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+# Modo mercado inteiro (--all-markets): pares por lote (máximo aceite pelo
+# /ticker/24hr num pedido) e quantos destaques guardar por categoria
+ALL_MARKETS_BATCH = 100
+ALL_MARKETS_TOP_K = 5
+
+# Prazo da Binance antes de usar o último snapshot (segundos)
+GIRO_DEADLINE = float(os.environ.get("GIRO_DEADLINE", "20"))
+GIRO_ALL_MARKETS_DEADLINE = float(os.environ.get("GIRO_ALL_MARKETS_DEADLINE", "120"))
+
+# Multi-timeframe: só a série base é pedida à Binance; 1h, 4h e 1d são
+# agregados localmente. O 1h continua a ser o timeframe principal do Giro.
+GIRO_BASE_INTERVAL = "15m"
+GIRO_TIMEFRAMES = ("15m", "1h", "4h", "1d")
+GIRO_MAIN_TIMEFRAME = "1h"
 
 # Fuso horário de Lisboa
 LISBON_TZ = pytz.timezone("Europe/Lisbon")
 
-def get_binance_klines(symbol, interval=\'1h\', limit=7):
-    url = f"{BINANCE_API_BASE}/klines"
-    params = {
-        \'symbol\': symbol,
-        \'interval\': interval,
-        \'limit\': limit
-    }
+def get_binance_klines(symbol, interval='1h', limit=7):
     try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()  # Levanta um HTTPError para códigos de status ruins (4xx ou 5xx)
-        return response.json()
+        # Só as velas posteriores à última guardada localmente vão à rede
+        with metrics.span("fetch_klines", symbol=symbol):
+            return get_klines(symbol, interval=interval, limit=limit)
     except requests.exceptions.RequestException as e:
         print(f"Erro ao buscar klines para {symbol}: {e}")
         return None
 
-def get_binance_ticker(symbol):
-    url = f"{BINANCE_API_BASE}/ticker/24hr"
-    params = {\'symbol\': symbol}
+def get_binance_timeframes(symbol, limit=7):
+    """Velas de todos os GIRO_TIMEFRAMES a partir de um único pedido da série base."""
     try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        return response.json()
+        with metrics.span("fetch_klines", symbol=symbol):
+            return get_timeframes(symbol, base=GIRO_BASE_INTERVAL, targets=GIRO_TIMEFRAMES, limit=limit)
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar ticker para {symbol}: {e}")
+        print(f"Erro ao buscar klines para {symbol}: {e}")
         return None
 
-def get_exchange_info():
-    url = f"{BINANCE_API_BASE}/exchangeInfo"
+def get_binance_tickers(symbols):
+    """Busca os tickers de 24h de todos os símbolos num único pedido."""
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        return response.json()
+        with metrics.span("fetch_tickers", count=len(symbols)):
+            return get_tickers_24h(symbols)
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar exchangeInfo: {e}")
-        return None
+        print(f"Erro ao buscar tickers em lote: {e}")
+        return {}
+
+def get_market_data(symbol_bases, multi_timeframe=False):
+    """Busca e analisa klines e tickers de uma lista de moedas (sem o sufixo USDT).
+
+    Os tickers chegam num único pedido em lote; a Binance não aceita vários
+    símbolos em /klines, por isso as klines são pedidas em paralelo. Com
+    multi_timeframe, cada resultado traz também a variação e o sinal de
+    cada um dos GIRO_TIMEFRAMES. Devolve (analysis_results, all_tickers).
+    """
+    symbols_usdt = [f"{symbol_base}USDT" for symbol_base in symbol_bases]
+
+    fetch_klines = get_binance_timeframes if multi_timeframe else get_binance_klines
+    calls = {symbol_usdt: partial(fetch_klines, symbol_usdt) for symbol_usdt in symbols_usdt}
+    calls["__tickers__"] = partial(get_binance_tickers, symbols_usdt)
+    fetched = run_concurrently(calls)
+    tickers = fetched.pop("__tickers__")
+
+    # Análise de todas as moedas numa única passagem vetorizada (por timeframe)
+    with metrics.span("analysis", count=len(fetched)):
+        if multi_timeframe:
+            tf_analyses = {
+                tf: analyze_klines_batch({s: tfs[tf] for s, tfs in fetched.items() if tfs})
+                for tf in GIRO_TIMEFRAMES
+            }
+            analyses = tf_analyses[GIRO_MAIN_TIMEFRAME]
+        else:
+            analyses = analyze_klines_batch(fetched)
+
+    analysis_results = []
+    all_tickers = []
+
+    for symbol_base, symbol_usdt in zip(symbol_bases, symbols_usdt):
+        analysis = analyses.get(symbol_usdt)
+        ticker_data = tickers.get(symbol_usdt)
+
+        if analysis and ticker_data:
+            change_7h, total_volume, analysis_text, last_close = analysis
+            price_24h_change = float(ticker_data.get("priceChangePercent", 0))
+            current_price = float(ticker_data.get("lastPrice", 0))
+
+            result = {
+                "symbol": symbol_base,
+                "change_7h": change_7h,
+                "total_volume": total_volume,
+                "analysis_text": analysis_text,
+                "price_24h_change": price_24h_change,
+                "current_price": current_price
+            }
+            if multi_timeframe:
+                result["timeframes"] = {
+                    tf: {"change": tf_analyses[tf][symbol_usdt][0], "analysis_text": tf_analyses[tf][symbol_usdt][2]}
+                    for tf in GIRO_TIMEFRAMES if symbol_usdt in tf_analyses[tf]
+                }
+            analysis_results.append(result)
+            all_tickers.append({
+                "symbol": symbol_base,
+                "price": current_price,
+                "change": price_24h_change
+            })
+
+    return analysis_results, all_tickers
 
 def format_price(price_str):
     try:
@@ -70,7 +148,7 @@ def format_price(price_str):
         return price_str
 
 def analyze_klines(klines):
-    if not klines or len(klines) < 7: # Precisamos de 7 velas para 7 horas
+    if klines is None or len(klines) < 7: # Precisamos de 7 velas para 7 horas
         return None, None, None, None
 
     # Klines: [open_time, open, high, low, close, volume, close_time, ...]
@@ -109,52 +187,125 @@ def analyze_klines(klines):
 
     return change_7h, total_volume, analysis, last_close
 
-def main():
-    print("Iniciando busca de dados para o Giro da Madrugada VIP...")
+def scan_all_markets(valid_symbols, top_k=ALL_MARKETS_TOP_K, batch_size=ALL_MARKETS_BATCH):
+    """Percorre todos os pares USDT em lotes e guarda só os destaques.
+
+    Cada lote passa por busca -> análise -> ranking e é descartado; só os
+    heaps top-k ficam em memória. Devolve (pares analisados, maiores volumes,
+    maiores altas, maiores baixas).
+    """
+    top_volume = TopK(top_k, key=lambda x: x["total_volume"])
+    top_gainers = TopK(top_k, key=lambda x: x["change_7h"])
+    top_losers = TopK(top_k, key=lambda x: x["change_7h"], reverse=True)
+
+    symbol_bases = sorted(symbol[:-len("USDT")] for symbol in valid_symbols)
+    scanned = 0
+    for start in range(0, len(symbol_bases), batch_size):
+        batch = symbol_bases[start:start + batch_size]
+        analysis_results, _ = get_market_data(batch)
+        scanned += len(analysis_results)
+        for res in analysis_results:
+            top_volume.push(res)
+            top_gainers.push(res)
+            top_losers.push(res)
+        print(f"Mercado inteiro: {min(start + batch_size, len(symbol_bases))}/{len(symbol_bases)} pares processados.")
+
+    return scanned, top_volume.result(), top_gainers.result(), top_losers.result()
+
+def format_all_markets_message(scanned, top_volume, top_gainers, top_losers):
+    """Monta a mensagem do Giro no modo mercado inteiro."""
+    message_parts = [
+        "<b>Giro da Madrugada VIP 🌙</b>",
+        f"(Análise Gráfico 1H - 00:00 às 07:00 Lisboa - {scanned} pares USDT)",
+        "",
+        "--- Destaques do Período ---",
+        f"🔥 Maior Volume Negociado: <b>{top_volume[0]['symbol']}</b> (${format_price(top_volume[0]['total_volume'])})",
+        f"🚀 Maior Alta: <b>{top_gainers[0]['symbol']}</b> ({top_gainers[0]['change_7h']:+.2f}%)",
+        f"📉 Maior Baixa: <b>{top_losers[0]['symbol']}</b> ({top_losers[0]['change_7h']:+.2f}%)",
+    ]
 
-    exchange_info = get_exchange_info()
-    if not exchange_info:
-        send_telegram_message("Erro: Não foi possível obter informações da exchange. Análise não concluída.")
-        return
+    for title, results in (("Maiores Altas (7h)", top_gainers), ("Maiores Baixas (7h)", top_losers)):
+        message_parts.extend(["", f"--- {title} ---"])
+        for res in results:
+            change_icon = "🟢" if res["change_7h"] >= 0 else "🔴"
+            message_parts.append(
+                f"<b>{res['symbol']}</b>: ${format_price(res['current_price'])} {change_icon} "
+                f"({res['change_7h']:+.2f}%) - {' '.join(res['analysis_text'])}"
+            )
 
-    valid_symbols = {s["symbol"] for s in exchange_info["symbols"] if s["status"] == "TRADING" and s["quoteAsset"] == "USDT"}
+    message_parts.extend(["", "--- Maiores Volumes (7h) ---"])
+    for res in top_volume:
+        message_parts.append(f"<b>{res['symbol']}</b>: ${format_price(res['total_volume'])}")
 
-    analysis_results = []
-    all_tickers = []
+    message_parts.extend([
+        "",
+        "<i>Análise baseada no método Marcus Aurora</i>"
+    ])
+    return "\n".join(message_parts)
+
+def fetch_watchlist():
+    """Busca e analisa as moedas de SYMBOLS. Devolve [analysis_results, all_tickers] ou None."""
+    # Índice compacto de pares TRADING/USDT (cache local com TTL)
+    valid_symbols = get_tradable_symbols("USDT")
+    if not valid_symbols:
+        print("Erro: Não foi possível obter informações da exchange.")
+        return None
 
+    symbols_to_fetch = []
     for symbol_base in SYMBOLS:
         symbol_usdt = f"{symbol_base}USDT"
         if symbol_usdt not in valid_symbols:
             print(f"Símbolo {symbol_usdt} não encontrado ou não negociável na Binance. Pulando.")
             continue
+        symbols_to_fetch.append(symbol_base)
 
-        klines = get_binance_klines(symbol_usdt)
-        ticker_data = get_binance_ticker(symbol_usdt)
+    analysis_results, all_tickers = get_market_data(symbols_to_fetch, multi_timeframe=True)
+    if not analysis_results:
+        return None
+    return [analysis_results, all_tickers]
 
-        if klines and ticker_data:
-            change_7h, total_volume, analysis_text, last_close = analyze_klines(klines)
-            price_24h_change = float(ticker_data.get("priceChangePercent", 0))
-            current_price = float(ticker_data.get("lastPrice", 0))
-            
-            analysis_results.append({
-                "symbol": symbol_base,
-                "change_7h": change_7h,
-                "total_volume": total_volume,
-                "analysis_text": analysis_text,
-                "price_24h_change": price_24h_change,
-                "current_price": current_price
-            })
-            all_tickers.append({
-                "symbol": symbol_base,
-                "price": current_price,
-                "change": price_24h_change
-            })
-        time.sleep(0.5) # Pequeno atraso para evitar rate limit
+def fetch_all_markets():
+    """Percorre todos os pares USDT. Devolve [pares, volumes, altas, baixas] ou None."""
+    valid_symbols = get_tradable_symbols("USDT")
+    if not valid_symbols:
+        print("Erro: Não foi possível obter informações da exchange.")
+        return None
 
-    if not analysis_results:
-        send_telegram_message("Erro: Não foi possível obter dados para nenhuma moeda. Análise não concluída.")
+    scanned, top_volume, top_gainers, top_losers = scan_all_markets(valid_symbols)
+    if not scanned:
+        return None
+    return [scanned, top_volume, top_gainers, top_losers]
+
+def main(all_markets=False):
+    print("Iniciando busca de dados para o Giro da Madrugada VIP...")
+
+    # Se a Binance falhar ou atrasar, o Giro sai com o último snapshot bom
+    # enquanto a atualização continua em segundo plano
+    if all_markets:
+        market_data, stale_since = fetch_with_deadline("giro_all_markets", fetch_all_markets, GIRO_ALL_MARKETS_DEADLINE)
+    else:
+        market_data, stale_since = fetch_with_deadline("giro_watchlist", fetch_watchlist, GIRO_DEADLINE)
+
+    if market_data is None:
+        send_telegram_message("Erro: Não foi possível obter dados da Binance. Análise não concluída.")
+        return
+
+    if all_markets:
+        with metrics.span("format"):
+            final_message = format_all_markets_message(*market_data)
+        if stale_since:
+            final_message += "\n\n" + format_freshness(stale_since)
+        send_telegram_message(final_message)
         return
 
+    with metrics.span("format"):
+        final_message = format_watchlist_message(*market_data)
+    if stale_since:
+        final_message += "\n\n" + format_freshness(stale_since)
+    send_telegram_message(final_message)
+
+def format_watchlist_message(analysis_results, all_tickers):
+    """Monta a mensagem do Giro para as moedas de SYMBOLS."""
     # Destaques
     highest_volume = max(analysis_results, key=lambda x: x["total_volume"])
     highest_gain = max(analysis_results, key=lambda x: x["change_7h"])
@@ -165,16 +316,22 @@ def main():
         "(Análise Gráfico 1H - 00:00 às 07:00 Lisboa)",
         "",
         "--- Destaques do Período ---",
-        f"🔥 Maior Volume Negociado: <b>{highest_volume["symbol"]}</b> (${format_price(highest_volume["total_volume"])})",
-        f"🚀 Maior Alta: <b>{highest_gain["symbol"]}</b> ({highest_gain["change_7h"]:+.2f}%)",
-        f"📉 Maior Baixa: <b>{lowest_gain["symbol"]}</b> ({lowest_gain["change_7h"]:+.2f}%)",
+        f"🔥 Maior Volume Negociado: <b>{highest_volume['symbol']}</b> (${format_price(highest_volume['total_volume'])})",
+        f"🚀 Maior Alta: <b>{highest_gain['symbol']}</b> ({highest_gain['change_7h']:+.2f}%)",
+        f"📉 Maior Baixa: <b>{lowest_gain['symbol']}</b> ({lowest_gain['change_7h']:+.2f}%)",
         "",
         "--- Análise Técnica (Price Action) ---"
     ]
 
     for res in analysis_results:
         if res["analysis_text"]:
-            message_parts.append(f"<b>{res["symbol"]}</b>: {\' \'.join(res["analysis_text"])})")
+            message_parts.append(f"<b>{res['symbol']}</b>: {' '.join(res['analysis_text'])})")
+
+    timeframe_lines = format_timeframes(analysis_results)
+    if timeframe_lines:
+        message_parts.append("")
+        message_parts.append(f"--- Multi-Timeframe ({' · '.join(tf.upper() for tf in GIRO_TIMEFRAMES)}, 7 velas) ---")
+        message_parts.extend(timeframe_lines)
 
     message_parts.append("")
     message_parts.append("--- Cotações Atuais ---")
@@ -184,33 +341,61 @@ def main():
 
     for ticker in all_tickers:
         change_icon = "🟢" if ticker["change"] >= 0 else "🔴"
-        message_parts.append(f"<b>{ticker["symbol"]}</b>: ${format_price(ticker["price"])} {change_icon} ({ticker["change"]:+.2f}%)")
+        message_parts.append(f"<b>{ticker['symbol']}</b>: ${format_price(ticker['price'])} {change_icon} ({ticker['change']:+.2f}%)")
 
     message_parts.extend([
         "",
         "<i>Análise baseada no método Marcus Aurora</i>"
     ])
     
-    final_message = "\n".join(message_parts)
-    send_telegram_message(final_message)
+    return "\n".join(message_parts)
+
+# Ícone curto de cada sinal para a linha multi-timeframe
+SIGNAL_ICONS = {
+    SIGNAL_TEXTS[SIGNAL_BUY_PRESSURE]: "⏫",
+    SIGNAL_TEXTS[SIGNAL_SELL_PRESSURE]: "⏬",
+    SIGNAL_TEXTS[SIGNAL_MOMENTUM_UP]: "↗️",
+    SIGNAL_TEXTS[SIGNAL_MOMENTUM_DOWN]: "↘️",
+}
+
+def signal_icon(analysis_text):
+    return next((SIGNAL_ICONS[t] for t in analysis_text if t in SIGNAL_ICONS), "➡️")
+
+def format_timeframes(analysis_results):
+    """Uma linha por moeda com variação e sinal de cada timeframe."""
+    lines = []
+    for res in analysis_results:
+        timeframes = res.get("timeframes")
+        if not timeframes:
+            continue
+        cells = [
+            f"{tf.upper()} {signal_icon(timeframes[tf]['analysis_text'])} {timeframes[tf]['change']:+.2f}%"
+            for tf in GIRO_TIMEFRAMES if tf in timeframes
+        ]
+        lines.append(f"<b>{res['symbol']}</b>: {' · '.join(cells)}")
+    return lines
 
 def send_telegram_message(text):
-    """Envia a mensagem formatada para o Telegram."""
-    if not BOT_TOKEN or not CHAT_ID_VIP:
-        print("Erro: BOT_TOKEN ou CHAT_ID_VIP não configurados.")
-        return
-
-    payload = {
-        \'chat_id\': CHAT_ID_VIP,
-        \'text\': text,
-        \'parse_mode\': \'HTML\'
-    }
-    try:
-        response = requests.post(TELEGRAM_URL, data=payload, timeout=10)
-        response.raise_for_status()
-        print("Mensagem enviada com sucesso para o Telegram.")
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao enviar mensagem para o Telegram: {e}")
+    """Envia a mensagem formatada para todos os chats VIP configurados."""
+    # Entrega em paralelo, com rate limit do Telegram, novas tentativas e
+    # divisão de mensagens longas
+    results = deliver(text)
+    if any(r["ok"] for r in results):
+        return results
+    return None
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Giro da Madrugada VIP")
+    parser.add_argument("--all-markets", action="store_true",
+                        help="analisa todos os pares USDT em negociação em vez da lista SYMBOLS")
+    parser.add_argument("--refresh", action="store_true",
+                        help="só atualiza o snapshot local, sem enviar mensagem")
+    args = parser.parse_args()
+    with metrics.run("giro_all_markets" if args.all_markets else "giro_madrugada_vip"):
+        if args.refresh:
+            if args.all_markets:
+                refresh("giro_all_markets", fetch_all_markets)
+            else:
+                refresh("giro_watchlist", fetch_watchlist)
+        else:
+            main(all_markets=args.all_markets)
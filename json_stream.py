@@ -0,0 +1,225 @@
+"""Leitura em streaming das respostas JSON grandes, só com os campos usados.
+
+O /exchangeInfo da Binance (filtros, permissões e tipos de ordem de milhares
+de pares) e as páginas de /listings/latest da CMC são lidos à medida que o
+corpo chega, item a item, e cada item é reduzido a um registo compacto com
+__slots__. A memória fica limitada a um item de cada vez em vez do documento
+inteiro mais a árvore de dicts.
+
+Cada item é descodificado pelo json da biblioteca padrão (em C) a partir de
+um buffer incremental e reduzido numa única passagem aos campos pedidos.
+"""
+import codecs
+import json
+import re
+
+import requests
+
+# Tamanho de cada bloco lido da resposta (bytes)
+JSON_STREAM_CHUNK = 64 * 1024
+
+_WHITESPACE = re.compile(r"\s*")
+_decoder = json.JSONDecoder()
+
+
+class Record:
+    """Registo compacto: os campos são os __slots__ da subclasse.
+
+    FIELDS mapeia cada campo para o caminho dentro do item ("quote.USD.price";
+    "item" percorre uma lista e fica com o primeiro elemento que tem o resto
+    do caminho).
+    """
+
+    __slots__ = ()
+    FIELDS = {}
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class SymbolRecord(Record):
+    """Par do /exchangeInfo da Binance."""
+
+    __slots__ = ("symbol", "status", "quote_asset", "tick_size")
+    FIELDS = {
+        "symbol": "symbol",
+        "status": "status",
+        "quote_asset": "quoteAsset",
+        # Só o PRICE_FILTER tem tickSize
+        "tick_size": "filters.item.tickSize",
+    }
+
+
+class ListingRecord(Record):
+    """Moeda de /listings/latest da CMC, com a cotação em USD."""
+
+    __slots__ = (
+        "symbol", "price", "volume_24h", "market_cap",
+        "percent_change_1h", "percent_change_24h", "percent_change_7d",
+    )
+    FIELDS = {
+        "symbol": "symbol",
+        "price": "quote.USD.price",
+        "volume_24h": "quote.USD.volume_24h",
+        "market_cap": "quote.USD.market_cap",
+        "percent_change_1h": "quote.USD.percent_change_1h",
+        "percent_change_24h": "quote.USD.percent_change_24h",
+        "percent_change_7d": "quote.USD.percent_change_7d",
+    }
+    QUOTE_FIELDS = __slots__[1:]
+
+    def quote(self):
+        """Cotação no formato de quote['USD'] da CMC (só os campos lidos)."""
+        return {name: getattr(self, name) for name in self.QUOTE_FIELDS}
+
+
+class _Reader:
+    """Buffer de texto incremental sobre os blocos de uma resposta."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            tail = self.text.decode(b"", final=True)
+        else:
+            tail = self.text.decode(chunk)
+        # Descarta o que já foi consumido
+        self.buf = self.buf[self.pos:] + tail
+        self.pos = 0
+        return chunk is not None
+
+    def peek(self):
+        """Próximo carácter que não é espaço (sem o consumir)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill() and self.pos >= len(self.buf):
+                raise ValueError("JSON truncado")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"esperado {char!r} na posição {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Descodifica o próximo valor JSON completo."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # Um número no fim do buffer pode continuar no bloco seguinte
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def _field_tree(paths):
+    """Árvore {chave: subárvore ou índice do campo} com os caminhos pedidos."""
+    tree = {}
+    for index, path in enumerate(paths):
+        node = tree
+        *parents, leaf = path.split(".")
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = index
+    return tree
+
+
+def _extract(value, tree, out):
+    """Preenche `out` com os valores da árvore numa única passagem pelo item."""
+    if isinstance(value, list):
+        node = tree.get("item")
+        if node is not None:
+            for element in value:
+                _extract(element, node, out)
+        return
+    if not isinstance(value, dict):
+        return
+    for key, node in tree.items():
+        child = value.get(key)
+        if child is None:
+            continue
+        if node.__class__ is int:
+            if out[node] is None:
+                out[node] = child
+        else:
+            _extract(child, node, out)
+
+
+def _records(chunks, array_key, record_type, meta):
+    names = list(record_type.FIELDS)
+    fields = _field_tree(record_type.FIELDS.values())
+    meta_paths = list(meta)
+    meta_fields = _field_tree(meta_paths)
+    reader = _Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == array_key:
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    out = [None] * len(names)
+                    _extract(reader.value(), fields, out)
+                    yield record_type(**dict(zip(names, out)))
+                    if reader.peek() == "]":
+                        reader.pos += 1
+                        break
+                    reader.expect(",")
+        else:
+            # Valores pequenos de topo (status, rateLimits, ...): só os metadados pedidos
+            value = reader.value()
+            if key in meta_fields:
+                out = [meta[path] for path in meta_paths]
+                _extract({key: value}, meta_fields, out)
+                meta.update(zip(meta_paths, out))
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
+
+
+def iter_records(response, array_key, record_type, meta=None):
+    """Registos de cada item da lista `array_key` no topo de uma resposta JSON.
+
+    `response` deve ter sido pedido com stream=True. `meta` é um dict
+    opcional com caminhos de valores de topo ({"status.credit_count": None});
+    os valores encontrados são preenchidos à medida que o corpo é lido.
+    Levanta requests.exceptions.InvalidJSONError se o corpo não for JSON
+    válido.
+    """
+    meta = {} if meta is None else meta
+    chunks = response.iter_content(JSON_STREAM_CHUNK)
+    try:
+        yield from _records(chunks, array_key, record_type, meta)
+    except ValueError as e:
+        raise requests.exceptions.InvalidJSONError(f"Resposta JSON inválida: {e}", response=response)
+
+
+def read_records(response, array_key, record_type, meta=None):
+    """Lê a resposta até ao fim e devolve a lista de registos (fecha a ligação)."""
+    with response:
+        return list(iter_records(response, array_key, record_type, meta))
@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from binance_api import binance_get
+
+# --- CONFIGURAÇÕES ---
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+KLINE_STORE_DIR = os.path.join(CACHE_DIR, "klines")
+# Máximo de páginas (1000 velas cada) a descarregar para fechar uma lacuna;
+# acima disso o histórico local é descartado e recomeçado.
+KLINE_MAX_PAGES = int(os.environ.get("KLINE_MAX_PAGES", "10"))
+# Velas a descarregar na primeira execução para um símbolo novo
+KLINE_INITIAL_HISTORY = int(os.environ.get("KLINE_INITIAL_HISTORY", "168"))
+
+# Colunas guardadas por vela (float64, ordem igual à da API da Binance)
+KLINE_COLUMNS = ("open_time", "open", "high", "low", "close", "volume", "close_time")
+OPEN_TIME, OPEN, HIGH, LOW, CLOSE, VOLUME, CLOSE_TIME = range(len(KLINE_COLUMNS))
+ROW_BYTES = len(KLINE_COLUMNS) * 8
+BINANCE_KLINES_LIMIT = 1000
+
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+    "8h": 28_800_000, "12h": 43_200_000, "1d": 86_400_000,
+}
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def store_path(symbol, interval):
+    return os.path.join(KLINE_STORE_DIR, f"{symbol}_{interval}.f64")
+
+
+def load_klines(symbol, interval):
+    """Devolve as velas fechadas guardadas como array (n, 7) mapeado em memória.
+
+    O array é só de leitura e não copia os dados do disco; colunas como
+    klines[:, CLOSE] são vistas sobre o mesmo ficheiro.
+    """
+    path = store_path(symbol, interval)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    rows = size // ROW_BYTES
+    if rows == 0:
+        return np.empty((0, len(KLINE_COLUMNS)), dtype=np.float64)
+    return np.memmap(path, dtype=np.float64, mode="r", shape=(rows, len(KLINE_COLUMNS)))
+
+
+def parse_klines(raw_klines):
+    """Converte a resposta de /klines (listas de strings) para um array (n, 7)."""
+    if not raw_klines:
+        return np.empty((0, len(KLINE_COLUMNS)), dtype=np.float64)
+    return np.array([k[:len(KLINE_COLUMNS)] for k in raw_klines], dtype=np.float64)
+
+
+def append_klines(symbol, interval, rows, reset=False):
+    """Acrescenta ao ficheiro as velas posteriores à última guardada."""
+    path = store_path(symbol, interval)
+    os.makedirs(KLINE_STORE_DIR, exist_ok=True)
+    with _lock_for(path):
+        if reset and os.path.exists(path):
+            os.remove(path)
+        stored = load_klines(symbol, interval)
+        if len(stored):
+            rows = rows[rows[:, OPEN_TIME] > stored[-1, OPEN_TIME]]
+        if len(rows):
+            with open(path, "ab") as f:
+                f.write(np.ascontiguousarray(rows, dtype=np.float64).tobytes())
+    return len(rows)
+
+
+def fetch_klines(symbol, interval, limit=BINANCE_KLINES_LIMIT, start_time=None):
+    params = {
+        'symbol': symbol,
+        'interval': interval,
+        'limit': limit
+    }
+    if start_time is not None:
+        params['startTime'] = int(start_time)
+    return binance_get("klines", params=params, weight=2)
+
+
+def missing_candles(symbol, interval, now_ms=None):
+    """Velas já fechadas na Binance que ainda não estão guardadas (None sem histórico)."""
+    stored = load_klines(symbol, interval)
+    if not len(stored):
+        return None
+    now_ms = time.time() * 1000 if now_ms is None else now_ms
+    return max(int((now_ms - stored[-1, CLOSE_TIME] - 1) // INTERVAL_MS[interval]), 0)
+
+
+def sync_klines(symbol, interval, min_history=KLINE_INITIAL_HISTORY):
+    """Descarrega só as velas em falta desde a última guardada.
+
+    Devolve as velas novas (incluindo a vela ainda aberta, que não é
+    gravada). Levanta RequestException se a Binance falhar.
+    """
+    interval_ms = INTERVAL_MS[interval]
+    now_ms = time.time() * 1000
+    stored = load_klines(symbol, interval)
+
+    reset = False
+    if len(stored):
+        start_time = stored[-1, OPEN_TIME] + interval_ms
+        missing = (now_ms - start_time) / interval_ms
+        if missing > KLINE_MAX_PAGES * BINANCE_KLINES_LIMIT:
+            reset = True
+    if not len(stored) or reset:
+        start_time = None
+
+    pages = []
+    if start_time is None:
+        limit = min(max(min_history, 1), BINANCE_KLINES_LIMIT)
+        pages.append(parse_klines(fetch_klines(symbol, interval, limit=limit)))
+    else:
+        while True:
+            page = parse_klines(fetch_klines(symbol, interval, start_time=start_time))
+            pages.append(page)
+            if len(page) < BINANCE_KLINES_LIMIT:
+                break
+            start_time = page[-1, OPEN_TIME] + interval_ms
+            if start_time > now_ms:
+                break
+
+    new_rows = np.concatenate(pages) if pages else parse_klines([])
+    closed = new_rows[new_rows[:, CLOSE_TIME] < now_ms]
+    append_klines(symbol, interval, closed, reset=reset)
+    return new_rows
+
+
+def backfill_klines(symbol, interval, since_ms):
+    """Completa o histórico guardado para trás até `since_ms` (para backtests).
+
+    As velas anteriores à primeira guardada são descarregadas por páginas e
+    o ficheiro é reescrito (antigas + guardadas) de forma atómica. Devolve
+    o número de velas acrescentadas. Levanta RequestException se a Binance
+    falhar.
+    """
+    interval_ms = INTERVAL_MS[interval]
+    now_ms = time.time() * 1000
+    stored = load_klines(symbol, interval)
+    end_time = stored[0, OPEN_TIME] if len(stored) else now_ms
+
+    pages = []
+    start_time = since_ms
+    while start_time < end_time:
+        page = parse_klines(fetch_klines(symbol, interval, start_time=start_time))
+        page = page[page[:, OPEN_TIME] < end_time]
+        if not len(page):
+            break
+        pages.append(page)
+        start_time = page[-1, OPEN_TIME] + interval_ms
+    if not pages:
+        return 0
+
+    older = np.concatenate(pages)
+    older = older[older[:, CLOSE_TIME] < now_ms]
+    path = store_path(symbol, interval)
+    os.makedirs(KLINE_STORE_DIR, exist_ok=True)
+    with _lock_for(path):
+        stored = np.array(load_klines(symbol, interval))
+        if len(stored):
+            older = older[older[:, OPEN_TIME] < stored[0, OPEN_TIME]]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(np.ascontiguousarray(older, dtype=np.float64).tobytes())
+            f.write(np.ascontiguousarray(stored, dtype=np.float64).tobytes())
+        os.replace(tmp_path, path)
+    return len(older)
+
+
+def stored_symbols(interval):
+    """Símbolos com histórico guardado localmente para o intervalo."""
+    suffix = f"_{interval}.f64"
+    try:
+        names = os.listdir(KLINE_STORE_DIR)
+    except OSError:
+        return []
+    return sorted(name[:-len(suffix)] for name in names if name.endswith(suffix))
+
+
+def get_klines(symbol, interval="1h", limit=7):
+    """Devolve as últimas `limit` velas (a última pode estar ainda aberta).
+
+    Só as velas em falta são pedidas à Binance; o resto vem do disco.
+    """
+    new_rows = sync_klines(symbol, interval, min_history=max(limit, KLINE_INITIAL_HISTORY))
+    stored = load_klines(symbol, interval)
+    open_rows = new_rows[new_rows[:, OPEN_TIME] > stored[-1, OPEN_TIME]] if len(stored) else new_rows
+    if not len(open_rows):
+        # Janela servida diretamente do ficheiro mapeado, sem cópia
+        return stored[-limit:]
+    keep = max(limit - len(open_rows), 0)
+    return np.concatenate([stored[max(len(stored) - keep, 0):], open_rows])[-limit:]
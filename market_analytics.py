@@ -0,0 +1,350 @@
+"""Analytics de mercado: correlação, beta face ao BTC, amplitude e dispersão.
+
+- Amplitude e dispersão saem das variações de 24h da listagem da CMC (todas
+  as moedas percorridas, não só as fixas).
+- Correlação e beta usam as velas de 1h dos N pares USDT com mais volume
+  na Binance, alinhadas pelo open_time.
+
+As velas de 1h são agregadas (resample_klines) da série base de 15m do
+kline_store, a mesma que o Giro guarda, por isso os pares do Giro chegam já
+atualizados quando as duas execuções partilham a cache. Só os pares com
+mais de ANALYTICS_MAX_STALE_CANDLES velas de 1h em falta são sincronizados
+(um pedido incremental cada); na execução diária isso ainda é a maioria dos
+pares, e a tolerância poupa sobretudo o daemon e o painel. A lista dos N
+pares fica num snapshot durante ANALYTICS_UNIVERSE_TTL, para não pedir o
+ticker/24hr completo (peso 80) a cada execução.
+
+A janela de correlação é incremental: cada vela nova é uma atualização de
+posto 1 das somas da janela (O(N²)), por isso o daemon só processa as velas
+que chegaram desde a última execução, mesmo com N na casa das centenas.
+"""
+import os
+import time
+from functools import partial
+
+import numpy as np
+import requests
+
+import metrics
+from binance_api import get_tickers_24h, run_concurrently
+from exchange_info_cache import get_tradable_symbols
+from kline_store import CLOSE, INTERVAL_MS, OPEN_TIME, load_klines, missing_candles, sync_klines
+from resample import resample_klines
+from snapshot_store import load_snapshot, save_snapshot
+
+# --- CONFIGURAÇÕES ---
+# Quantos pares USDT (por volume de 24h na Binance) entram na correlação
+ANALYTICS_TOP_N = int(os.environ.get("ANALYTICS_TOP_N", "100"))
+ANALYTICS_INTERVAL = os.environ.get("ANALYTICS_INTERVAL", "1h")
+# Série guardada de onde o ANALYTICS_INTERVAL é agregado (a base do Giro,
+# GIRO_BASE_INTERVAL)
+ANALYTICS_BASE_INTERVAL = os.environ.get("ANALYTICS_BASE_INTERVAL", "15m")
+# Janela da correlação, em velas (72 velas de 1h = 3 dias)
+ANALYTICS_WINDOW = int(os.environ.get("ANALYTICS_WINDOW", "72"))
+ANALYTICS_BENCHMARK = "BTCUSDT"
+# Velas fechadas em falta toleradas antes de pedir as novas à Binance (a
+# correlação de 72 velas pouco muda com algumas horas de atraso)
+ANALYTICS_MAX_STALE_CANDLES = int(os.environ.get("ANALYTICS_MAX_STALE_CANDLES", "6"))
+# Validade da lista dos N pares com mais volume (segundos)
+ANALYTICS_UNIVERSE_TTL = float(os.environ.get("ANALYTICS_UNIVERSE_TTL", str(3 * 86400)))
+# Correlação média das alts com o BTC abaixo/acima da qual o texto fala em
+# descolamento / movimento em bloco
+DECOUPLED_CORRELATION = 0.4
+COUPLED_CORRELATION = 0.8
+# Desvio-padrão das variações de 24h (pontos percentuais) considerado elevado
+HIGH_DISPERSION = 8.0
+# Quantos símbolos citar nos destaques (mais descolados, beta mais alto)
+HIGHLIGHTS = 3
+
+
+def breadth_stats(changes):
+    """Amplitude e dispersão de uma lista de variações de 24h (%).
+
+    Devolve um dict serializável em JSON, ou None sem dados.
+    """
+    values = np.asarray([c for c in changes if c is not None], dtype=np.float64)
+    if not len(values):
+        return None
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    return {
+        "count": int(len(values)),
+        "advancers": int((values > 0).sum()),
+        "decliners": int((values < 0).sum()),
+        "mean": float(values.mean()),
+        "median": float(median),
+        "dispersion": float(values.std()),
+        "iqr": float(q3 - q1),
+    }
+
+
+class RollingCorrelation:
+    """Covariância de N séries de retornos numa janela deslizante de W velas.
+
+    Guarda a janela num buffer circular e mantém a soma e os produtos
+    cruzados: cada vela custa O(N²) em vez de O(W·N²). A cada W velas as
+    somas são refeitas a partir do buffer para não acumular erro.
+    """
+
+    def __init__(self, n, window):
+        self.window = window
+        self.returns = np.zeros((window, n))
+        self.count = 0
+        self.sum = np.zeros(n)
+        self.cross = np.zeros((n, n))
+
+    def _recompute(self):
+        rows = self.returns if self.count >= self.window else self.returns[:self.count]
+        self.sum = rows.sum(axis=0)
+        self.cross = rows.T @ rows
+
+    def push(self, r):
+        slot = self.count % self.window
+        old = self.returns[slot]
+        if self.count >= self.window:
+            self.sum -= old
+            self.cross -= np.outer(old, old)
+        self.returns[slot] = r
+        self.sum += r
+        self.cross += np.outer(r, r)
+        self.count += 1
+        if self.count % self.window == 0:
+            self._recompute()
+
+    def extend(self, rows):
+        """Acrescenta várias velas (array (T, N)); T ≥ W substitui a janela de uma vez."""
+        rows = np.nan_to_num(np.asarray(rows, dtype=np.float64))
+        if len(rows) < self.window:
+            for r in rows:
+                self.push(r)
+            return
+        # A vela mais antiga da janela fica no slot que a próxima vai substituir
+        self.count += len(rows)
+        start = self.count % self.window
+        self.returns[(start + np.arange(self.window)) % self.window] = rows[-self.window:]
+        self._recompute()
+
+    def __len__(self):
+        return min(self.count, self.window)
+
+    def covariance(self):
+        n = len(self)
+        mean = self.sum / n
+        return self.cross / n - np.outer(mean, mean)
+
+    def correlation(self):
+        cov = self.covariance()
+        sd = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.outer(sd, sd)
+        corr[(sd == 0)[:, None] | (sd == 0)[None, :]] = np.nan
+        return corr
+
+    def beta(self, benchmark):
+        """Beta de cada série face à série `benchmark` (índice)."""
+        cov = self.covariance()
+        if cov[benchmark, benchmark] <= 0:
+            return np.full(len(cov), np.nan)
+        return cov[:, benchmark] / cov[benchmark, benchmark]
+
+
+def _forward_fill(closes):
+    """Preenche velas em falta com o fecho anterior (retorno zero nessa vela)."""
+    rows = np.where(np.isnan(closes), 0, np.arange(len(closes))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return closes[rows, np.arange(closes.shape[1])]
+
+
+def stored_klines(symbol, interval, base=ANALYTICS_BASE_INTERVAL):
+    """Velas completas de `interval` agregadas da série base guardada do símbolo."""
+    return resample_klines(load_klines(symbol, base), base, interval)
+
+
+def aligned_closes(symbols, interval, count, after=None):
+    """Fechos guardados de vários símbolos na grelha de open_time do primeiro.
+
+    Devolve (open_times, closes) com closes (T, N) e NaN onde falta a vela.
+    Só as velas posteriores a `after` (até `count`) são devolvidas.
+    """
+    step = INTERVAL_MS[interval]
+    benchmark = stored_klines(symbols[0], interval)
+    if not len(benchmark):
+        return np.empty(0), np.empty((0, len(symbols)))
+    last_open = benchmark[-1, OPEN_TIME]
+    first_open = last_open - (count - 1) * step
+    if after is not None:
+        first_open = max(first_open, after + step)
+    grid = np.arange(first_open, last_open + 1, step, dtype=np.float64)
+    closes = np.full((len(grid), len(symbols)), np.nan)
+    for j, symbol in enumerate(symbols):
+        klines = benchmark if j == 0 else stored_klines(symbol, interval)
+        if not len(klines):
+            continue
+        open_times = klines[:, OPEN_TIME]
+        pos = np.searchsorted(open_times, grid)
+        found = pos < len(open_times)
+        found[found] = open_times[pos[found]] == grid[found]
+        closes[found, j] = klines[pos[found], CLOSE]
+    return grid, closes
+
+
+class MarketAnalytics:
+    """Correlação incremental de um conjunto fixo de símbolos (o primeiro é o BTC)."""
+
+    def __init__(self, symbols, interval=ANALYTICS_INTERVAL, window=ANALYTICS_WINDOW):
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.window = window
+        self.rolling = RollingCorrelation(len(self.symbols), window)
+        self.last_open = None
+        self.last_close = None
+
+    def feed(self, open_times, closes):
+        """Acrescenta velas novas (closes (T, N) alinhado com open_times)."""
+        if self.last_open is not None:
+            new = open_times > self.last_open
+            open_times, closes = open_times[new], closes[new]
+        if not len(open_times):
+            return 0
+        if self.last_close is not None:
+            closes = np.vstack([self.last_close, closes])
+        closes = _forward_fill(closes)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = np.log(closes[1:] / closes[:-1])
+        self.rolling.extend(returns)
+        self.last_open = open_times[-1]
+        self.last_close = closes[-1]
+        return len(returns)
+
+    def update(self):
+        """Lê do kline_store só as velas posteriores à última processada."""
+        open_times, closes = aligned_closes(self.symbols, self.interval, self.window + 1, after=self.last_open)
+        return self.feed(open_times, closes)
+
+    def summary(self):
+        """Resumo serializável em JSON, ou None sem velas suficientes."""
+        if len(self.rolling) < 2:
+            return None
+        corr = self.rolling.correlation()
+        beta = self.rolling.beta(0)
+        alts = self.symbols[1:]
+        corr_btc = corr[1:, 0]
+        alt_corr = corr[1:, 1:]
+        off_diagonal = alt_corr[~np.eye(len(alts), dtype=bool)]
+        window_returns = self.rolling.returns[:len(self.rolling)].sum(axis=0)
+
+        def ranked(values, reverse=False):
+            valid = [(s, float(v)) for s, v in zip(alts, values) if np.isfinite(v)]
+            valid.sort(key=lambda item: item[1], reverse=reverse)
+            return [[s, round(v, 3)] for s, v in valid[:HIGHLIGHTS]]
+
+        def mean(values):
+            values = values[np.isfinite(values)]
+            return float(values.mean()) if len(values) else None
+
+        median_beta = beta[1:][np.isfinite(beta[1:])]
+        return {
+            "symbols": len(self.symbols),
+            "interval": self.interval,
+            "candles": len(self.rolling),
+            "avg_corr_btc": mean(corr_btc),
+            "avg_pairwise_corr": mean(off_diagonal),
+            "median_beta": float(np.median(median_beta)) if len(median_beta) else None,
+            "decoupled": ranked(corr_btc),
+            "high_beta": ranked(beta[1:], reverse=True),
+            "return_dispersion": float(np.std(window_returns[1:]) * 100) if alts else None,
+        }
+
+
+_state = None
+
+
+def select_symbols(top_n=ANALYTICS_TOP_N, ttl=ANALYTICS_UNIVERSE_TTL):
+    """BTCUSDT seguido dos pares USDT em TRADING com mais volume (em USDT) nas últimas 24h.
+
+    A ordenação fica guardada durante `ttl` segundos; entretanto só os pares
+    que deixaram de negociar são retirados.
+    """
+    tradable = get_tradable_symbols("USDT") or set()
+    saved_at, ranked = load_snapshot("analytics_universe")
+    if ranked is None or time.time() - saved_at >= ttl or len(ranked) < top_n - 1:
+        tickers = get_tickers_24h()
+        ranked = sorted(
+            (s for s in tickers if s.endswith("USDT") and s != ANALYTICS_BENCHMARK),
+            key=lambda s: float(tickers[s].get("quoteVolume") or 0),
+            reverse=True,
+        )
+        try:
+            save_snapshot("analytics_universe", ranked)
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar a lista de pares da análise: {e}")
+    ranked = [s for s in ranked if s in tradable]
+    return [ANALYTICS_BENCHMARK] + ranked[:max(top_n - 1, 0)]
+
+
+def _sync(symbol, interval, min_history):
+    """Atualiza a série base do símbolo se faltarem mais velas do que as toleradas."""
+    ratio = INTERVAL_MS[interval] // INTERVAL_MS[ANALYTICS_BASE_INTERVAL]
+    missing = missing_candles(symbol, ANALYTICS_BASE_INTERVAL)
+    if missing is not None and missing // ratio <= ANALYTICS_MAX_STALE_CANDLES:
+        return True
+    try:
+        sync_klines(symbol, ANALYTICS_BASE_INTERVAL, min_history=min_history * ratio)
+        return True
+    except requests.exceptions.RequestException as e:
+        print(f"Erro ao atualizar klines de {symbol}: {e}")
+        return False
+
+
+def get_market_analytics(top_n=ANALYTICS_TOP_N, interval=ANALYTICS_INTERVAL, window=ANALYTICS_WINDOW):
+    """Correlação, beta e dispersão dos top-N pares. Devolve um dict ou None.
+
+    As velas vêm do kline_store; só os pares desatualizados são sincronizados.
+    Num processo longo o estado da janela é reaproveitado enquanto o
+    conjunto de símbolos não mudar.
+    """
+    global _state
+    try:
+        with metrics.span("fetch_universe"):
+            symbols = select_symbols(top_n)
+    except requests.exceptions.RequestException as e:
+        print(f"Erro ao buscar os tickers da Binance: {e}")
+        return None
+
+    with metrics.span("fetch_klines", count=len(symbols)):
+        synced = run_concurrently({s: partial(_sync, s, interval, window + 1) for s in symbols})
+    if not synced.get(ANALYTICS_BENCHMARK):
+        return None
+
+    with metrics.span("analytics", count=len(symbols)):
+        if _state is None or (_state.symbols, _state.interval, _state.window) != (symbols, interval, window):
+            _state = MarketAnalytics(symbols, interval, window)
+        _state.update()
+        return _state.summary()
+
+
+def describe_market(breadth=None, analytics=None):
+    """Frases da observação sobre amplitude, dispersão e correlação ("" sem dados)."""
+    sentences = []
+    if breadth:
+        count = breadth["count"]
+        sentence = (
+            f"Amplitude: {breadth['advancers']} moedas em alta e {breadth['decliners']} em queda "
+            f"entre as {count} analisadas ({breadth['advancers'] / count:.0%} a subir)"
+        )
+        if breadth["dispersion"] >= HIGH_DISPERSION:
+            sentence += f", com dispersão elevada ({breadth['dispersion']:.1f} p.p.): mercado seletivo"
+        sentences.append(sentence + ".")
+    if analytics and analytics.get("avg_corr_btc") is not None:
+        corr = analytics["avg_corr_btc"]
+        period = f"{analytics['candles']} velas de {analytics['interval']}"
+        if corr < DECOUPLED_CORRELATION:
+            names = ", ".join(s.removesuffix("USDT") for s, _ in analytics["decoupled"])
+            sentence = f"Altcoins a descolar do BTC (correlação média {corr:.2f} em {period}; mais independentes: {names})"
+        elif corr > COUPLED_CORRELATION:
+            sentence = f"Mercado a mover-se em bloco com o BTC (correlação média {corr:.2f} em {period})"
+        else:
+            sentence = f"Correlação média das altcoins com o BTC de {corr:.2f} em {period}"
+        if analytics.get("median_beta") is not None:
+            sentence += f", beta mediano {analytics['median_beta']:.2f}"
+        sentences.append(sentence + ".")
+    return " ".join(sentences)
@@ -0,0 +1,259 @@
+"""Instrumentação por execução: tempos por etapa, contadores HTTP e orçamentos.
+
+Ativada pela variável METRICS_DIR. No fim de cada execução grava:
+    METRICS_DIR/<job>.runs.jsonl   uma linha JSON por execução (histórico)
+    METRICS_DIR/<job>.prom         textfile Prometheus (node_exporter --collector.textfile)
+
+Cada execução tem o seu registo numa ContextVar, por isso execuções
+sobrepostas (jobs do daemon em threads diferentes) não se misturam. Uma
+função passada a outra thread só entra na execução de quem a lançou se for
+envolvida com propagate().
+
+Sem METRICS_DIR, span() devolve um context manager nulo partilhado e
+count()/gauge() retornam logo, por isso o custo é desprezável.
+
+Uso:
+    with metrics.run("giro_madrugada_vip"):
+        with metrics.span("analysis"):
+            ...
+        metrics.count("http_retries_total", service="binance")
+        metrics.gauge("binance_used_weight_1m", 120)
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+
+# --- CONFIGURAÇÕES ---
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_PREFIX = "vip_"
+
+ENABLED = bool(METRICS_DIR)
+
+_NULL_SPAN = contextlib.nullcontext()
+_lock = threading.Lock()
+_current = contextvars.ContextVar("metrics_recorder", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class RunRecorder:
+    """Spans, contadores e gauges de uma execução de um relatório."""
+
+    def __init__(self, job):
+        self.job = job
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.gauges = {}
+
+    def add_span(self, name, started, duration, labels, error):
+        span = {
+            "name": name,
+            "start": round(started - self.started, 6),
+            "duration": round(duration, 6),
+            "thread": threading.current_thread().name,
+        }
+        if labels:
+            span["labels"] = labels
+        if error:
+            span["error"] = error
+        with _lock:
+            self.spans.append(span)
+
+    def count(self, name, value, labels):
+        key = _key(name, labels)
+        with _lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, labels):
+        with _lock:
+            self.gauges[_key(name, labels)] = value
+
+    def stage_summary(self):
+        """{etapa: [contagem, soma, máximo]} dos spans."""
+        stages = {}
+        for span in self.spans:
+            stats = stages.setdefault(span["name"], [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += span["duration"]
+            stats[2] = max(stats[2], span["duration"])
+        return stages
+
+    def to_record(self, duration, error):
+        return {
+            "job": self.job,
+            "started_at": self.started_at,
+            "duration": round(duration, 6),
+            "ok": error is None,
+            "error": error,
+            "stages": {
+                name: {"count": count, "total": round(total, 6), "max": round(peak, 6)}
+                for name, (count, total, peak) in self.stage_summary().items()
+            },
+            "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.counters.items()],
+            "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.gauges.items()],
+            "spans": self.spans,
+        }
+
+    def to_prometheus(self, duration, error):
+        job = {"job": self.job}
+        samples = {
+            "run_duration_seconds": [(job, duration)],
+            "run_timestamp_seconds": [(job, self.started_at)],
+            "run_success": [(job, 0 if error else 1)],
+            "stage_duration_seconds_sum": [],
+            "stage_duration_seconds_count": [],
+            "stage_duration_seconds_max": [],
+        }
+        for name, (count, total, peak) in sorted(self.stage_summary().items()):
+            labels = {**job, "stage": name}
+            samples["stage_duration_seconds_sum"].append((labels, total))
+            samples["stage_duration_seconds_count"].append((labels, count))
+            samples["stage_duration_seconds_max"].append((labels, peak))
+        for (name, labels), value in sorted(self.counters.items()) + sorted(self.gauges.items()):
+            samples.setdefault(name, []).append(({**job, **dict(labels)}, value))
+
+        lines = []
+        for name, values in samples.items():
+            metric = METRICS_PREFIX + name
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE {metric} {kind}")
+            for labels, value in values:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{metric}{{{label_text}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "labels", "started")
+
+    def __init__(self, recorder, name, labels):
+        self.recorder = recorder
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.started
+        error = f"{exc_type.__name__}: {exc}" if exc_type else None
+        self.recorder.add_span(self.name, self.started, duration, self.labels, error)
+        return False
+
+
+def span(name, **labels):
+    """Mede uma etapa (context manager). Nulo se a instrumentação estiver desligada."""
+    recorder = _current.get()
+    if recorder is None:
+        return _NULL_SPAN
+    return _Span(recorder, name, labels)
+
+
+def count(name, value=1, **labels):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.count(name, value, labels)
+
+
+def gauge(name, value, **labels):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.gauge(name, value, labels)
+
+
+def propagate(fn):
+    """Envolve `fn` para que os seus spans e contadores entrem na execução corrente.
+
+    Para funções corridas noutras threads (executors, threads de fundo), que
+    não herdam a ContextVar de quem as cria.
+    """
+    recorder = _current.get()
+    if recorder is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        token = _current.set(recorder)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return bound
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_run(recorder, duration, error, metrics_dir=None):
+    """Acrescenta o registo JSON da execução e reescreve o textfile Prometheus."""
+    metrics_dir = metrics_dir or METRICS_DIR
+    os.makedirs(metrics_dir, exist_ok=True)
+    with open(os.path.join(metrics_dir, f"{recorder.job}.runs.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(recorder.to_record(duration, error), separators=(",", ":"), ensure_ascii=False) + "\n")
+    _write_atomic(os.path.join(metrics_dir, f"{recorder.job}.prom"), recorder.to_prometheus(duration, error))
+
+
+@contextlib.contextmanager
+def run(job):
+    """Recolhe as métricas de uma execução completa e grava-as no fim.
+
+    Os spans de threads auxiliares (pedidos em paralelo, snapshots) entram
+    na execução que as lançou através de propagate(); execuções sobrepostas
+    no daemon têm cada uma o seu registo.
+    """
+    if not ENABLED:
+        yield None
+        return
+    recorder = RunRecorder(job)
+    token = _current.set(recorder)
+    error = None
+    try:
+        yield recorder
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        duration = time.perf_counter() - recorder.started
+        try:
+            write_run(recorder, duration, error)
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar as métricas de {job}: {e}")
+
+
+def _response_hook(service):
+    def hook(response, *args, **kwargs):
+        recorder = _current.get()
+        if recorder is None:
+            return
+        labels = {"service": service}
+        recorder.count("http_requests_total", 1, {**labels, "status": str(response.status_code)})
+        # Respostas em streaming ainda não foram lidas: conta o Content-Length
+        if kwargs.get("stream"):
+            size = int(response.headers.get("Content-Length") or 0)
+        else:
+            size = len(response.content or b"")
+        recorder.count("http_response_bytes_total", size, labels)
+        recorder.count("http_request_seconds_total", response.elapsed.total_seconds(), labels)
+    return hook
+
+
+def instrument_session(session, service):
+    """Regista pedidos, bytes, códigos e tempo de resposta de uma requests.Session."""
+    if ENABLED:
+        session.hooks["response"].append(_response_hook(service))
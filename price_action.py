@@ -0,0 +1,123 @@
+import numpy as np
+
+# Classificação de price action (mesmas regras e textos de analyze_klines
+# no Giro da Madrugada), calculada para muitas moedas de uma só vez.
+
+SIGNAL_BUY_PRESSURE, SIGNAL_SELL_PRESSURE, SIGNAL_MOMENTUM_UP, SIGNAL_MOMENTUM_DOWN, SIGNAL_LATERAL = range(5)
+
+SIGNAL_TEXTS = {
+    SIGNAL_BUY_PRESSURE: "Fechou próximo à máxima do período, indicando **forte pressão compradora**.",
+    SIGNAL_SELL_PRESSURE: "Fechou próximo à mínima do período, indicando **forte pressão vendedora**.",
+    SIGNAL_MOMENTUM_UP: "Mostrou **impulso de alta** no final do período.",
+    SIGNAL_MOMENTUM_DOWN: "Mostrou **pressão vendedora** no final do período.",
+    SIGNAL_LATERAL: "Movimento **lateral** no período.",
+}
+
+# Índices no array OHLCV
+O, H, L, C, V = range(5)
+
+# Janela padrão: 7 velas de 1h
+DEFAULT_WINDOW = 7
+
+
+def stack_klines(klines_by_symbol, window=DEFAULT_WINDOW):
+    """Converte {símbolo: klines} num array (moedas × velas × OHLCV).
+
+    Aceita tanto os arrays do kline_store como a resposta crua da Binance
+    (listas de strings). Usa as últimas `window` velas de cada moeda;
+    moedas com menos velas ficam de fora. Devolve (símbolos, array).
+    """
+    symbols = []
+    windows = []
+    for symbol, klines in klines_by_symbol.items():
+        if klines is None or len(klines) < window:
+            continue
+        symbols.append(symbol)
+        windows.append(klines[-window:])
+    if not symbols:
+        return symbols, np.empty((0, window, 5), dtype=np.float64)
+    if all(isinstance(w, np.ndarray) for w in windows):
+        # Caminho do kline_store: fatias dos arrays, sem objetos Python por vela
+        return symbols, np.stack([w[:, 1:6] for w in windows]).astype(np.float64, copy=False)
+    # Resposta crua: uma única lista plana de strings convertida de uma vez
+    flat = [value for w in windows for k in w for value in k[1:6]]
+    return symbols, np.array(flat, dtype=np.float64).reshape(len(symbols), window, 5)
+
+
+# Distância à máxima/mínima do período que conta como "fechou próximo" (0,1%)
+DEFAULT_NEAR = 0.001
+
+
+def classify(ohlcv, near=DEFAULT_NEAR):
+    """Calcula variação, volume, máxima/mínima e sinal para todas as moedas.
+
+    `ohlcv` tem forma (..., velas, 5); as operações são feitas sobre o eixo
+    das velas, por isso também serve para janelas deslizantes
+    (moedas × janelas × velas × 5). `near` só muda nos backtests.
+    Devolve um dicionário de arrays.
+    """
+    first_open = ohlcv[..., 0, O]
+    last_close = ohlcv[..., -1, C]
+    prev_close = ohlcv[..., -2, C]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(first_open != 0, (last_close - first_open) / first_open * 100, 0.0)
+
+    # cumsum soma as velas em sequência, como o sum() de Python, para obter
+    # exatamente o mesmo total
+    total_volume = np.cumsum(ohlcv[..., V], axis=-1)[..., -1]
+    period_high = ohlcv[..., H].max(axis=-1)
+    period_low = ohlcv[..., L].min(axis=-1)
+
+    # Regras por ordem inversa de prioridade: cada atribuição sobrepõe as
+    # anteriores, como os elif de analyze_klines (e mais barato que np.select)
+    rising = last_close > first_open
+    falling = last_close < first_open
+    signal = np.full(last_close.shape, SIGNAL_LATERAL)
+    signal[falling & (last_close < prev_close)] = SIGNAL_MOMENTUM_DOWN
+    signal[rising & (last_close > prev_close)] = SIGNAL_MOMENTUM_UP
+    signal[falling & (last_close < period_low * (1 + near))] = SIGNAL_SELL_PRESSURE
+    signal[rising & (last_close > period_high * (1 - near))] = SIGNAL_BUY_PRESSURE
+
+    return {
+        "change": change,
+        "total_volume": total_volume,
+        "period_high": period_high,
+        "period_low": period_low,
+        "last_close": last_close,
+        "signal": signal,
+    }
+
+
+def classify_signal(first_open, last_close, prev_close, period_high, period_low):
+    """Mesmo sinal de classify() para uma única janela já resumida (O(1))."""
+    if last_close > period_high * 0.999 and last_close > first_open:
+        return SIGNAL_BUY_PRESSURE
+    if last_close < period_low * 1.001 and last_close < first_open:
+        return SIGNAL_SELL_PRESSURE
+    if last_close > first_open and last_close > prev_close:
+        return SIGNAL_MOMENTUM_UP
+    if last_close < first_open and last_close < prev_close:
+        return SIGNAL_MOMENTUM_DOWN
+    return SIGNAL_LATERAL
+
+
+def analyze_klines_batch(klines_by_symbol, window=DEFAULT_WINDOW):
+    """Versão em lote de analyze_klines.
+
+    Devolve {símbolo: (change_7h, total_volume, analysis, last_close)} com
+    os mesmos valores que analyze_klines daria para cada moeda.
+    """
+    symbols, ohlcv = stack_klines(klines_by_symbol, window=window)
+    if not symbols:
+        return {}
+    result = classify(ohlcv)
+    # Conversão para floats Python de uma vez por coluna, não por elemento
+    changes = result["change"].tolist()
+    volumes = result["total_volume"].tolist()
+    last_closes = result["last_close"].tolist()
+    signals = result["signal"].tolist()
+    return {
+        symbol: (changes[i], volumes[i], [SIGNAL_TEXTS[signals[i]]], last_closes[i])
+        for i, symbol in enumerate(symbols)
+    }
@@ -0,0 +1,109 @@
+"""Cotações com pedido de cobertura (hedge) entre CoinMarketCap e Binance.
+
+As moedas fixas dos scanners (BTC, ETH, BNB, SOL, XRP, ADA) existem nas
+duas fontes. A fonte primária é consultada primeiro; se não responder
+dentro de PRICE_HEDGE_BUDGET segundos (ou falhar antes disso), a secundária
+é consultada em paralelo e vale a primeira resposta completa. A latência
+da busca passa a ser a do fornecedor mais rápido, não a do mais lento.
+
+As duas fontes devolvem o mesmo formato, o que format_scanner_message
+espera: {símbolo: {price, percent_change_24h, percent_change_7d}}. Na
+Binance o preço é o do par USDT.
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+import metrics
+from binance_api import get_rolling_tickers, get_tickers_24h, run_concurrently
+from cmc_client import get_quotes
+
+# --- CONFIGURAÇÕES ---
+# Ordem das fontes: a primeira é a primária, as seguintes são a cobertura
+PRICE_SOURCES = tuple(os.environ.get("PRICE_SOURCES", "cmc,binance").split(","))
+# Tempo dado à fonte primária antes de pedir à seguinte (segundos)
+PRICE_HEDGE_BUDGET = float(os.environ.get("PRICE_HEDGE_BUDGET", "1.5"))
+
+QUOTE_FIELDS = ("price", "percent_change_24h", "percent_change_7d")
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="price-source")
+
+
+def cmc_source(symbols):
+    """Cotações USD da CoinMarketCap (pelo cliente partilhado, com cache e junção)."""
+    data = get_quotes(symbols)
+    return {s: {field: data[s][field] for field in QUOTE_FIELDS} for s in symbols if s in data}
+
+
+def binance_source(symbols):
+    """Cotações dos pares USDT da Binance: ticker de 24h e janela móvel de 7 dias."""
+    pairs = [f"{s}USDT" for s in symbols]
+    fetched = run_concurrently({
+        "24h": lambda: get_tickers_24h(pairs),
+        "7d": lambda: get_rolling_tickers(pairs, "7d"),
+    }, max_workers=2)
+    tickers_24h, tickers_7d = fetched["24h"], fetched["7d"]
+    quotes = {}
+    for symbol, pair in zip(symbols, pairs):
+        if pair in tickers_24h and pair in tickers_7d:
+            quotes[symbol] = {
+                "price": float(tickers_24h[pair]["lastPrice"]),
+                "percent_change_24h": float(tickers_24h[pair]["priceChangePercent"]),
+                "percent_change_7d": float(tickers_7d[pair]["priceChangePercent"]),
+            }
+    return quotes
+
+
+SOURCES = {
+    "cmc": cmc_source,
+    "binance": binance_source,
+}
+
+
+def _timed(name, fetch, symbols):
+    with metrics.span("price_source", source=name):
+        return fetch(symbols)
+
+
+def get_hedged_quotes(symbols, sources=PRICE_SOURCES, budget=PRICE_HEDGE_BUDGET):
+    """Cotações da primeira fonte que responder com todos os símbolos.
+
+    Sem nenhuma resposta completa devolve a mais completa que chegou (ou
+    None se todas falharem).
+    """
+    symbols = list(symbols)
+    waiting = list(sources)
+    pending = {}
+    best = None
+
+    def launch():
+        name = waiting.pop(0)
+        pending[_executor.submit(metrics.propagate(_timed), name, SOURCES[name], symbols)] = name
+        return time.monotonic() + budget
+
+    hedge_at = launch()
+    while pending:
+        timeout = max(0.0, hedge_at - time.monotonic()) if waiting else None
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            print(f"Sem resposta completa em {budget:g}s; a pedir também à fonte {waiting[0]}.")
+            hedge_at = launch()
+            continue
+        for future in done:
+            name = pending.pop(future)
+            try:
+                quotes = future.result()
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                print(f"Erro ao buscar cotações na fonte {name}: {e}")
+                quotes = None
+            if quotes and all(s in quotes for s in symbols):
+                metrics.count("price_source_total", source=name, hedged=str(len(sources) - len(waiting) > 1).lower())
+                return quotes
+            if quotes and (best is None or len(quotes) > len(best)):
+                best = quotes
+        # A fonte falhou antes do prazo: a cobertura sai já
+        if not pending and waiting:
+            hedge_at = launch()
+    return best
@@ -0,0 +1,243 @@
+"""Arquivo local das cotações da CMC, para janelas de tempo à medida.
+
+A CMC só dá variações fixas (24h, 7 dias) e cada execução deitava as
+cotações fora. Aqui cada cotação recebida é acrescentada a um ficheiro por
+símbolo (linhas float64 de QUOTE_COLUMNS, só acrescento, como no
+kline_store). As consultas abrem o ficheiro mapeado em memória e fazem
+pesquisa binária pelo timestamp, por isso custam o mesmo com meses de
+histórico e não gastam créditos:
+
+- price_at(símbolo, instante): último preço guardado até esse instante;
+- change_since(símbolo, instante): variação desde esse instante até agora;
+- max_drawdown(símbolo, desde): maior queda desde um máximo na janela.
+
+As execuções que enviam relatórios marcam a hora do envio (mark_report),
+para que a observação possa falar na variação "desde a última análise".
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+# --- CONFIGURAÇÕES ---
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+QUOTE_ARCHIVE_DIR = os.path.join(CACHE_DIR, "quotes")
+QUOTE_REPORTS_FILE = os.path.join(QUOTE_ARCHIVE_DIR, "reports.json")
+# Intervalo mínimo entre duas linhas do mesmo símbolo (segundos); cotações
+# mais próximas (ex.: da cache de 60 s do cmc_client) não são repetidas
+QUOTE_ARCHIVE_MIN_INTERVAL = float(os.environ.get("QUOTE_ARCHIVE_MIN_INTERVAL", "300"))
+# Desativa o arquivo com QUOTE_ARCHIVE=0
+QUOTE_ARCHIVE_ENABLED = os.environ.get("QUOTE_ARCHIVE", "1") != "0"
+
+# Colunas guardadas por cotação (float64; campos em falta ficam NaN)
+QUOTE_COLUMNS = ("timestamp", "price", "volume_24h", "market_cap", "percent_change_24h", "percent_change_7d")
+TIMESTAMP, PRICE, VOLUME_24H, MARKET_CAP, CHANGE_24H, CHANGE_7D = range(len(QUOTE_COLUMNS))
+ROW_BYTES = len(QUOTE_COLUMNS) * 8
+
+LISBON_TZ = pytz.timezone("Europe/Lisbon")
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def archive_path(symbol):
+    return os.path.join(QUOTE_ARCHIVE_DIR, f"{symbol}.f64")
+
+
+def complete_rows(size):
+    """Linhas inteiras num ficheiro de `size` bytes e bytes de uma linha incompleta no fim.
+
+    Uma escrita interrompida pode deixar a última linha a meio; essa parte
+    nunca é lida e é cortada antes do próximo acréscimo (archive_quotes).
+    """
+    return divmod(size, ROW_BYTES)
+
+
+def load_quotes(symbol):
+    """Cotações guardadas do símbolo como array (n, 6) mapeado em memória (só leitura).
+
+    Uma linha final incompleta fica de fora.
+    """
+    path = archive_path(symbol)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    rows, _ = complete_rows(size)
+    if rows == 0:
+        return np.empty((0, len(QUOTE_COLUMNS)), dtype=np.float64)
+    return np.memmap(path, dtype=np.float64, mode="r", shape=(rows, len(QUOTE_COLUMNS)))
+
+
+def _last_timestamp(f):
+    """Timestamp da última linha completa do ficheiro aberto (lê só essa linha), ou None.
+
+    Corta uma linha final incompleta, para o próximo acréscimo ficar alinhado.
+    """
+    rows, torn = complete_rows(f.seek(0, os.SEEK_END))
+    if torn:
+        f.truncate(rows * ROW_BYTES)
+    if rows == 0:
+        return None
+    f.seek((rows - 1) * ROW_BYTES)
+    return float(np.frombuffer(f.read(8), dtype=np.float64)[0])
+
+
+def _row(timestamp, quote):
+    return [timestamp] + [
+        np.nan if quote.get(name) is None else float(quote[name]) for name in QUOTE_COLUMNS[1:]
+    ]
+
+
+def archive_quotes(quotes, timestamp=None):
+    """Acrescenta {símbolo: cotação no formato de quote['USD']} ao arquivo.
+
+    Símbolos com uma linha há menos de QUOTE_ARCHIVE_MIN_INTERVAL segundos
+    são saltados. Devolve o número de linhas escritas; erros de disco só
+    geram um aviso (o arquivo nunca interrompe um relatório).
+    """
+    if not QUOTE_ARCHIVE_ENABLED or not quotes:
+        return 0
+    timestamp = time.time() if timestamp is None else timestamp
+    written = 0
+    try:
+        os.makedirs(QUOTE_ARCHIVE_DIR, exist_ok=True)
+        for symbol, quote in quotes.items():
+            if not quote or quote.get("price") is None or os.sep in symbol:
+                continue
+            path = archive_path(symbol)
+            with _lock_for(path), open(path, "a+b") as f:
+                last = _last_timestamp(f)
+                if last is not None and timestamp - last < QUOTE_ARCHIVE_MIN_INTERVAL:
+                    continue
+                f.write(np.array(_row(timestamp, quote), dtype=np.float64).tobytes())
+            written += 1
+    except OSError as e:
+        print(f"Aviso: não foi possível arquivar cotações: {e}")
+    return written
+
+
+def stored_symbols():
+    """Símbolos com cotações arquivadas."""
+    try:
+        names = os.listdir(QUOTE_ARCHIVE_DIR)
+    except OSError:
+        return []
+    return sorted(name[:-len(".f64")] for name in names if name.endswith(".f64"))
+
+
+def price_at(symbol, timestamp, quotes=None):
+    """(instante, preço) da última cotação até `timestamp`, ou None."""
+    quotes = load_quotes(symbol) if quotes is None else quotes
+    i = int(np.searchsorted(quotes[:, TIMESTAMP], timestamp, side="right"))
+    if i == 0:
+        return None
+    return float(quotes[i - 1, TIMESTAMP]), float(quotes[i - 1, PRICE])
+
+
+def change_since(symbol, since, now=None):
+    """Variação (%) do preço entre `since` e `now` (por omissão, a última cotação).
+
+    Devolve None se não houver cotação guardada até `since`.
+    """
+    quotes = load_quotes(symbol)
+    if not len(quotes):
+        return None
+    start = price_at(symbol, since, quotes)
+    end = price_at(symbol, time.time() if now is None else now, quotes)
+    if start is None or end is None or not start[1]:
+        return None
+    return (end[1] / start[1] - 1) * 100
+
+
+def change_over(symbol, seconds, now=None):
+    """Variação (%) nos últimos `seconds` segundos (ex.: 3 * 86400 para 3 dias)."""
+    now = time.time() if now is None else now
+    return change_since(symbol, now - seconds, now)
+
+
+def max_drawdown(symbol, since, until=None):
+    """Maior queda (%, negativa ou 0) desde um máximo, entre `since` e `until`.
+
+    Só as linhas da janela (encontradas por pesquisa binária) são lidas do
+    disco. Devolve None com menos de duas cotações na janela.
+    """
+    quotes = load_quotes(symbol)
+    timestamps = quotes[:, TIMESTAMP]
+    until = time.time() if until is None else until
+    lo = np.searchsorted(timestamps, since, side="left")
+    hi = np.searchsorted(timestamps, until, side="right")
+    prices = np.asarray(quotes[lo:hi, PRICE])
+    prices = prices[np.isfinite(prices)]
+    if len(prices) < 2:
+        return None
+    return float((prices / np.maximum.accumulate(prices) - 1).min() * 100)
+
+
+def day_start(now=None):
+    """Início do dia de hoje em Lisboa (epoch), para as janelas intradiárias."""
+    today = datetime.fromtimestamp(time.time() if now is None else now, LISBON_TZ)
+    return LISBON_TZ.localize(datetime(today.year, today.month, today.day)).timestamp()
+
+
+def load_reports():
+    try:
+        with open(QUOTE_REPORTS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def last_report(key):
+    """Instante (epoch) do último envio do relatório `key`, ou None."""
+    return load_reports().get(key)
+
+
+def mark_report(key, timestamp=None):
+    """Regista o envio do relatório `key` (para "desde a última análise")."""
+    reports = load_reports()
+    reports[key] = time.time() if timestamp is None else timestamp
+    try:
+        os.makedirs(QUOTE_ARCHIVE_DIR, exist_ok=True)
+        tmp_path = f"{QUOTE_REPORTS_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(reports, f)
+        os.replace(tmp_path, QUOTE_REPORTS_FILE)
+    except OSError as e:
+        print(f"Aviso: não foi possível gravar a hora do relatório {key}: {e}")
+
+
+def describe_history(symbols, since=None, days=3, now=None):
+    """Frase com as janelas do arquivo local ("" sem histórico suficiente).
+
+    Fala na variação desde `since` (a última análise), em `days` dias e na
+    maior queda intradiária, para cada símbolo com dados.
+    """
+    now = time.time() if now is None else now
+    parts = []
+    if since:
+        changes = [(s, change_since(s, since, now)) for s in symbols]
+        changes = [f"{s} {round(c, 1) + 0.0:+.1f}%" for s, c in changes if c is not None]
+        if changes:
+            saved = datetime.fromtimestamp(since, LISBON_TZ)
+            parts.append(f"desde a última análise ({saved:%d/%m %H:%M}) {', '.join(changes)}")
+    changes = [(s, change_over(s, days * 86400, now)) for s in symbols]
+    changes = [f"{s} {round(c, 1) + 0.0:+.1f}%" for s, c in changes if c is not None]
+    if changes:
+        parts.append(f"em {days} dias {', '.join(changes)}")
+    drawdowns = [(s, max_drawdown(s, day_start(now), now)) for s in symbols]
+    drawdowns = [f"{s} {d:.1f}%" for s, d in drawdowns if d is not None and d <= -0.1]
+    if drawdowns:
+        parts.append(f"maior queda intradiária {', '.join(drawdowns)}")
+    if not parts:
+        return ""
+    return "Histórico: " + "; ".join(parts) + "."
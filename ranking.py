@@ -0,0 +1,39 @@
+import heapq
+from itertools import count
+
+
+class TopK:
+    """Mantém os k maiores itens de um fluxo, com memória O(k).
+
+    Cada push custa O(log k); não é preciso guardar nem ordenar o
+    universo inteiro. Para os k menores use reverse=True.
+    """
+
+    def __init__(self, k, key, reverse=False):
+        self.k = k
+        self.key = key
+        self.sign = -1 if reverse else 1
+        self.heap = []
+        # Desempate estável: em caso de empate fica o item que chegou primeiro
+        self.counter = count()
+
+    def push(self, item):
+        value = self.key(item)
+        if value is None:
+            return
+        entry = (self.sign * value, -next(self.counter), item)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def extend(self, items):
+        for item in items:
+            self.push(item)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def result(self):
+        """Itens do melhor para o pior (maior primeiro, ou menor com reverse)."""
+        return [entry[2] for entry in sorted(self.heap, key=lambda e: e[:2], reverse=True)]
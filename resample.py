@@ -0,0 +1,167 @@
+"""Timeframes superiores (1h, 4h, 1d, ...) construídos a partir de uma série base.
+
+Só a série base (ex.: 15m) é pedida à Binance; as outras são agregadas
+localmente. A agregação é incremental: cada vela base nova (ou a vela base
+aberta a ser atualizada) mexe apenas no último bucket de cada timeframe,
+em O(1), por isso o mesmo Resampler serve para o relatório, o daemon e os
+streams.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+from kline_store import CLOSE, CLOSE_TIME, HIGH, INTERVAL_MS, KLINE_COLUMNS, LOW, OPEN, OPEN_TIME, VOLUME, get_klines
+
+# Buckets completos guardados por timeframe
+RESAMPLE_KEEP = 200
+
+
+class Resampler:
+    """Agrega velas base num timeframe superior alinhado à época (como a Binance).
+
+    Estado: buckets fechados, o agregado das velas base já fechadas do
+    bucket corrente e a última vela base (que pode ainda estar aberta e ser
+    substituída por versões mais recentes).
+    """
+
+    def __init__(self, target, keep=RESAMPLE_KEEP):
+        self.step = INTERVAL_MS[target]
+        self.closed = deque(maxlen=keep)
+        self.partial = None
+        self.last_row = None
+        # O primeiro bucket só conta se começar na primeira vela base do bucket
+        self.complete = True
+
+    def _bucket_open(self, open_time):
+        return open_time - open_time % self.step
+
+    def _merge(self, bucket, row):
+        if bucket is None:
+            bucket_open = self._bucket_open(row[OPEN_TIME])
+            return [bucket_open, row[OPEN], row[HIGH], row[LOW], row[CLOSE], row[VOLUME], bucket_open + self.step - 1]
+        return [
+            bucket[OPEN_TIME], bucket[OPEN], max(bucket[HIGH], row[HIGH]), min(bucket[LOW], row[LOW]),
+            row[CLOSE], bucket[VOLUME] + row[VOLUME], bucket[CLOSE_TIME],
+        ]
+
+    def update(self, row):
+        """Aplica uma vela base (nova ou atualização da última)."""
+        open_time = row[OPEN_TIME]
+        if self.last_row is None:
+            self.complete = open_time == self._bucket_open(open_time)
+            self.last_row = row
+            return
+        last_open = self.last_row[OPEN_TIME]
+        if open_time < last_open:
+            return  # vela base atrasada
+        if open_time == last_open:
+            self.last_row = row
+            return
+        if self._bucket_open(open_time) == self._bucket_open(last_open):
+            self.partial = self._merge(self.partial, self.last_row)
+        else:
+            if self.complete:
+                self.closed.append(self._merge(self.partial, self.last_row))
+            self.partial = None
+            self.complete = True
+        self.last_row = row
+
+    def current(self):
+        """Bucket em curso (inclui a última vela base), ou None."""
+        if self.last_row is None or not self.complete:
+            return None
+        return self._merge(self.partial, self.last_row)
+
+    def candles(self, limit):
+        """Últimos `limit` buckets como array (n, 7); o último pode estar aberto."""
+        rows = list(self.closed)
+        current = self.current()
+        if current is not None:
+            rows.append(current)
+        rows = rows[-limit:]
+        if not rows:
+            return np.empty((0, len(KLINE_COLUMNS)), dtype=np.float64)
+        return np.array(rows, dtype=np.float64)
+
+
+def resample_klines(rows, base, target):
+    """Buckets completos de `target` a partir de velas base fechadas (array (n, 7)).
+
+    Versão vetorizada para séries guardadas (ex.: o kline_store de 15m):
+    só entram os buckets com todas as velas base, e o resultado tem as
+    mesmas colunas do kline_store.
+    """
+    rows = np.asarray(rows, dtype=np.float64)
+    step = INTERVAL_MS[target]
+    ratio = step // INTERVAL_MS[base]
+    if ratio == 1 or not len(rows):
+        return rows
+    buckets = rows[:, OPEN_TIME] - rows[:, OPEN_TIME] % step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(rows)])
+    ends = starts + counts - 1
+    candles = np.column_stack([
+        buckets[starts],
+        rows[starts, OPEN],
+        np.maximum.reduceat(rows[:, HIGH], starts),
+        np.minimum.reduceat(rows[:, LOW], starts),
+        rows[ends, CLOSE],
+        np.add.reduceat(rows[:, VOLUME], starts),
+        buckets[starts] + step - 1,
+    ])
+    return candles[counts == ratio]
+
+
+class MultiTimeframe:
+    """Série base de um símbolo e os seus Resamplers, alimentados só com velas novas."""
+
+    def __init__(self, base, targets):
+        self.base = base
+        self.resamplers = {target: Resampler(target) for target in targets if target != base}
+        self.last_open = None
+        self.lock = threading.Lock()
+
+    def feed(self, rows):
+        with self.lock:
+            for row in rows:
+                row = [float(v) for v in row[:len(KLINE_COLUMNS)]]
+                # A última vela já aplicada volta a entrar (pode ter mudado enquanto aberta)
+                if self.last_open is not None and row[OPEN_TIME] < self.last_open:
+                    continue
+                for resampler in self.resamplers.values():
+                    resampler.update(row)
+                self.last_open = row[OPEN_TIME]
+
+    def candles(self, target, limit):
+        with self.lock:
+            return self.resamplers[target].candles(limit)
+
+
+_series = {}
+_series_lock = threading.Lock()
+
+
+def base_limit(base, targets, limit):
+    """Velas base necessárias para `limit` buckets completos do maior timeframe."""
+    ratio = max(INTERVAL_MS[t] for t in targets) // INTERVAL_MS[base]
+    return limit * ratio + ratio
+
+
+def get_timeframes(symbol, base="15m", targets=("15m", "1h", "4h", "1d"), limit=7):
+    """Últimas `limit` velas de cada timeframe: {timeframe: array (n, 7)}.
+
+    Um único pedido incremental da série base ao kline_store; os timeframes
+    superiores saem dos Resamplers, que num processo longo (daemon) só
+    recebem as velas base novas.
+    """
+    rows = get_klines(symbol, interval=base, limit=base_limit(base, targets, limit))
+    with _series_lock:
+        series = _series.get((symbol, base))
+        if series is None or set(series.resamplers) != set(targets) - {base}:
+            series = _series[(symbol, base)] = MultiTimeframe(base, targets)
+    series.feed(rows)
+    return {
+        target: rows[-limit:] if target == base else series.candles(target, limit)
+        for target in targets
+    }
@@ -0,0 +1,207 @@
+"""Daemon que corre os três relatórios num só processo, com agenda tipo cron.
+
+Substitui os três workflows agendados: os módulos, sessões HTTP e caches
+ficam carregados entre execuções, por isso cada relatório sai segundos
+depois da hora marcada. As horas da agenda são de Lisboa (SCHEDULE_TZ),
+com a mudança de hora tratada corretamente.
+
+Atenção: os workflows do GitHub Actions corriam em UTC, por isso com as
+mesmas expressões cada relatório sai 1h mais cedo no horário de verão (no
+inverno Lisboa = UTC). Para manter as horas UTC antigas, SCHEDULE_TZ=UTC.
+
+Uso:
+    python scheduler_daemon.py            # corre para sempre
+    python scheduler_daemon.py --list     # mostra as próximas execuções
+    python scheduler_daemon.py --once giro_madrugada_vip
+"""
+import argparse
+import importlib.util
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+import anomaly_detector
+import crypto_scanner_v2
+import crypto_scanner_vip
+import metrics
+import watchlists
+
+GIRO_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "giro_madrugada_vip (1).py")
+
+
+def load_giro_module():
+    """Importa o script do Giro (o nome do ficheiro não é um módulo válido)."""
+    spec = importlib.util.spec_from_file_location("giro_madrugada_vip", GIRO_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+giro_madrugada_vip = load_giro_module()
+LISBON_TZ = giro_madrugada_vip.LISBON_TZ
+# Fuso horário em que as expressões da agenda são avaliadas
+SCHEDULE_TZ = pytz.timezone(os.environ.get("SCHEDULE_TZ", "Europe/Lisbon"))
+
+# --- AGENDA (minuto hora dia-do-mês mês dia-da-semana, hora de SCHEDULE_TZ) ---
+# Dia da semana: 0 = domingo ... 6 = sábado, como no cron
+SCHEDULE = {
+    "giro_madrugada_vip": os.environ.get("SCHEDULE_GIRO", "15 7 * * *"),
+    "analise_vip": os.environ.get("SCHEDULE_ANALISE", "0 12 * * *"),
+    "scanner_vip": os.environ.get("SCHEDULE_SCANNER", "0 19 * * *"),
+}
+
+JOBS = {
+    "giro_madrugada_vip": giro_madrugada_vip.main,
+    "analise_vip": crypto_scanner_v2.main,
+    "scanner_vip": crypto_scanner_vip.main,
+    "analise_vip_dashboard": crypto_scanner_v2.main_dashboard,
+    "watchlists": watchlists.run_cycle,
+    "anomalias": anomaly_detector.run_cycle,
+}
+
+# Painel ao vivo da Análise VIP (mensagem fixada, editada no lugar): só
+# entra na agenda se SCHEDULE_DASHBOARD estiver definido (ex.: "* * * * *";
+# cada atualização usa preços da Binance e a listagem da CMC em snapshot,
+# ver DASHBOARD_SNAPSHOT_TTL em crypto_scanner_v2)
+if os.environ.get("SCHEDULE_DASHBOARD"):
+    SCHEDULE["analise_vip_dashboard"] = os.environ["SCHEDULE_DASHBOARD"]
+# Watchlists por assinante: só com SCHEDULE_WATCHLISTS definido
+if os.environ.get("SCHEDULE_WATCHLISTS"):
+    SCHEDULE["watchlists"] = os.environ["SCHEDULE_WATCHLISTS"]
+# Volume/volatilidade anómalos: de hora a hora, com SCHEDULE_ANOMALIES definido
+# (ex.: "5 * * * *")
+if os.environ.get("SCHEDULE_ANOMALIES"):
+    SCHEDULE["anomalias"] = os.environ["SCHEDULE_ANOMALIES"]
+
+CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+
+def parse_cron_field(field, low, high):
+    """Converte um campo cron ('*', '5', '1-5', '*/15', '1,3') num conjunto."""
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-"))
+        else:
+            start = end = int(part)
+        if start < low or end > high:
+            raise ValueError(f"Valor fora do intervalo {low}-{high}: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Expressão cron de 5 campos avaliada em horas de parede de `tz`.
+
+    Como no cron: se o dia do mês e o dia da semana estiverem ambos
+    restritos (nenhum começa por '*'), basta um dos dois coincidir.
+    """
+
+    def __init__(self, expression, tz=SCHEDULE_TZ):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expressão cron inválida: {expression}")
+        self.expression = expression
+        self.tz = tz
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            sorted(parse_cron_field(f, low, high)) for f, (low, high) in zip(fields, CRON_RANGES)
+        )
+        self.either_day = not fields[2].startswith("*") and not fields[4].startswith("*")
+
+    def _matches_day(self, day):
+        if day.month not in self.months:
+            return False
+        # isoweekday(): segunda = 1 ... domingo = 7 -> cron: domingo = 0
+        day_match = day.day in self.days
+        weekday_match = day.isoweekday() % 7 in self.weekdays
+        if self.either_day:
+            return day_match or weekday_match
+        return day_match and weekday_match
+
+    def next_run(self, after):
+        """Próximo instante (aware) estritamente depois de `after`.
+
+        Percorre as horas de parede do fuso da agenda: uma hora que não existe (salto
+        de primavera) é ignorada e uma hora repetida (outono) corre só na
+        primeira ocorrência.
+        """
+        local_after = after.astimezone(self.tz)
+        day = local_after.date()
+        for _ in range(366 * 5):
+            if self._matches_day(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        naive = datetime(day.year, day.month, day.day, hour, minute)
+                        try:
+                            candidate = self.tz.localize(naive, is_dst=None)
+                        except pytz.NonExistentTimeError:
+                            continue
+                        except pytz.AmbiguousTimeError:
+                            candidate = self.tz.localize(naive, is_dst=True)
+                        if candidate > local_after:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f"Nenhuma execução encontrada para: {self.expression}")
+
+
+def run_job(name):
+    """Corre um relatório, sem deixar uma exceção derrubar o daemon."""
+    started = time.monotonic()
+    print(f"[{datetime.now(LISBON_TZ):%Y-%m-%d %H:%M:%S}] A iniciar {name}...")
+    try:
+        with metrics.run(name):
+            JOBS[name]()
+    except Exception as e:
+        print(f"Erro ao executar {name}: {e}")
+    print(f"{name} concluído em {time.monotonic() - started:.1f}s.")
+
+
+def run_forever(schedule=SCHEDULE):
+    schedules = {name: CronSchedule(expression) for name, expression in schedule.items()}
+    now = datetime.now(pytz.utc)
+    next_runs = {name: s.next_run(now) for name, s in schedules.items()}
+    running = {}
+
+    for name, when in sorted(next_runs.items(), key=lambda item: item[1]):
+        print(f"{name}: próxima execução {when:%Y-%m-%d %H:%M %Z}")
+
+    while True:
+        name, when = min(next_runs.items(), key=lambda item: item[1])
+        wait = (when - datetime.now(pytz.utc)).total_seconds()
+        if wait > 0:
+            # Dormir no máximo 60s de cada vez para acompanhar acertos do relógio
+            time.sleep(min(wait, 60))
+            continue
+
+        if name in running and running[name].is_alive():
+            print(f"{name} ainda está a correr; execução das {when:%H:%M} ignorada.")
+        else:
+            running[name] = threading.Thread(target=run_job, args=(name,), name=name)
+            running[name].start()
+        next_runs[name] = schedules[name].next_run(when)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agenda dos relatórios VIP")
+    parser.add_argument("--list", action="store_true", help="mostra as próximas execuções e sai")
+    parser.add_argument("--once", choices=sorted(JOBS), help="corre um relatório agora e sai")
+    args = parser.parse_args()
+
+    if args.list:
+        now = datetime.now(pytz.utc)
+        for name, expression in SCHEDULE.items():
+            when = CronSchedule(expression).next_run(now)
+            print(f"{name} ({expression}): {when:%Y-%m-%d %H:%M %Z}")
+    elif args.once:
+        run_job(args.once)
+    else:
+        run_forever()
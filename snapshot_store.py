@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import pytz
+
+import metrics
+
+# --- CONFIGURAÇÕES ---
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "snapshots")
+# Prazo padrão de cada fonte antes de recorrer ao último snapshot (segundos)
+SNAPSHOT_DEADLINE = float(os.environ.get("SNAPSHOT_DEADLINE", "10"))
+
+# Fuso horário de Lisboa (para o marcador de frescura)
+LISBON_TZ = pytz.timezone("Europe/Lisbon")
+
+
+def snapshot_path(key):
+    return os.path.join(SNAPSHOT_DIR, f"{key}.json")
+
+
+def save_snapshot(key, data):
+    """Grava o último resultado bom de uma fonte (escrita atómica)."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(key)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"saved_at": time.time(), "data": data}, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(key):
+    """Devolve (saved_at, data) do último snapshot, ou (None, None)."""
+    try:
+        with open(snapshot_path(key), "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        return snapshot["saved_at"], snapshot["data"]
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+
+class SnapshotFetch:
+    """Busca de uma fonte em segundo plano, com prazo para o resultado.
+
+    `fetch` é uma função sem argumentos que devolve dados serializáveis em
+    JSON, ou None em caso de falha. Cada resultado bom atualiza o snapshot,
+    mesmo que chegue depois do prazo.
+
+    Com `ttl` (segundos), um snapshot mais recente do que isso é usado como
+    resultado fresco e a fonte nem é consultada.
+    """
+
+    def __init__(self, key, fetch, ttl=None):
+        self.key = key
+        self.fetch = fetch
+        self.data = None
+        self.started_at = time.time()
+        self.thread = None
+        if ttl:
+            saved_at, data = load_snapshot(key)
+            if data is not None and self.started_at - saved_at < ttl:
+                metrics.count("snapshot_ttl_hits_total", source=key)
+                self.data = data
+                return
+        # Thread não-daemon: se o prazo expirar, o processo espera que a
+        # atualização termine e grave o snapshot antes de sair.
+        self.thread = threading.Thread(target=metrics.propagate(self._run), name=f"snapshot-{key}")
+        self.thread.start()
+
+    def _run(self):
+        try:
+            with metrics.span("fetch", source=self.key):
+                data = self.fetch()
+        except Exception as e:
+            print(f"Erro ao atualizar a fonte {self.key}: {e}")
+            return
+        if data is not None:
+            self.data = data
+            try:
+                save_snapshot(self.key, data)
+            except OSError as e:
+                print(f"Aviso: não foi possível gravar o snapshot {self.key}: {e}")
+
+    def result(self, deadline=SNAPSHOT_DEADLINE):
+        """Devolve (data, stale_since).
+
+        stale_since é None quando os dados são frescos, ou o instante
+        (epoch) do snapshot usado quando a fonte falhou ou não respondeu a
+        tempo. Sem snapshot disponível devolve (None, None).
+        """
+        if self.thread is not None:
+            self.thread.join(max(0.0, self.started_at + deadline - time.time()))
+        if self.data is not None:
+            metrics.gauge("snapshot_stale", 0, source=self.key)
+            return self.data, None
+        metrics.gauge("snapshot_stale", 1, source=self.key)
+        if self.thread.is_alive():
+            print(f"Fonte {self.key} não respondeu em {deadline:g}s. Usando o último snapshot.")
+        saved_at, data = load_snapshot(self.key)
+        if data is None:
+            return None, None
+        return data, saved_at
+
+
+def fetch_with_deadline(key, fetch, deadline=SNAPSHOT_DEADLINE):
+    """Atalho para SnapshotFetch(key, fetch).result(deadline)."""
+    return SnapshotFetch(key, fetch).result(deadline)
+
+
+def refresh(key, fetch):
+    """Atualização manual: executa a busca até ao fim e grava o snapshot."""
+    snapshot_fetch = SnapshotFetch(key, fetch)
+    snapshot_fetch.thread.join()
+    if snapshot_fetch.data is None:
+        print(f"Não foi possível atualizar o snapshot {key}.")
+        return False
+    print(f"Snapshot {key} atualizado.")
+    return True
+
+
+def format_freshness(stale_since):
+    """Marcador para mensagens montadas a partir de um snapshot antigo."""
+    saved = datetime.fromtimestamp(stale_since, LISBON_TZ)
+    return f"<i>⏱ Dados de {saved:%d/%m %H:%M} (Lisboa); fonte lenta, atualização em segundo plano.</i>"
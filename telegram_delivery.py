@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# --- CONFIGURAÇÕES ---
+BOT_TOKEN = os.environ.get("BOT_TOKEN")
+# Destinos: lista separada por vírgulas em CHAT_IDS_VIP, ou o CHAT_ID_VIP único
+CHAT_ID_VIP = os.environ.get("CHAT_ID_VIP")
+CHAT_IDS_VIP = os.environ.get("CHAT_IDS_VIP")
+
+TELEGRAM_API_BASE = os.environ.get("TELEGRAM_API_BASE", "https://api.telegram.org")
+
+# Limites do Bot API: ~30 mensagens/s no total, 1/s por chat privado e
+# 20/min por grupo ou canal (ids negativos)
+TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = 1.0
+TELEGRAM_GROUP_RATE = 20 / 60
+# Tamanho máximo do texto de uma mensagem
+TELEGRAM_MAX_LENGTH = 4096
+TELEGRAM_MAX_RETRIES = 3
+TELEGRAM_MAX_WORKERS = int(os.environ.get("TELEGRAM_MAX_WORKERS", "8"))
+
+
+class TokenBucket:
+    """Balde de fichas: `rate` fichas por segundo, até `capacity` acumuladas."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Bloqueia até haver uma ficha disponível e consome-a."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def block(self, seconds):
+        """Suspende o balde (resposta 429 com retry_after)."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=TELEGRAM_MAX_WORKERS))
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=TELEGRAM_MAX_WORKERS))
+metrics.instrument_session(session, "telegram")
+
+global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, capacity=TELEGRAM_GLOBAL_RATE)
+_chat_buckets = {}
+_chat_buckets_lock = threading.Lock()
+
+
+def chat_bucket(chat_id):
+    with _chat_buckets_lock:
+        if chat_id not in _chat_buckets:
+            rate = TELEGRAM_GROUP_RATE if str(chat_id).startswith("-") else TELEGRAM_CHAT_RATE
+            _chat_buckets[chat_id] = TokenBucket(rate)
+        return _chat_buckets[chat_id]
+
+
+def get_chat_ids():
+    """Lista de chats VIP configurados nas variáveis de ambiente."""
+    if CHAT_IDS_VIP:
+        return [c.strip() for c in CHAT_IDS_VIP.split(",") if c.strip()]
+    if CHAT_ID_VIP:
+        return [CHAT_ID_VIP]
+    return []
+
+
+def telegram_length(text):
+    # O Telegram conta o tamanho em unidades UTF-16 (emojis contam 2)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def split_message(text, limit=TELEGRAM_MAX_LENGTH):
+    """Divide o texto em partes de até `limit` caracteres, em quebras de linha.
+
+    As tags HTML das mensagens abrem e fecham na mesma linha, por isso cortar
+    entre linhas nunca deixa uma tag aberta. Só uma linha maior que o limite
+    é cortada a meio.
+    """
+    if telegram_length(text) <= limit:
+        return [text]
+    parts = []
+    current = ""
+    for line in text.split("\n"):
+        while telegram_length(line) > limit:
+            cut = limit
+            while telegram_length(line[:cut]) > limit:
+                cut -= 1
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:cut])
+            line = line[cut:]
+        candidate = f"{current}\n{line}" if current else line
+        if telegram_length(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def call_bot_api(method, chat_id, payload):
+    """Chama um método do Bot API para um chat, com rate limit e novas tentativas.
+
+    Devolve (resposta JSON ou None, tentativas, erro ou None).
+    """
+    url = f"{TELEGRAM_API_BASE}/bot{BOT_TOKEN}/{method}"
+    bucket = chat_bucket(chat_id)
+    error = None
+    for attempt in range(1, TELEGRAM_MAX_RETRIES + 2):
+        bucket.acquire()
+        global_bucket.acquire()
+        try:
+            response = session.post(url, data=payload, timeout=15)
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+            metrics.count("http_retries_total", service="telegram", reason="connection")
+            time.sleep(min(2 ** attempt, 10))
+            continue
+
+        if response.status_code == 429:
+            try:
+                retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+            except ValueError:
+                retry_after = 1
+            error = f"429 Too Many Requests (retry_after={retry_after})"
+            bucket.block(retry_after)
+            metrics.count("http_retries_total", service="telegram", reason="429")
+            continue
+        if response.status_code >= 500:
+            error = f"{response.status_code} {response.reason}"
+            metrics.count("http_retries_total", service="telegram", reason=str(response.status_code))
+            time.sleep(min(2 ** attempt, 10))
+            continue
+        if not response.ok:
+            try:
+                error = response.json().get("description", response.reason)
+            except ValueError:
+                error = response.reason
+            return None, attempt, f"{response.status_code} {error}"
+        return response.json(), attempt, None
+    return None, TELEGRAM_MAX_RETRIES + 1, error
+
+
+def send_to_chat(chat_id, text, parse_mode='HTML'):
+    """Envia o texto (dividido se preciso) a um chat. Devolve o resultado da entrega."""
+    started = time.monotonic()
+    result = {"chat_id": chat_id, "ok": True, "parts": 0, "attempts": 0, "message_ids": [], "error": None}
+    for part in split_message(text):
+        payload = {
+            'chat_id': chat_id,
+            'text': part,
+            'parse_mode': parse_mode
+        }
+        response, attempts, error = call_bot_api("sendMessage", chat_id, payload)
+        result["attempts"] += attempts
+        if response is None:
+            result["ok"] = False
+            result["error"] = error
+            break
+        result["parts"] += 1
+        result["message_ids"].append(response.get("result", {}).get("message_id"))
+    result["latency"] = time.monotonic() - started
+    return result
+
+
+def deliver(text, chat_ids=None, parse_mode='HTML'):
+    """Envia a mensagem a vários chats em paralelo e imprime o relatório da entrega.
+
+    Devolve a lista de resultados por chat.
+    """
+    chat_ids = chat_ids if chat_ids is not None else get_chat_ids()
+    if not BOT_TOKEN or not chat_ids:
+        print("Erro: BOT_TOKEN ou CHAT_ID_VIP/CHAT_IDS_VIP não configurados.")
+        return []
+
+    with metrics.span("telegram_send", chats=len(chat_ids)):
+        with ThreadPoolExecutor(max_workers=min(TELEGRAM_MAX_WORKERS, len(chat_ids))) as executor:
+            results = list(executor.map(metrics.propagate(lambda chat_id: send_to_chat(chat_id, text, parse_mode)), chat_ids))
+
+    for r in results:
+        if r["ok"]:
+            print(f"Mensagem enviada para {r['chat_id']} ({r['parts']} parte(s), {r['latency'] * 1000:.0f} ms, {r['attempts']} tentativa(s)).")
+        else:
+            print(f"Erro ao enviar mensagem para {r['chat_id']}: {r['error']} ({r['latency'] * 1000:.0f} ms)")
+    failed = sum(1 for r in results if not r["ok"])
+    metrics.count("telegram_deliveries_total", len(results) - failed, ok="true")
+    metrics.count("telegram_deliveries_total", failed, ok="false")
+    print(f"Entrega concluída: {len(results) - failed}/{len(results)} chats.")
+    return results
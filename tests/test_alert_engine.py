@@ -0,0 +1,48 @@
+from alert_engine import AlertEngine, wildcard_pairs
+
+RULES = [
+    {"id": "sol200", "chat_id": "1", "symbol": "SOL", "metric": "price", "level": 200, "direction": "up"},
+    {"id": "sol200b", "chat_id": "1", "symbol": "SOL", "metric": "price", "level": 200, "direction": "up"},
+    {"id": "any8", "chat_id": "2", "symbol": "*", "metric": "change_1h", "level": 8, "both": True, "cooldown": 0},
+]
+
+
+def test_active_alert_is_not_resent_across_cycles(tmp_path):
+    path = tmp_path / "alert_state.json"
+    engine = AlertEngine(RULES, default_cooldown=0)
+    engine.update("SOL", "price", 190, now=0)
+    alerts = engine.update("SOL", "price", 210, now=1)
+    # Duas regras iguais do mesmo chat: um só alerta
+    assert [a["rule_id"] for a in alerts] == ["sol200"]
+    engine.save_state(path)
+
+    # Nova execução com uma referência anterior ao disparo: continua ativo
+    engine = AlertEngine(RULES, default_cooldown=0)
+    engine.load_state(path)
+    engine.last_values[("SOL", "price")] = 190
+    assert not engine.update("SOL", "price", 205, now=2)
+    assert not engine.update("SOL", "price", 210, now=3)
+    # O preço voltou abaixo do nível: o próximo cruzamento dispara de novo
+    engine.update("SOL", "price", 199, now=4)
+    assert len(engine.update("SOL", "price", 201, now=5)) == 1
+
+
+def test_both_directions_are_tracked_separately():
+    engine = AlertEngine(RULES)
+    engine.update("DOGE", "change_1h", 2.0, now=0)
+    assert engine.update("DOGE", "change_1h", 9.0, now=1)[0]["direction"] == "up"
+    engine.last_values[("DOGE", "change_1h")] = 2.0
+    assert not engine.update("DOGE", "change_1h", 9.5, now=2)
+    assert engine.update("DOGE", "change_1h", -9.0, now=3)[0]["direction"] == "down"
+    assert not engine.active.get(("DOGE", "change_1h"), {}).get(("2", 8.0, "up"))
+
+
+def test_wildcard_pairs_are_limited_to_top_volume():
+    tickers = {f"C{i}USDT": {"symbol": f"C{i}USDT", "quoteVolume": str(i)} for i in range(500)}
+    tickers["C1BTC"] = {"symbol": "C1BTC", "quoteVolume": "1e12"}
+    engine = AlertEngine(RULES)
+    assert wildcard_pairs(engine, tickers, top_n=3) == {"C499USDT", "C498USDT", "C497USDT"}
+
+    listed = dict(RULES[2], id="listed", symbols=["C1"])
+    engine = AlertEngine([listed])
+    assert wildcard_pairs(engine, tickers, top_n=3) == {"C1USDT"}
@@ -0,0 +1,105 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("websocket")
+
+import binance_stream
+from binance_stream import BinanceStream, MarketState, RollingWindow, stream_batches, subscribe_messages
+from price_action import analyze_klines_batch
+from ws_replay_server import start_replay_server
+
+HOUR_MS = 3_600_000
+
+
+def kline_frames(symbols, candles=10, updates=3, seed=0):
+    """Mensagens de kline (várias atualizações por vela) e as velas finais de cada símbolo."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    final = {symbol: [] for symbol in symbols}
+    for c in range(candles):
+        for symbol in symbols:
+            open_ = round(float(rng.uniform(90, 110)), 2)
+            high = low = close = open_
+            volume = 0.0
+            for _ in range(updates):
+                close = round(open_ * (1 + float(rng.normal(0, 0.01))), 2)
+                high, low = max(high, close), min(low, close)
+                volume = round(volume + float(rng.uniform(0, 10)), 3)
+                frames.append(json.dumps({
+                    "stream": f"{symbol.lower()}@kline_1h",
+                    "data": {"e": "kline", "E": c * HOUR_MS, "s": symbol, "k": {
+                        "t": c * HOUR_MS, "o": str(open_), "h": str(high), "l": str(low),
+                        "c": str(close), "v": str(volume),
+                    }},
+                }))
+            final[symbol].append([c * HOUR_MS, open_, high, low, close, volume, c * HOUR_MS + HOUR_MS - 1])
+    return frames, {symbol: np.array(rows) for symbol, rows in final.items()}
+
+
+def assert_matches_batch(state, final):
+    expected = analyze_klines_batch(final)
+    for symbol, (change, volume, analysis, last_close) in expected.items():
+        window = state.get(symbol)["window"]
+        assert window["change"] == pytest.approx(change)
+        assert window["total_volume"] == pytest.approx(volume)
+        assert window["last_close"] == last_close
+        assert window["analysis_text"] == analysis
+
+
+def test_rolling_window_matches_recomputed_window():
+    frames, final = kline_frames(["BTCUSDT"], candles=30, updates=4)
+    window = RollingWindow()
+    for frame in frames:
+        k = json.loads(frame)["data"]["k"]
+        window.update(k["t"], float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"]))
+    state = window.state()
+    last7 = final["BTCUSDT"][-7:]
+    assert state["period_high"] == last7[:, 2].max()
+    assert state["period_low"] == last7[:, 3].min()
+    assert state["total_volume"] == pytest.approx(last7[:, 5].sum())
+
+
+def test_subscribe_messages_are_chunked():
+    symbols = [f"C{i:04d}USDT" for i in range(700)]
+    batches = stream_batches(symbols)
+    assert [len(b) for b in batches] == [1000, 400]
+    messages = [json.loads(m) for m in subscribe_messages(batches[0])]
+    assert all(m["method"] == "SUBSCRIBE" and len(m["params"]) <= binance_stream.SUBSCRIBE_CHUNK for m in messages)
+    assert sum((m["params"] for m in messages), []) == batches[0]
+    assert len({m["id"] for m in messages}) == len(messages)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def subscribed(server, connection):
+    return [s for c, params in list(server.subscriptions) if c == connection for s in params]
+
+
+def test_stream_against_replay_server_with_reconnect(monkeypatch):
+    monkeypatch.setattr(binance_stream, "SUBSCRIBE_CHUNK", 1)
+    monkeypatch.setattr(binance_stream, "SUBSCRIBE_INTERVAL", 0.01)
+    symbols = ["BTCUSDT", "ETHUSDT"]
+    frames, final = kline_frames(symbols)
+    server, url = start_replay_server(frames, drop_after=len(frames) * 2 // 3)
+    stream = BinanceStream(symbols, state=MarketState(), base_url=url).start()
+    try:
+        assert wait_for(lambda: stream.state.messages >= len(frames)
+                        and len(subscribed(server, 2)) == len(stream.batches[0]))
+    finally:
+        stream.stop()
+        server.shutdown()
+    assert stream.connections == server.connections == 2
+    # A nova ligação volta a subscrever todos os streams, um por mensagem
+    assert subscribed(server, 1)
+    assert sorted(subscribed(server, 2)) == sorted(stream.batches[0])
+    assert_matches_batch(stream.state, final)
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+import bot_commands
+import telegram_delivery
+from bot_commands import CommandBot, MarketCache, ReplyCoalescer
+from fake_apis import SyntheticMarket, start_fake_apis
+
+TICKERS = {
+    "SOLUSDT": {"lastPrice": "150.5", "priceChangePercent": "3.2", "highPrice": "155", "lowPrice": "140",
+                "quoteVolume": "1000000"},
+    "BTCUSDT": {"lastPrice": "60000", "priceChangePercent": "-1.5", "highPrice": "61000", "lowPrice": "59000",
+                "quoteVolume": "9000000"},
+}
+
+
+@pytest.fixture
+def bot_api(monkeypatch):
+    server = start_fake_apis(SyntheticMarket(n_symbols=10))
+    base = server.env()["TELEGRAM_API_BASE"]
+    for module in (telegram_delivery, bot_commands):
+        monkeypatch.setattr(module, "TELEGRAM_API_BASE", base)
+        monkeypatch.setattr(module, "BOT_TOKEN", "test")
+    monkeypatch.setattr(bot_commands, "BOT_LONG_POLL", 1)
+    monkeypatch.setattr(bot_commands, "get_tradable_symbols", lambda quote: set(TICKERS))
+    yield server
+    server.shutdown()
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_commands_are_answered_through_the_bot_api(bot_api):
+    cache = MarketCache({
+        "tickers": (lambda: TICKERS, 3600),
+        "cmc": (lambda: None, 3600),
+        "giro": (lambda: {}, 3600),
+    })
+    bot = CommandBot(cache=cache, tracked=[])
+    cache.start()
+    stop = threading.Event()
+    threading.Thread(target=bot.poll_forever, args=(stop,), daemon=True).start()
+    texts = ["/preco sol", "/preco@VipBot <x", "/giro <b>&", "/top", "olá", "/xyz"]
+    try:
+        for i, text in enumerate(texts):
+            bot_api.push_update({"message": {"message_id": i + 1, "chat": {"id": 100 + i}, "text": text}})
+        # A latência é registada depois do envio: espera pelas duas
+        assert wait_for(lambda: len(bot_api.sent) == len(texts) - 1 and bot.latency_stats()[2] == len(texts) - 1)
+    finally:
+        stop.set()
+        cache.stop()
+
+    replies = {chat_id: text for _, chat_id, text in bot_api.sent}
+    assert "<b>SOL</b>: $150" in replies["100"]
+    # O argumento do utilizador chega escapado (o Telegram aceitou o HTML)
+    assert "Par <b>&lt;XUSDT</b> não encontrado" in replies["101"]
+    assert "&lt;B&gt;&amp;" in replies["102"]
+    assert "Top 5 Ganhadoras" in replies["103"] and "Binance" in replies["103"]
+    assert "Comando desconhecido" in replies["105"]
+    p50, p99, n = bot.latency_stats()
+    assert n == len(texts) - 1
+
+
+def test_reply_cache_drops_old_versions_and_stays_bounded():
+    replies = ReplyCoalescer(max_entries=3)
+    for i in range(10):
+        replies.get(("/preco", f"X{i}"), (1, 0, 0), lambda: "x")
+    assert len(replies.entries) == 3
+    calls = []
+    assert replies.get(("/preco", "X9"), (1, 0, 0), lambda: calls.append(1)) == "x"
+    assert not calls
+    replies.get(("/top", ""), (2, 0, 0), lambda: "top")
+    assert list(replies.entries) == [("/top", "")]
+
+
+class StaticCache:
+    def __init__(self, **values):
+        self.values = values
+        self.refreshes = []
+
+    def get(self, name):
+        value = self.values.get(name)
+        return bot_commands.CacheEntry(1, 0, value) if value is not None else None
+
+    def request_refresh(self, name):
+        self.refreshes.append(name)
+
+
+def test_track_checks_the_tradable_pairs_even_without_tickers(monkeypatch):
+    monkeypatch.setattr(bot_commands, "get_tradable_symbols", lambda quote: {"SOLUSDT", "BTCUSDT"})
+    bot = CommandBot(cache=StaticCache(), tracked=[])
+    assert "não encontrado" in bot.track("XPTO")
+    assert "em preparação" in bot.track("SOL")
+    assert bot.tracked == ["SOL"]
+
+    monkeypatch.setattr(bot_commands, "get_tradable_symbols", lambda quote: None)
+    assert "indisponível" in bot.track("BTC")
+    assert bot.tracked == ["SOL"]
+
+
+def test_fetch_giro_stops_tracking_delisted_symbols(monkeypatch):
+    requested = []
+
+    def get_market_data(symbols, multi_timeframe=False):
+        requested.append(symbols)
+        return [{"symbol": s} for s in symbols], []
+
+    monkeypatch.setattr(bot_commands.giro, "get_market_data", get_market_data)
+    bot = CommandBot(cache=StaticCache(tickers=TICKERS), tracked=["BTC", "GONE", "SOL"])
+    assert sorted(bot.fetch_giro()) == ["BTC", "SOL"]
+    assert requested == [["BTC", "SOL"]]
+    assert bot.tracked == ["BTC", "SOL"]
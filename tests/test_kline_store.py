@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import kline_store
+
+HOUR_MS = kline_store.INTERVAL_MS["1h"]
+
+
+def candles(first, count):
+    opens = HOUR_MS * np.arange(first, first + count, dtype=np.float64)
+    return np.column_stack([opens, *[opens / HOUR_MS] * 5, opens + HOUR_MS - 1])
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(kline_store, "KLINE_STORE_DIR", str(tmp_path))
+    kline_store.append_klines("NEWUSDT", "1h", candles(0, 10))
+    # A vela 10 ainda está aberta: vem da Binance mas não fica guardada
+    monkeypatch.setattr(kline_store, "sync_klines", lambda *a, **k: candles(9, 2))
+
+
+@pytest.mark.parametrize("limit, expected", [(5, 5), (11, 11), (15, 11), (25, 11)])
+def test_get_klines_keeps_every_stored_candle_of_short_histories(store, limit, expected):
+    klines = kline_store.get_klines("NEWUSDT", "1h", limit=limit)
+    assert len(klines) == expected
+    assert klines[:, kline_store.OPEN_TIME].tolist() == (HOUR_MS * np.arange(11 - expected, 11)).tolist()
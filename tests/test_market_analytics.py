@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+
+import kline_store
+import market_analytics
+from resample import Resampler, resample_klines
+
+HOUR_MS = kline_store.INTERVAL_MS["1h"]
+BASE_MS = kline_store.INTERVAL_MS["15m"]
+
+
+def base_candles(last_open, count, seed=0):
+    rng = np.random.default_rng(seed)
+    opens = last_open - BASE_MS * np.arange(count)[::-1]
+    closes = 100 + rng.normal(0, 1, count).cumsum()
+    highs, lows = closes + rng.uniform(0, 1, count), closes - rng.uniform(0, 1, count)
+    return np.column_stack([opens, closes, highs, lows, closes, rng.uniform(0, 10, count), opens + BASE_MS - 1])
+
+
+def test_resample_klines_matches_the_incremental_resampler():
+    # Começa a meio de uma hora: o primeiro bucket incompleto fica de fora
+    rows = base_candles(HOUR_MS * 1000 + 2 * BASE_MS, 50)
+    resampler = Resampler("1h")
+    for row in rows:
+        resampler.update(list(row))
+    expected = np.array(resampler.closed)
+    candles = resample_klines(rows, "15m", "1h")
+    assert len(candles) == 11
+    np.testing.assert_allclose(candles, expected)
+
+
+def test_recent_base_store_is_read_without_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(kline_store, "KLINE_STORE_DIR", str(tmp_path))
+    synced = []
+    monkeypatch.setattr(market_analytics, "sync_klines", lambda symbol, interval, **k: synced.append((symbol, interval)))
+    now_ms = time.time() * 1000
+    current_open = now_ms - now_ms % HOUR_MS
+    stale = market_analytics.ANALYTICS_MAX_STALE_CANDLES + 2
+    kline_store.append_klines("FRESHUSDT", "15m", base_candles(current_open - HOUR_MS * 2 - BASE_MS, 400))
+    kline_store.append_klines("STALEUSDT", "15m", base_candles(current_open - HOUR_MS * stale - BASE_MS, 400))
+
+    for symbol in ("FRESHUSDT", "STALEUSDT", "NEWUSDT"):
+        assert market_analytics._sync(symbol, "1h", 73)
+    assert synced == [("STALEUSDT", "15m"), ("NEWUSDT", "15m")]
+
+    open_times, closes = market_analytics.aligned_closes(["FRESHUSDT", "STALEUSDT"], "1h", 73)
+    assert len(open_times) == 73 and open_times[-1] == current_open - HOUR_MS * 3
+    assert np.isfinite(closes[:, 0]).all()
+    assert np.isnan(closes[-stale + 2:, 1]).all() and np.isfinite(closes[:-stale + 2, 1]).all()
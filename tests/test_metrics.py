@@ -0,0 +1,43 @@
+import json
+import threading
+
+import metrics
+from binance_api import run_concurrently
+
+
+def read_run(directory, job):
+    with open(directory / f"{job}.runs.jsonl", encoding="utf-8") as f:
+        return json.loads(f.readlines()[-1])
+
+
+def test_overlapping_runs_keep_their_own_spans(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    first_started = threading.Event()
+    first_may_finish = threading.Event()
+
+    def first():
+        with metrics.run("first"):
+            with metrics.span("before"):
+                first_started.set()
+            first_may_finish.wait(5)
+
+    def second():
+        first_started.wait(5)
+        with metrics.run("second"):
+            # "first" termina a meio desta execução
+            first_may_finish.set()
+            thread.join(5)
+            with metrics.span("after"):
+                pass
+            run_concurrently({i: lambda: metrics.count("helper_total") for i in range(4)})
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    second()
+
+    assert set(read_run(tmp_path, "first")["stages"]) == {"before"}
+    record = read_run(tmp_path, "second")
+    assert set(record["stages"]) == {"after"}
+    assert record["counters"] == [{"name": "helper_total", "labels": {}, "value": 4}]
+    assert metrics._current.get() is None
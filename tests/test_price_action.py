@@ -0,0 +1,62 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from price_action import analyze_klines_batch, stack_klines
+
+
+def load_giro():
+    spec = importlib.util.spec_from_file_location("giro_madrugada_vip", os.path.join(ROOT, "giro_madrugada_vip (1).py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def random_windows(count, window=7, seed=0):
+    """Janelas de klines (n, 7) aleatórias, com preços arredondados para forçar empates."""
+    rng = np.random.default_rng(seed)
+    windows = {}
+    for i in range(count):
+        close = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.004, window))), 1)
+        open_ = np.concatenate([[np.round(close[0] * (1 + rng.normal(0, 0.004)), 1)], close[:-1]])
+        high = np.maximum(open_, close) + np.round(rng.uniform(0, 0.3, window), 1) * rng.integers(0, 2, window)
+        low = np.minimum(open_, close) - np.round(rng.uniform(0, 0.3, window), 1) * rng.integers(0, 2, window)
+        volume = np.round(rng.uniform(0, 1000, window), 3)
+        open_time = np.arange(window) * 3_600_000.0
+        windows[f"S{i}USDT"] = np.column_stack([open_time, open_, high, low, close, volume, open_time + 3_599_999])
+    return windows
+
+
+def as_raw(klines):
+    """Mesma janela no formato cru da API da Binance (strings)."""
+    return [[int(k[0])] + [repr(float(v)) for v in k[1:6]] + [int(k[6])] for k in klines]
+
+
+@pytest.fixture(scope="module")
+def giro():
+    return load_giro()
+
+
+@pytest.mark.parametrize("raw", [False, True])
+def test_batch_matches_scalar_analyze_klines(giro, raw):
+    windows = random_windows(3000)
+    if raw:
+        windows = {symbol: as_raw(klines) for symbol, klines in windows.items()}
+    batch = analyze_klines_batch(windows)
+    assert len(batch) == len(windows)
+    for symbol, klines in windows.items():
+        assert batch[symbol] == giro.analyze_klines(klines), symbol
+
+
+def test_stack_klines_uses_last_window_and_skips_short_histories():
+    windows = random_windows(3, window=10)
+    windows["SHORTUSDT"] = windows["S0USDT"][:5]
+    symbols, ohlcv = stack_klines(windows, window=7)
+    assert symbols == ["S0USDT", "S1USDT", "S2USDT"]
+    assert ohlcv.shape == (3, 7, 5)
+    np.testing.assert_array_equal(ohlcv[1], windows["S1USDT"][-7:, 1:6])
+    symbols, ohlcv = stack_klines({"S0USDT": as_raw(windows["S0USDT"])}, window=7)
+    np.testing.assert_array_equal(ohlcv[0], windows["S0USDT"][-7:, 1:6])
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import quote_archive
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(quote_archive, "QUOTE_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(quote_archive, "QUOTE_ARCHIVE_MIN_INTERVAL", 0)
+    return tmp_path
+
+
+def test_torn_trailing_row_is_ignored_and_cut(archive_dir):
+    for i, price in enumerate([100.0, 90.0, 120.0]):
+        quote_archive.archive_quotes({"BTC": {"price": price}}, timestamp=1000 + i * 600)
+    with open(quote_archive.archive_path("BTC"), "ab") as f:
+        f.write(b"\x01" * 13)  # escrita interrompida a meio de uma linha
+
+    quotes = quote_archive.load_quotes("BTC")
+    assert len(quotes) == 3
+    assert quote_archive.price_at("BTC", 2199) == (1600.0, 90.0)
+
+    quote_archive.archive_quotes({"BTC": {"price": 60.0}}, timestamp=3000)
+    quotes = quote_archive.load_quotes("BTC")
+    assert quotes[:, quote_archive.TIMESTAMP].tolist() == [1000, 1600, 2200, 3000]
+    assert np.isnan(quotes[-1, quote_archive.CHANGE_24H])
+    assert quote_archive.max_drawdown("BTC", 1000, 3000) == pytest.approx(-50.0)
+    assert quote_archive.change_since("BTC", 1000, now=2200) == pytest.approx(20.0)
+    assert quote_archive.price_at("BTC", 999) is None
+
+
+def test_min_interval_uses_last_complete_row(archive_dir, monkeypatch):
+    monkeypatch.setattr(quote_archive, "QUOTE_ARCHIVE_MIN_INTERVAL", 300)
+    assert quote_archive.archive_quotes({"ETH": {"price": 1.0}}, timestamp=1000) == 1
+    assert quote_archive.archive_quotes({"ETH": {"price": 2.0}}, timestamp=1100) == 0
+    assert quote_archive.archive_quotes({"ETH": {"price": 3.0}}, timestamp=1300) == 1
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytz
+
+from scheduler_daemon import CronSchedule
+
+UTC = pytz.utc
+
+
+def next_runs(expression, start, count, tz=UTC):
+    schedule = CronSchedule(expression, tz=tz)
+    runs = []
+    when = start
+    for _ in range(count):
+        when = schedule.next_run(when)
+        runs.append(when)
+    return runs
+
+
+def test_restricted_day_of_month_and_weekday_match_either():
+    # Dia 1 ou 13 de cada mês, e também todas as segundas-feiras
+    runs = next_runs("0 12 1,13 * 1", UTC.localize(datetime(2024, 1, 1, 13)), 4)
+    assert [r.date().isoformat() for r in runs] == ["2024-01-08", "2024-01-13", "2024-01-15", "2024-01-22"]
+
+
+def test_wildcard_weekday_keeps_day_of_month_only():
+    runs = next_runs("0 12 13 * *", UTC.localize(datetime(2024, 1, 1)), 2)
+    assert [r.date().isoformat() for r in runs] == ["2024-01-13", "2024-02-13"]
+
+
+def test_stepped_day_of_month_with_weekday_applies_both_fields():
+    # Um dia do mês que começa por '*' (aqui '*/2') não ativa a regra do OU:
+    # como no cron, os dois campos aplicam-se (E) e só as segundas-feiras em
+    # dias ímpares contam
+    runs = next_runs("0 12 */2 * 1", UTC.localize(datetime(2024, 1, 1, 13)), 2)
+    assert [r.date().isoformat() for r in runs] == ["2024-01-15", "2024-01-29"]
+
+
+def test_lisbon_wall_clock_across_dst():
+    lisbon = pytz.timezone("Europe/Lisbon")
+    winter, summer = next_runs("0 12 * * *", UTC.localize(datetime(2024, 3, 30, 11)), 2, tz=lisbon)
+    assert winter.astimezone(UTC).hour == 12 and summer.astimezone(UTC).hour == 11
@@ -0,0 +1,41 @@
+import pytest
+
+import cmc_client
+import quote_archive
+import watchlists
+from fake_apis import SyntheticMarket, start_fake_apis
+
+
+@pytest.fixture
+def fake_cmc(tmp_path, monkeypatch):
+    server = start_fake_apis(SyntheticMarket(n_symbols=50))
+    monkeypatch.setattr(cmc_client, "CMC_URL_QUOTES", f"{server.env()['CMC_API_BASE']}/cryptocurrency/quotes/latest")
+    monkeypatch.setattr(cmc_client, "CMC_CREDITS_FILE", str(tmp_path / "cmc_credits.json"))
+    monkeypatch.setattr(quote_archive, "QUOTE_ARCHIVE_DIR", str(tmp_path / "quotes"))
+    monkeypatch.setattr(cmc_client, "quotes", cmc_client.QuoteCoalescer())
+    yield server
+    server.shutdown()
+
+
+def test_unknown_symbol_does_not_fail_the_shared_batch(fake_cmc):
+    quotes = cmc_client.get_quotes(["BTC", "ETH", "BTCC0IN"])
+    assert sorted(quotes) == ["BTC", "ETH"]
+
+
+def test_set_validates_symbols(fake_cmc, tmp_path, monkeypatch):
+    monkeypatch.setattr(watchlists, "get_tradable_symbols", lambda quote: {"BTCUSDT", "ETHUSDT"})
+    path = tmp_path / "watchlists.json"
+    # C0001 só existe na CMC (não tem par na Binance) e XPTO não existe
+    assert watchlists.set_watchlist("1", ["btc", "C0001", "xpto"], path=path) == ["BTC", "C0001"]
+    assert fake_cmc.stats["cmc:v1/cryptocurrency/quotes/latest"] == 1
+    assert watchlists.set_watchlist("1", ["xpto"], path=path) == ["BTC", "C0001"]
+    assert watchlists.load_watchlists(path) == {"1": ["BTC", "C0001"]}
+
+
+def test_watchlist_outside_the_configured_chats_is_not_delivered(monkeypatch):
+    lists = watchlists.subscriber_lists({"999": ["SOL"], "1": ["ETH"]}, chat_ids=[1, "2"])
+    assert lists == {"1": ["ETH"], "2": list(watchlists.FIXED_SYMBOLS)}
+
+    monkeypatch.setattr(watchlists, "load_watchlists", lambda: {"999": ["SOL"]})
+    monkeypatch.setattr(watchlists, "get_chat_ids", lambda: ["1"])
+    assert list(watchlists.subscriber_lists(watchlists.load_watchlists())) == ["1"]
@@ -0,0 +1,258 @@
+"""Watchlists por assinante: um snapshot de mercado partilhado, muitas mensagens.
+
+Cada chat VIP escolhe as suas moedas (ficheiro WATCHLISTS_FILE). Por ciclo:
+
+1. as cotações da união de todas as listas são pedidas uma única vez à CMC
+   (em lotes de WATCHLIST_QUOTES_BATCH símbolos), e a listagem dinâmica é a
+   mesma da Análise VIP; o custo de rede não cresce com o número de
+   assinantes, só com o número de moedas distintas;
+2. a linha de cada moeda é renderizada uma vez e reaproveitada em todas as
+   listas que a incluem; as secções comuns (Top 5, observação) também;
+3. listas iguais partilham a mesma mensagem e são entregues juntas.
+
+Uso:
+    python watchlists.py                      # ciclo completo (envia)
+    python watchlists.py --dry-run            # só renderiza e mostra estatísticas
+    python watchlists.py --set 12345 BTC ETH PEPE
+    python watchlists.py --show
+"""
+import argparse
+import json
+import os
+import time
+
+import requests
+
+import metrics
+from cmc_client import get_quotes
+from exchange_info_cache import get_tradable_symbols
+from crypto_scanner_v2 import (
+    CMC_LISTINGS_DEADLINE, FIXED_SYMBOLS, format_fixed_line, format_scanner_sections, get_dynamic_data,
+)
+from snapshot_store import SnapshotFetch, fetch_with_deadline, format_freshness
+from telegram_delivery import deliver, get_chat_ids
+
+# --- CONFIGURAÇÕES ---
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+# {chat_id: [símbolos]}; chats VIP sem entrada recebem FIXED_SYMBOLS
+WATCHLISTS_FILE = os.environ.get("WATCHLISTS_FILE", os.path.join(CACHE_DIR, "watchlists.json"))
+# Máximo de moedas por lista (mantém cada mensagem numa só parte)
+WATCHLIST_MAX_SYMBOLS = int(os.environ.get("WATCHLIST_MAX_SYMBOLS", "30"))
+# Símbolos por pedido a /quotes/latest (1 crédito por cada 100)
+WATCHLIST_QUOTES_BATCH = 100
+# Prazo da CMC antes de usar o último snapshot (segundos)
+WATCHLIST_DEADLINE = float(os.environ.get("WATCHLIST_DEADLINE", "10"))
+# A observação comum compara sempre BTC e ETH
+REQUIRED_SYMBOLS = ("BTC", "ETH")
+
+
+def normalize_symbols(symbols):
+    """Maiúsculas, sem repetições, pela ordem dada, até WATCHLIST_MAX_SYMBOLS."""
+    seen = []
+    for symbol in symbols:
+        symbol = symbol.strip().upper()
+        if symbol and symbol not in seen:
+            seen.append(symbol)
+    return seen[:WATCHLIST_MAX_SYMBOLS]
+
+
+def load_watchlists(path=WATCHLISTS_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {str(chat_id): normalize_symbols(symbols) for chat_id, symbols in data.items()}
+
+
+def save_watchlists(watchlists, path=WATCHLISTS_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(watchlists, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def validate_symbols(symbols):
+    """Separa os símbolos em (conhecidos, desconhecidos).
+
+    Os pares USDT em negociação na Binance são confirmados pela cache local
+    do exchangeInfo, sem custo; só os restantes são procurados na CMC (1
+    crédito por cada 100). Levanta RequestException se a CMC falhar.
+    """
+    tradable = get_tradable_symbols("USDT") or set()
+    unknown = [s for s in symbols if f"{s}USDT" not in tradable]
+    if unknown:
+        found = get_quotes(unknown)
+        unknown = [s for s in unknown if s not in found]
+    return [s for s in symbols if s not in unknown], unknown
+
+
+def set_watchlist(chat_id, symbols, path=WATCHLISTS_FILE, validate=True):
+    """Define (ou apaga, com lista vazia) a watchlist de um chat.
+
+    Com validate=True os símbolos desconhecidos são retirados (e avisados).
+    """
+    watchlists = load_watchlists(path)
+    symbols = normalize_symbols(symbols)
+    if validate and symbols:
+        symbols, unknown = validate_symbols(symbols)
+        if unknown:
+            print(f"Símbolos desconhecidos ignorados: {', '.join(unknown)}")
+        if not symbols:
+            print("Nenhum símbolo válido; a watchlist fica como estava.")
+            return watchlists.get(str(chat_id), [])
+    if symbols:
+        watchlists[str(chat_id)] = symbols
+    else:
+        watchlists.pop(str(chat_id), None)
+    save_watchlists(watchlists, path)
+    return symbols
+
+
+def subscriber_lists(watchlists, chat_ids=None):
+    """{chat_id: símbolos} para os assinantes configurados (com FIXED_SYMBOLS por omissão).
+
+    Watchlists de chats que já não estão em get_chat_ids() ficam guardadas mas não são entregues.
+    """
+    if chat_ids is None:
+        chat_ids = get_chat_ids()
+    return {str(c): watchlists.get(str(c), list(FIXED_SYMBOLS)) for c in chat_ids}
+
+
+def watched_union(lists):
+    """Moedas distintas de todas as listas (mais as da observação comum)."""
+    union = set(REQUIRED_SYMBOLS)
+    for symbols in lists.values():
+        union.update(symbols)
+    return sorted(union)
+
+
+def get_watchlist_quotes(symbols):
+    """Cotações de todos os símbolos, em lotes. Devolve None se a CMC falhar."""
+    quotes = {}
+    try:
+        with metrics.span("fetch_quotes", count=len(symbols)):
+            for start in range(0, len(symbols), WATCHLIST_QUOTES_BATCH):
+                quotes.update(get_quotes(symbols[start:start + WATCHLIST_QUOTES_BATCH]))
+    except requests.exceptions.RequestException as e:
+        print(f"Erro ao buscar cotações das watchlists: {e}")
+        return None
+    return quotes
+
+
+class WatchlistRenderer:
+    """Renderiza as mensagens de um ciclo a partir de um único snapshot.
+
+    As linhas por moeda e as secções comuns são calculadas uma vez; cada
+    mensagem custa só juntar fragmentos já prontos.
+    """
+
+    def __init__(self, quotes, dynamic_data, footer=None):
+        self.quotes = quotes
+        self.fragments = {}
+        self.messages = {}
+        shared = dict(format_scanner_sections(quotes, dynamic_data or {}))
+        self.header = shared["header"]
+        self.tail = "\n\n".join(
+            shared[name] for name in ("gainers", "losers", "observation") if name in shared
+        )
+        if footer:
+            self.tail += "\n\n" + footer
+
+    def fragment(self, symbol):
+        line = self.fragments.get(symbol)
+        if line is None:
+            line = self.fragments[symbol] = format_fixed_line(symbol, self.quotes.get(symbol))
+        return line
+
+    def highlights(self, symbols):
+        changes = [
+            (self.quotes[s]["percent_change_24h"], s) for s in symbols
+            if s in self.quotes and self.quotes[s].get("percent_change_24h") is not None
+        ]
+        if len(changes) < 2:
+            return []
+        top_change, top = max(changes)
+        low_change, low = min(changes)
+        return [
+            f"🔼 Maior alta da sua lista: <b>{top}</b> {top_change:+.1f}% (24h)",
+            f"🔽 Maior queda da sua lista: <b>{low}</b> {low_change:+.1f}% (24h)",
+        ]
+
+    def render(self, symbols):
+        key = tuple(symbols)
+        message = self.messages.get(key)
+        if message is None:
+            lines = [f"--- Sua Lista ({len(symbols)}) ---"]
+            lines.extend(self.fragment(s) for s in symbols)
+            highlights = self.highlights(symbols)
+            if highlights:
+                lines.append("")
+                lines.extend(highlights)
+            message = self.messages[key] = f"{self.header}\n\n" + "\n".join(lines) + f"\n\n{self.tail}"
+        return message
+
+    def render_all(self, lists):
+        """{mensagem: [chat_ids]}: listas iguais partilham a mesma mensagem."""
+        groups = {}
+        for chat_id, symbols in lists.items():
+            groups.setdefault(self.render(symbols), []).append(chat_id)
+        return groups
+
+
+def run_cycle(send=True, chat_ids=None):
+    """Um ciclo completo: busca partilhada, renderização e entrega por grupo."""
+    lists = subscriber_lists(load_watchlists(), chat_ids)
+    if not lists:
+        print("Nenhum assinante configurado.")
+        return None
+    union = watched_union(lists)
+    print(f"{len(lists)} assinantes, {len(union)} moedas distintas.")
+
+    dynamic_fetch = SnapshotFetch("analise_vip_listings", get_dynamic_data)
+    quotes, quotes_stale_since = fetch_with_deadline(
+        "watchlist_quotes", lambda: get_watchlist_quotes(union), WATCHLIST_DEADLINE,
+    )
+    dynamic_data, dynamic_stale_since = dynamic_fetch.result(CMC_LISTINGS_DEADLINE)
+    if not quotes or not all(s in quotes for s in REQUIRED_SYMBOLS):
+        print("Não foi possível enviar as watchlists devido a um erro na obtenção dos dados.")
+        return None
+
+    stale_since = [t for t in (quotes_stale_since, dynamic_stale_since) if t]
+    footer = format_freshness(min(stale_since)) if stale_since else None
+    started = time.perf_counter()
+    with metrics.span("format", count=len(lists)):
+        renderer = WatchlistRenderer(quotes, dynamic_data, footer)
+        groups = renderer.render_all(lists)
+    print(
+        f"{len(groups)} mensagens distintas para {len(lists)} assinantes "
+        f"({len(renderer.fragments)} fragmentos) em {(time.perf_counter() - started) * 1000:.0f} ms."
+    )
+
+    if send:
+        for text, group in groups.items():
+            deliver(text, chat_ids=group)
+    return groups
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watchlists VIP por assinante")
+    parser.add_argument("--set", nargs="+", metavar=("CHAT_ID", "SÍMBOLO"),
+                        help="define a watchlist de um chat (sem símbolos apaga-a)")
+    parser.add_argument("--show", action="store_true", help="mostra as watchlists guardadas")
+    parser.add_argument("--dry-run", action="store_true", help="renderiza sem enviar")
+    args = parser.parse_args()
+
+    if args.set:
+        chat_id, *symbols = args.set
+        try:
+            print(f"{chat_id}: {', '.join(set_watchlist(chat_id, symbols)) or '(padrão)'}")
+        except requests.exceptions.RequestException as e:
+            print(f"Erro ao validar os símbolos na CMC: {e}")
+    elif args.show:
+        for chat_id, symbols in subscriber_lists(load_watchlists()).items():
+            print(f"{chat_id}: {', '.join(symbols)}")
+    else:
+        with metrics.run("watchlists"):
+            run_cycle(send=not args.dry_run)
@@ -0,0 +1,189 @@
+"""Servidor WebSocket local que repete frames gravados (substituto da Binance).
+
+Serve para testar o binance_stream sem rede. Como a Binance, o cliente
+liga a /stream e pede os streams com mensagens SUBSCRIBE; cada mensagem do
+ficheiro JSONL gravado com `binance_stream.py --record` só é enviada se o
+seu stream tiver sido subscrito. As mensagens avançam num cursor partilhado
+por todas as ligações: depois de uma nova ligação o cliente recebe as
+seguintes, como num stream ao vivo. `drop_after` fecha a ligação ao fim de
+N mensagens, para testar a nova ligação.
+
+Uso:
+    python ws_replay_server.py frames.jsonl --port 9443 --interval 0.01
+    BINANCE_WS_BASE=ws://127.0.0.1:9443 python binance_stream.py BTC --no-seed
+"""
+import argparse
+import base64
+import hashlib
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# Tempo que uma mensagem espera pela subscrição do seu stream antes de ser saltada
+SUBSCRIBE_WAIT = 2.0
+
+
+def encode_frame(payload, opcode=0x1):
+    """Frame WebSocket do servidor (sem máscara)."""
+    data = payload.encode("utf-8") if isinstance(payload, str) else payload
+    header = bytes([0x80 | opcode])
+    if len(data) < 126:
+        header += bytes([len(data)])
+    elif len(data) < 65536:
+        header += bytes([126]) + struct.pack(">H", len(data))
+    else:
+        header += bytes([127]) + struct.pack(">Q", len(data))
+    return header + data
+
+
+def read_frame(rfile):
+    """Lê um frame do cliente. Devolve (opcode, payload) ou (None, None) no fim."""
+    head = rfile.read(2)
+    if len(head) < 2:
+        return None, None
+    opcode = head[0] & 0x0F
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", rfile.read(8))[0]
+    mask = rfile.read(4) if head[1] & 0x80 else b"\x00\x00\x00\x00"
+    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(rfile.read(length)))
+    return opcode, payload
+
+
+class ReplayHandler(socketserver.StreamRequestHandler):
+    frames = []
+    interval = 0.0
+    drop_after = None
+
+    def handle(self):
+        headers = {}
+        self.rfile.readline()  # linha do pedido (GET /stream HTTP/1.1)
+        while True:
+            line = self.rfile.readline().decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(
+            hashlib.sha1((headers.get("sec-websocket-key", "") + WEBSOCKET_GUID).encode()).digest()
+        ).decode()
+        self.wfile.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+
+        server = self.server
+        write_lock = threading.Lock()
+        closed = threading.Event()
+        subscribed = set()
+        subscribed_changed = threading.Condition()
+        with server.lock:
+            server.connections += 1
+            connection = server.connections
+
+        def stream_of(frame):
+            try:
+                return json.loads(frame).get("stream")
+            except ValueError:
+                return None
+
+        def send_frames():
+            sent = 0
+            while not closed.is_set():
+                with server.lock:
+                    if server.cursor >= len(self.frames):
+                        return
+                    frame = self.frames[server.cursor]
+                    server.cursor += 1
+                stream = stream_of(frame)
+                with subscribed_changed:
+                    if stream and not subscribed_changed.wait_for(lambda: stream in subscribed, SUBSCRIBE_WAIT):
+                        continue
+                with write_lock:
+                    self.wfile.write(encode_frame(frame))
+                sent += 1
+                if self.drop_after and sent >= self.drop_after:
+                    # Fecho abrupto do socket, como uma queda de rede
+                    closed.set()
+                    self.request.shutdown(socket.SHUT_RDWR)
+                    return
+                if self.interval:
+                    time.sleep(self.interval)
+
+        sender = threading.Thread(target=send_frames, daemon=True)
+        sender.start()
+
+        # Subscrições, pings e fecho do cliente
+        while True:
+            try:
+                opcode, payload = read_frame(self.rfile)
+            except OSError:
+                opcode = None
+            if opcode is None or opcode == 0x8:
+                closed.set()
+                if opcode == 0x8:
+                    with write_lock:
+                        self.wfile.write(encode_frame(payload, opcode=0x8))
+                return
+            if opcode == 0x9:
+                with write_lock:
+                    self.wfile.write(encode_frame(payload, opcode=0xA))
+            elif opcode == 0x1:
+                request = json.loads(payload)
+                if request.get("method") == "SUBSCRIBE":
+                    with subscribed_changed:
+                        subscribed.update(request.get("params", []))
+                        subscribed_changed.notify_all()
+                    with server.lock:
+                        server.subscriptions.append((connection, list(request.get("params", []))))
+                    with write_lock:
+                        self.wfile.write(encode_frame(json.dumps({"result": None, "id": request.get("id")})))
+
+
+class ReplayServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.cursor = 0
+        self.connections = 0
+        # (número da ligação, streams) de cada SUBSCRIBE recebido
+        self.subscriptions = []
+
+
+def start_replay_server(frames, host="127.0.0.1", port=0, interval=0.0, drop_after=None):
+    """Arranca o servidor numa thread. Devolve (servidor, URL base ws://...)."""
+    handler = type("Handler", (ReplayHandler,), {
+        "frames": list(frames), "interval": interval, "drop_after": drop_after,
+    })
+    server = ReplayServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"ws://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor WebSocket de repetição")
+    parser.add_argument("frames", help="ficheiro JSONL gravado com binance_stream.py --record")
+    parser.add_argument("--port", type=int, default=9443)
+    parser.add_argument("--interval", type=float, default=0.0, help="pausa entre mensagens (s)")
+    parser.add_argument("--drop-after", type=int, help="fecha cada ligação ao fim de N mensagens")
+    args = parser.parse_args()
+
+    with open(args.frames, "r", encoding="utf-8") as f:
+        frames = [line.strip() for line in f if line.strip()]
+    server, url = start_replay_server(frames, port=args.port, interval=args.interval, drop_after=args.drop_after)
+    print(f"A repetir {len(frames)} mensagens em {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()